@@ -3,6 +3,7 @@ Admin Panel - Full control over bot
 With photo upload support
 """
 
+import asyncio
 from datetime import datetime, timedelta
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -10,16 +11,22 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from config import ADMIN_IDS
 import database as db
+import availability
+import funnel
+import health
+import notifications
+import render_cache
+import tenants
+from models import Specialist
 
 router = Router()
 
 # ═══════════════════════════════════════════════════════════
 # ROUTER-LEVEL FILTERS - все хендлеры только для админов
 # ═══════════════════════════════════════════════════════════
-router.message.filter(F.from_user.id.in_(ADMIN_IDS))
-router.callback_query.filter(F.from_user.id.in_(ADMIN_IDS))
+router.message.filter(F.from_user.id.func(tenants.is_admin))
+router.callback_query.filter(F.from_user.id.func(tenants.is_admin))
 
 # ═══════════════════════════════════════════════════════════
 # FSM States
@@ -35,6 +42,11 @@ class AdminState(StatesGroup):
     edit_specialist_photo = State()
     add_time_slot = State()
     editing_welcome = State()
+    broadcast_text = State()
+    search_bookings = State()
+    schedule_hours = State()
+    schedule_session = State()
+    schedule_exception = State()
 
 # ═══════════════════════════════════════════════════════════
 # Keyboards
@@ -57,21 +69,30 @@ def admin_main_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="📋 Записи", callback_data="admin:bookings"),
             InlineKeyboardButton(text="📊 Статистика", callback_data="admin:stats"),
         ],
-        [InlineKeyboardButton(text="✏️ Приветствие", callback_data="admin:edit_welcome")],
-        [InlineKeyboardButton(text="❌ Закрыть", callback_data="admin:close")],
+        [
+            InlineKeyboardButton(text="✏️ Приветствие", callback_data="admin:edit_welcome"),
+            InlineKeyboardButton(text="📣 Рассылка", callback_data="admin:broadcast"),
+        ],
+        [
+            InlineKeyboardButton(text="💾 Бэкапы", callback_data="admin:backup"),
+            InlineKeyboardButton(text="❌ Закрыть", callback_data="admin:close"),
+        ],
     ])
 
 def specialists_keyboard(show_all: bool = False) -> InlineKeyboardMarkup:
+    return render_cache.get("specialists", ("admin_keyboard", show_all), lambda: _build_specialists_keyboard(show_all))
+
+def _build_specialists_keyboard(show_all: bool) -> InlineKeyboardMarkup:
     specs = db.get_specialists(active_only=not show_all)
     buttons = []
 
     for spec in specs:
-        status = "✅" if spec['is_active'] else "❌"
-        photo = "📷" if spec.get('photo_file_id') else "📵"
+        status = "✅" if spec.is_active else "❌"
+        photo = "📷" if spec.photo_file_id else "📵"
         buttons.append([
             InlineKeyboardButton(
-                text=f"{status} {photo} {spec['name']}",
-                callback_data=f"admin:spec:view:{spec['id']}"
+                text=f"{status} {photo} {spec.name}",
+                callback_data=f"admin:spec:view:{spec.id}"
             )
         ])
 
@@ -88,30 +109,36 @@ def specialists_keyboard(show_all: bool = False) -> InlineKeyboardMarkup:
 
 def specialist_view_keyboard(spec_id: str) -> InlineKeyboardMarkup:
     spec = db.get_specialist(spec_id)
-    toggle_text = "🔴 Выключить" if spec['is_active'] else "🟢 Включить"
-    photo_text = "🖼 Изменить фото" if spec.get('photo_file_id') else "📷 Добавить фото"
+    toggle_text = "🔴 Выключить" if spec.is_active else "🟢 Включить"
+    photo_text = "🖼 Изменить фото" if spec.photo_file_id else "📷 Добавить фото"
 
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="✏️ Имя", callback_data=f"admin:spec:edit:name:{spec_id}"),
             InlineKeyboardButton(text="📝 Описание", callback_data=f"admin:spec:edit:desc:{spec_id}"),
         ],
-        [InlineKeyboardButton(text=photo_text, callback_data=f"admin:spec:edit:photo:{spec_id}")],
+        [
+            InlineKeyboardButton(text=photo_text, callback_data=f"admin:spec:edit:photo:{spec_id}"),
+            InlineKeyboardButton(text="🗓 График", callback_data=f"admin:sched:view:{spec_id}"),
+        ],
         [InlineKeyboardButton(text=toggle_text, callback_data=f"admin:spec:toggle:{spec_id}")],
         [InlineKeyboardButton(text="🗑 Удалить", callback_data=f"admin:spec:delete:{spec_id}")],
         [InlineKeyboardButton(text="◀️ К списку", callback_data="admin:specialists")],
     ])
 
 def slots_keyboard() -> InlineKeyboardMarkup:
+    return render_cache.get("slots", "admin_keyboard", _build_slots_keyboard)
+
+def _build_slots_keyboard() -> InlineKeyboardMarkup:
     slots = db.get_time_slots(active_only=False)
     buttons = []
     row = []
 
     for slot in slots:
-        status = "✅" if slot['is_active'] else "❌"
+        status = "✅" if slot.is_active else "❌"
         row.append(InlineKeyboardButton(
-            text=f"{status} {slot['time']}",
-            callback_data=f"admin:slot:toggle:{slot['id']}"
+            text=f"{status} {slot.time}",
+            callback_data=f"admin:slot:toggle:{slot.id}"
         ))
         if len(row) == 3:
             buttons.append(row)
@@ -121,6 +148,7 @@ def slots_keyboard() -> InlineKeyboardMarkup:
         buttons.append(row)
 
     buttons.append([InlineKeyboardButton(text="➕ Добавить слот", callback_data="admin:slot:add")])
+    buttons.append([InlineKeyboardButton(text="🎉 Выходной для всех", callback_data="admin:sched:exc:*")])
     buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin:main")])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -135,7 +163,17 @@ def bookings_filter_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="📅 Неделя", callback_data="admin:bookings:week"),
             InlineKeyboardButton(text="📋 Все", callback_data="admin:bookings:all"),
         ],
-        [InlineKeyboardButton(text="❌ Отменённые", callback_data="admin:bookings:cancelled")],
+        [
+            InlineKeyboardButton(text="⏰ Ближайший час", callback_data="admin:bookings:soon"),
+        ],
+        [
+            InlineKeyboardButton(text="❌ Отменённые", callback_data="admin:bookings:cancelled"),
+            InlineKeyboardButton(text="🔍 Поиск", callback_data="admin:search"),
+        ],
+        [InlineKeyboardButton(
+            text=f"🔔 Уведомления: {notifications.window_label(notifications.get_window())}",
+            callback_data="admin:notify:cycle"
+        )],
         [InlineKeyboardButton(text="◀️ Назад", callback_data="admin:main")],
     ])
 
@@ -154,6 +192,43 @@ def confirm_delete_keyboard(spec_id: str) -> InlineKeyboardMarkup:
         ]
     ])
 
+def broadcast_keyboard(b: dict = None) -> InlineKeyboardMarkup:
+    buttons = []
+    if b and b['status'] == 'running':
+        buttons.append([
+            InlineKeyboardButton(text="🔄 Обновить", callback_data="admin:broadcast"),
+            InlineKeyboardButton(text="⏹ Остановить", callback_data=f"admin:broadcast:stop:{b['id']}"),
+        ])
+    else:
+        buttons.append([InlineKeyboardButton(text="✉️ Новая рассылка", callback_data="admin:broadcast:new")])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin:main")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def broadcast_running_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⏹ Остановить", callback_data=f"admin:broadcast:stop:{broadcast_id}")],
+    ])
+
+def backup_keyboard(backups: list[dict]) -> InlineKeyboardMarkup:
+    buttons = [[InlineKeyboardButton(text="💾 Создать сейчас", callback_data="admin:backup:create")]]
+    for b in backups[:6]:
+        buttons.append([InlineKeyboardButton(
+            text=f"♻️ Восстановить {b['created']:%d.%m %H:%M}",
+            callback_data=f"admin:backup:restore:{b['name']}"
+        )])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin:main")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def schedule_keyboard(spec_id: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✏️ Часы", callback_data=f"admin:sched:hours:{spec_id}"),
+            InlineKeyboardButton(text="⏱ Сеанс", callback_data=f"admin:sched:session:{spec_id}"),
+        ],
+        [InlineKeyboardButton(text="📅 Исключение", callback_data=f"admin:sched:exc:{spec_id}")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin:spec:view:{spec_id}")],
+    ])
+
 def cancel_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="❌ Отмена", callback_data="admin:cancel_action")]
@@ -238,6 +313,7 @@ async def start_edit_welcome(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin:reset_welcome")
 async def reset_welcome(callback: CallbackQuery, state: FSMContext):
     db.set_setting("welcome_text", "")
+    render_cache.invalidate("welcome")
     await state.clear()
     await callback.answer("✅ Приветствие сброшено")
     await admin_main(callback, state)
@@ -251,6 +327,7 @@ async def save_welcome_text(message: Message, state: FSMContext):
         return
     
     db.set_setting("welcome_text", new_text)
+    render_cache.invalidate("welcome")
     await state.clear()
     
     preview = new_text[:300] + "..." if len(new_text) > 300 else new_text
@@ -291,16 +368,16 @@ async def view_specialist(callback: CallbackQuery):
         await callback.answer("Специалист не найден", show_alert=True)
         return
 
-    status = "🟢 Активен" if spec['is_active'] else "🔴 Выключен"
-    photo_status = "✅ Загружено" if spec.get('photo_file_id') else "❌ Нет фото"
+    status = "🟢 Активен" if spec.is_active else "🔴 Выключен"
+    photo_status = "✅ Загружено" if spec.photo_file_id else "❌ Нет фото"
 
     await callback.message.edit_text(
-        f"👤 <b>{spec['name']}</b>\n"
+        f"👤 <b>{spec.name}</b>\n"
         f"━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"🆔 ID: <code>{spec['id']}</code>\n"
+        f"🆔 ID: <code>{spec.id}</code>\n"
         f"📊 Статус: {status}\n"
         f"🖼 Фото: {photo_status}\n\n"
-        f"📝 <b>Описание:</b>\n{spec['description'] or '—'}",
+        f"📝 <b>Описание:</b>\n{spec.description or '—'}",
         reply_markup=specialist_view_keyboard(spec_id),
         parse_mode="HTML"
     )
@@ -374,6 +451,7 @@ async def add_specialist_photo(message: Message, state: FSMContext):
         data.get('new_spec_desc', ''),
         photo_file_id
     )
+    render_cache.invalidate("specialists", data['new_spec_id'])
     await state.clear()
 
     await message.answer(
@@ -396,6 +474,7 @@ async def skip_photo(callback: CallbackQuery, state: FSMContext):
         data['new_spec_name'],
         data.get('new_spec_desc', '')
     )
+    render_cache.invalidate("specialists", data['new_spec_id'])
     await state.clear()
 
     await callback.message.edit_text(
@@ -423,7 +502,7 @@ async def edit_name_start(callback: CallbackQuery, state: FSMContext):
 
     await callback.message.edit_text(
         f"✏️ <b>РЕДАКТИРОВАНИЕ ИМЕНИ</b>\n\n"
-        f"Текущее: <b>{spec['name']}</b>\n\n"
+        f"Текущее: <b>{spec.name}</b>\n\n"
         f"Введите новое имя:",
         reply_markup=cancel_keyboard(),
         parse_mode="HTML"
@@ -433,6 +512,7 @@ async def edit_name_start(callback: CallbackQuery, state: FSMContext):
 async def edit_name(message: Message, state: FSMContext):
     data = await state.get_data()
     db.update_specialist(data['edit_spec_id'], name=message.text.strip())
+    render_cache.invalidate("specialists", data['edit_spec_id'])
     await state.clear()
 
     await message.answer(
@@ -452,7 +532,7 @@ async def edit_desc_start(callback: CallbackQuery, state: FSMContext):
 
     await callback.message.edit_text(
         f"📝 <b>РЕДАКТИРОВАНИЕ ОПИСАНИЯ</b>\n\n"
-        f"Текущее:\n{spec['description'] or '—'}\n\n"
+        f"Текущее:\n{spec.description or '—'}\n\n"
         f"Введите новое (<b>-</b> чтобы очистить):",
         reply_markup=cancel_keyboard(),
         parse_mode="HTML"
@@ -463,6 +543,7 @@ async def edit_desc(message: Message, state: FSMContext):
     data = await state.get_data()
     desc = "" if message.text.strip() == "-" else message.text.strip()
     db.update_specialist(data['edit_spec_id'], description=desc)
+    render_cache.invalidate(data['edit_spec_id'])
     await state.clear()
 
     await message.answer(
@@ -490,6 +571,7 @@ async def edit_photo(message: Message, state: FSMContext):
     data = await state.get_data()
     photo_file_id = message.photo[-1].file_id
     db.update_specialist_photo(data['edit_spec_id'], photo_file_id)
+    render_cache.invalidate("specialists", data['edit_spec_id'])
     await state.clear()
 
     await message.answer(
@@ -507,8 +589,10 @@ async def edit_photo(message: Message, state: FSMContext):
 async def toggle_specialist(callback: CallbackQuery):
     spec_id = callback.data.split(":")[-1]
     db.toggle_specialist(spec_id)
+    render_cache.invalidate("specialists", spec_id)
+    availability.invalidate_schedule()
     spec = db.get_specialist(spec_id)
-    status = "включён ✅" if spec['is_active'] else "выключен 🔴"
+    status = "включён ✅" if spec.is_active else "выключен 🔴"
     await callback.answer(f"Специалист {status}")
     await view_specialist(callback)
 
@@ -519,7 +603,7 @@ async def delete_confirm(callback: CallbackQuery):
 
     await callback.message.edit_text(
         f"⚠️ <b>УДАЛЕНИЕ</b>\n\n"
-        f"Удалить <b>{spec['name']}</b>?\n"
+        f"Удалить <b>{spec.name}</b>?\n"
         f"Это действие нельзя отменить!",
         reply_markup=confirm_delete_keyboard(spec_id),
         parse_mode="HTML"
@@ -529,9 +613,239 @@ async def delete_confirm(callback: CallbackQuery):
 async def delete_specialist(callback: CallbackQuery):
     spec_id = callback.data.split(":")[-1]
     db.delete_specialist(spec_id)
+    render_cache.invalidate("specialists", spec_id)
+    availability.invalidate_schedule()
     await callback.answer("✅ Удалено")
     await list_specialists(callback)
 
+# ═══════════════════════════════════════════════════════════
+# SCHEDULE - рабочие часы, длительность сеанса, исключения
+# ═══════════════════════════════════════════════════════════
+
+WEEKDAY_NAMES = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+
+def _fmt_min(minutes: int) -> str:
+    minutes %= 1440
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _fmt_intervals(intervals: list[tuple[int, int]]) -> str:
+    if not intervals:
+        return "выходной"
+    return ", ".join(f"{_fmt_min(start)}-{_fmt_min(end)}" for start, end in intervals)
+
+def _parse_intervals(parts: list[str]) -> list[tuple[int, int]]:
+    """['10:00-18:00', '22:00-02:00'] -> [(600, 1080), (1320, 1560)]"""
+    intervals = []
+    for part in parts:
+        start_str, end_str = part.split("-")
+        start = datetime.strptime(start_str, "%H:%M")
+        end = datetime.strptime(end_str, "%H:%M")
+        start_min = start.hour * 60 + start.minute
+        end_min = end.hour * 60 + end.minute
+        if end_min <= start_min:
+            end_min += 1440  # после полуночи
+        intervals.append((start_min, end_min))
+    intervals.sort()
+    for (_, prev_end), (next_start, _) in zip(intervals, intervals[1:]):
+        if next_start < prev_end:
+            raise ValueError("overlap")
+    return intervals
+
+def _parse_day(text: str) -> datetime:
+    """dd.mm (ближайшая такая дата) или dd.mm.yyyy"""
+    try:
+        return datetime.strptime(text, "%d.%m.%Y")
+    except ValueError:
+        pass
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = datetime.strptime(f"{text}.{today.year}", "%d.%m.%Y")
+    if day < today:
+        day = day.replace(year=today.year + 1)
+    return day
+
+def _schedule_text(spec: Specialist) -> str:
+    hours = {}
+    for row in db.get_working_hours():
+        if row['specialist_id'] == spec.id:
+            intervals = hours.setdefault(row['weekday'], [])
+            if row['end_min'] > row['start_min']:
+                intervals.append((row['start_min'], row['end_min']))
+
+    if hours:
+        week = "\n".join(
+            f"{WEEKDAY_NAMES[i]}: {_fmt_intervals(hours.get(i, []))}" for i in range(7)
+        )
+    else:
+        week = f"по умолчанию: {_fmt_intervals(availability.DEFAULT_HOURS)}"
+
+    exceptions = {}
+    for row in db.get_schedule_exceptions(datetime.now().strftime("%Y-%m-%d")):
+        if row['specialist_id'] in (spec.id, availability.ALL):
+            intervals = exceptions.setdefault((row['date'], row['specialist_id']), [])
+            if row['end_min'] > row['start_min']:
+                intervals.append((row['start_min'], row['end_min']))
+
+    text = (
+        f"🗓 <b>ГРАФИК: {spec.name}</b>\n"
+        "━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"⏱ Сеанс: <b>{spec.session_minutes or availability.DEFAULT_SESSION} мин</b>\n\n"
+        f"<b>Неделя:</b>\n{week}"
+    )
+    if exceptions:
+        lines = []
+        for (date, spec_id), intervals in sorted(exceptions.items())[:15]:
+            day = datetime.strptime(date, "%Y-%m-%d")
+            mark = " (для всех)" if spec_id == availability.ALL else ""
+            lines.append(f"{day:%d.%m}: {_fmt_intervals(intervals)}{mark}")
+        text += "\n\n<b>Исключения:</b>\n" + "\n".join(lines)
+    return text
+
+def _schedule_done_keyboard(spec_id: str) -> InlineKeyboardMarkup:
+    target = "admin:slots" if spec_id == availability.ALL else f"admin:sched:view:{spec_id}"
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🗓 К графику", callback_data=target)],
+    ])
+
+@router.callback_query(F.data.startswith("admin:sched:view:"))
+async def view_schedule(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    spec_id = callback.data.split(":")[-1]
+    spec = db.get_specialist(spec_id)
+    if not spec:
+        await callback.answer("Специалист не найден", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        _schedule_text(spec),
+        reply_markup=schedule_keyboard(spec_id),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data.startswith("admin:sched:hours:"))
+async def schedule_hours_start(callback: CallbackQuery, state: FSMContext):
+    spec_id = callback.data.split(":")[-1]
+    await state.update_data(sched_spec=spec_id)
+    await state.set_state(AdminState.schedule_hours)
+    await callback.message.edit_text(
+        "✏️ <b>РАБОЧИЕ ЧАСЫ</b>\n\n"
+        "По строке на день:\n"
+        "<code>пн 10:00-18:00 19:00-21:00</code>\n"
+        "<code>сб 22:00-02:00</code> - через полночь\n"
+        "<code>вс -</code> - выходной\n\n"
+        "<code>сброс</code> - вернуть часы по умолчанию",
+        reply_markup=cancel_keyboard(),
+        parse_mode="HTML"
+    )
+
+@router.message(AdminState.schedule_hours)
+async def schedule_hours(message: Message, state: FSMContext):
+    spec_id = (await state.get_data())['sched_spec']
+    text = (message.text or "").strip().lower()
+
+    if text == "сброс":
+        db.clear_working_hours(spec_id)
+    else:
+        days = {}
+        try:
+            for line in text.splitlines():
+                parts = line.split()
+                if not parts:
+                    continue
+                weekday = WEEKDAY_NAMES.index(parts[0])
+                days[weekday] = [] if parts[1:] == ["-"] else _parse_intervals(parts[1:])
+        except (ValueError, IndexError):
+            await message.answer("❌ Формат: <code>пн 10:00-18:00</code> или <code>пн -</code>", parse_mode="HTML")
+            return
+
+        if not days:
+            await message.answer("❌ Введите хотя бы один день")
+            return
+        for weekday, intervals in days.items():
+            db.set_working_hours(spec_id, weekday, intervals)
+
+    availability.invalidate_schedule()
+    await state.clear()
+    await message.answer("✅ График обновлён", reply_markup=_schedule_done_keyboard(spec_id))
+
+@router.callback_query(F.data.startswith("admin:sched:session:"))
+async def schedule_session_start(callback: CallbackQuery, state: FSMContext):
+    spec_id = callback.data.split(":")[-1]
+    await state.update_data(sched_spec=spec_id)
+    await state.set_state(AdminState.schedule_session)
+    await callback.message.edit_text(
+        "⏱ <b>ДЛИТЕЛЬНОСТЬ СЕАНСА</b>\n\n"
+        "Введите минуты <i>(15-480)</i>:",
+        reply_markup=cancel_keyboard(),
+        parse_mode="HTML"
+    )
+
+@router.message(AdminState.schedule_session)
+async def schedule_session(message: Message, state: FSMContext):
+    spec_id = (await state.get_data())['sched_spec']
+    text = (message.text or "").strip()
+
+    if not text.isdigit() or not 15 <= int(text) <= 480:
+        await message.answer("❌ Введите число от 15 до 480")
+        return
+
+    db.set_session_minutes(spec_id, int(text))
+    availability.invalidate_schedule()
+    await state.clear()
+    await message.answer(
+        f"✅ Сеанс: <b>{text} мин</b>",
+        reply_markup=_schedule_done_keyboard(spec_id),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data.startswith("admin:sched:exc:"))
+async def schedule_exception_start(callback: CallbackQuery, state: FSMContext):
+    spec_id = callback.data.split(":")[-1]
+    await state.update_data(sched_spec=spec_id)
+    await state.set_state(AdminState.schedule_exception)
+    title = "ВЫХОДНОЙ ДЛЯ ВСЕХ" if spec_id == availability.ALL else "ИСКЛЮЧЕНИЕ"
+    await callback.message.edit_text(
+        f"📅 <b>{title}</b>\n\n"
+        "<code>31.12 -</code> - выходной\n"
+        "<code>31.12 10:00-14:00</code> - особые часы\n"
+        "<code>31.12 x</code> - убрать исключение",
+        reply_markup=cancel_keyboard(),
+        parse_mode="HTML"
+    )
+
+@router.message(AdminState.schedule_exception)
+async def schedule_exception(message: Message, state: FSMContext):
+    spec_id = (await state.get_data())['sched_spec']
+    parts = (message.text or "").strip().lower().split()
+
+    try:
+        day = _parse_day(parts[0])
+        if parts[1:] == ["x"]:
+            intervals = None
+        elif parts[1:] == ["-"]:
+            intervals = []
+        else:
+            intervals = _parse_intervals(parts[1:])
+            if not intervals:
+                raise ValueError("empty")
+    except (ValueError, IndexError):
+        await message.answer("❌ Формат: <code>31.12 -</code> или <code>31.12 10:00-14:00</code>", parse_mode="HTML")
+        return
+
+    date = day.strftime("%Y-%m-%d")
+    if intervals is None:
+        db.delete_schedule_exception(spec_id, date)
+        result = "убрано"
+    else:
+        db.set_schedule_exception(spec_id, date, intervals)
+        result = _fmt_intervals(intervals)
+
+    availability.invalidate_schedule()
+    await state.clear()
+    await message.answer(
+        f"✅ {day:%d.%m}: {result}",
+        reply_markup=_schedule_done_keyboard(spec_id)
+    )
+
 # ═══════════════════════════════════════════════════════════
 # TIME SLOTS
 # ═══════════════════════════════════════════════════════════
@@ -550,6 +864,7 @@ async def list_slots(callback: CallbackQuery):
 async def toggle_slot(callback: CallbackQuery):
     slot_id = int(callback.data.split(":")[-1])
     db.toggle_time_slot(slot_id)
+    render_cache.invalidate("slots")
     await callback.message.edit_reply_markup(reply_markup=slots_keyboard())
     await callback.answer("✅ Обновлено")
 
@@ -575,6 +890,7 @@ async def add_slot(message: Message, state: FSMContext):
         return
 
     if db.add_time_slot(time_str):
+        render_cache.invalidate("slots")
         await state.clear()
         await message.answer(
             f"✅ Слот <b>{time_str}</b> добавлен!",
@@ -599,6 +915,17 @@ async def bookings_menu(callback: CallbackQuery):
         parse_mode="HTML"
     )
 
+@router.callback_query(F.data == "admin:notify:cycle")
+async def cycle_notify_mode(callback: CallbackQuery, bot: Bot):
+    windows = notifications.WINDOWS
+    current = notifications.get_window()
+    new = windows[(windows.index(current) + 1) % len(windows)] if current in windows else 0
+    notifications.set_window(new)
+    if not new:
+        await notifications.flush(bot)
+    await callback.answer(f"🔔 Уведомления: {notifications.window_label(new)}")
+    await callback.message.edit_reply_markup(reply_markup=bookings_filter_keyboard())
+
 @router.callback_query(F.data.startswith("admin:bookings:"))
 async def list_bookings(callback: CallbackQuery):
     filter_type = callback.data.split(":")[-1]
@@ -616,6 +943,9 @@ async def list_bookings(callback: CallbackQuery):
     elif filter_type == "week":
         bookings = db.get_bookings(date_from=today, date_to=week_end)
         title = "📅 НЕДЕЛЯ"
+    elif filter_type == "soon":
+        bookings = db.get_bookings_starting(60)
+        title = "⏰ БЛИЖАЙШИЙ ЧАС"
     elif filter_type == "cancelled":
         bookings = db.get_bookings(status='cancelled')
         title = "❌ ОТМЕНЁННЫЕ"
@@ -628,17 +958,17 @@ async def list_bookings(callback: CallbackQuery):
     else:
         text = f"<b>{title}</b>\n\n"
         for b in bookings[:10]:
-            date = datetime.strptime(b['date'], "%Y-%m-%d").strftime("%d.%m")
-            icon = "🚨" if b.get('booking_type', '').startswith('urgent') else "📅"
-            text += f"{icon} <b>{date} {b['time']}</b> — {b['specialist_name']}\n"
-            text += f"    👤 {b['client_name']}\n"
+            date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m")
+            icon = "🚨" if (b.booking_type or '').startswith('urgent') else "📅"
+            text += f"{icon} <b>{date} {b.time}</b> — {b.specialist_name}\n"
+            text += f"    👤 {b.client_name}\n"
 
     buttons = []
     if bookings:
         for b in bookings[:3]:
             buttons.append([InlineKeyboardButton(
-                text=f"📋 {b['client_name'][:20]}",
-                callback_data=f"admin:booking:view:{b['id']}"
+                text=f"📋 {b.client_name[:20]}",
+                callback_data=f"admin:booking:view:{b.id}"
             )])
 
     buttons.append([InlineKeyboardButton(text="🔄 Обновить", callback_data=f"admin:bookings:{filter_type}")])
@@ -646,6 +976,60 @@ async def list_bookings(callback: CallbackQuery):
 
     await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="HTML")
 
+# ═══════════════════════════════════════════════════════════
+# SEARCH
+# ═══════════════════════════════════════════════════════════
+
+async def send_search_results(message: Message, query: str):
+    results = db.search_bookings(query, limit=10)
+
+    if not results:
+        text = f"🔍 <b>Поиск:</b> {query}\n\nНичего не найдено"
+    else:
+        text = f"🔍 <b>Поиск:</b> {query}\n\n"
+        for b in results:
+            date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m.%Y")
+            status = "" if b.status == 'confirmed' else " ❌"
+            text += f"<b>#{b.id}</b> {date} {b.time} — {b.specialist_name}{status}\n"
+            text += f"    👤 {b.client_name} · <code>{b.client_phone}</code>\n"
+
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"📋 #{b.id} {b.client_name[:20]}",
+            callback_data=f"admin:booking:view:{b.id}"
+        )]
+        for b in results
+    ]
+    buttons.append([InlineKeyboardButton(text="🔍 Новый поиск", callback_data="admin:search")])
+    buttons.append([InlineKeyboardButton(text="◀️ К записям", callback_data="admin:bookings")])
+
+    await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="HTML")
+
+@router.message(Command("find"))
+async def cmd_find(message: Message, state: FSMContext):
+    await state.clear()
+    query = message.text.partition(" ")[2].strip()
+    if not query:
+        await message.answer("🔍 Использование: /find <code>имя, телефон или @username</code>", parse_mode="HTML")
+        return
+    await send_search_results(message, query)
+
+@router.callback_query(F.data == "admin:search")
+async def search_start(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(AdminState.search_bookings)
+    await callback.message.edit_text(
+        "🔍 <b>ПОИСК ЗАПИСЕЙ</b>\n\n"
+        "Введите имя, телефон или @username клиента.\n"
+        "<i>Можно начало слова или последние 4 цифры телефона.</i>",
+        reply_markup=cancel_keyboard(),
+        parse_mode="HTML"
+    )
+
+@router.message(AdminState.search_bookings)
+async def search_bookings(message: Message, state: FSMContext):
+    await state.clear()
+    await send_search_results(message, (message.text or "").strip())
+
 @router.callback_query(F.data.startswith("admin:booking:view:"))
 async def view_booking(callback: CallbackQuery):
     booking_id = int(callback.data.split(":")[-1])
@@ -655,26 +1039,26 @@ async def view_booking(callback: CallbackQuery):
         await callback.answer("Не найдено", show_alert=True)
         return
 
-    date = datetime.strptime(b['date'], "%Y-%m-%d").strftime("%d.%m.%Y")
-    status_text = "✅ Подтверждена" if b['status'] == 'confirmed' else "❌ Отменена"
+    date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m.%Y")
+    status_text = "✅ Подтверждена" if b.status == 'confirmed' else "❌ Отменена"
     
     type_text = {
         'urgent_15': '🚨 Срочно (15 мин)',
         'urgent_60': '⏰ В течение часа',
         'scheduled': '📅 По записи'
-    }.get(b.get('booking_type', 'scheduled'), '📅 По записи')
+    }.get(b.booking_type, '📅 По записи')
 
     await callback.message.edit_text(
-        f"📋 <b>ЗАПИСЬ #{b['id']}</b>\n\n"
+        f"📋 <b>ЗАПИСЬ #{b.id}</b>\n\n"
         f"📌 Тип: {type_text}\n"
-        f"👤 Специалист: <b>{b['specialist_name']}</b>\n"
+        f"👤 Специалист: <b>{b.specialist_name}</b>\n"
         f"📅 Дата: {date}\n"
-        f"🕐 Время: {b['time']}\n\n"
-        f"👤 Клиент: <b>{b['client_name']}</b>\n"
-        f"📱 Телефон: <code>{b['client_phone']}</code>\n"
-        f"🆔 @{b['client_username'] or '—'}\n\n"
+        f"🕐 Время: {b.time}\n\n"
+        f"👤 Клиент: <b>{b.client_name}</b>\n"
+        f"📱 Телефон: <code>{b.client_phone}</code>\n"
+        f"🆔 @{b.client_username or '—'}\n\n"
         f"📊 Статус: {status_text}",
-        reply_markup=booking_view_keyboard(booking_id, b['status']),
+        reply_markup=booking_view_keyboard(booking_id, b.status),
         parse_mode="HTML"
     )
 
@@ -685,6 +1069,166 @@ async def cancel_booking(callback: CallbackQuery):
     await callback.answer("✅ Отменено")
     await view_booking(callback)
 
+# ═══════════════════════════════════════════════════════════
+# BROADCAST
+# ═══════════════════════════════════════════════════════════
+
+@router.callback_query(F.data == "admin:broadcast")
+async def broadcast_menu(callback: CallbackQuery, state: FSMContext):
+    import broadcast
+    await state.clear()
+    b = db.get_last_broadcast()
+
+    if b:
+        text = broadcast.format_progress(b)
+    else:
+        text = "📣 <b>РАССЫЛКА</b>\n━━━━━━━━━━━━━━━━━━━━\n\nРассылок ещё не было"
+    text += f"\n\n👥 Получателей сейчас: <b>{db.count_broadcast_recipients()}</b>"
+
+    await callback.message.edit_text(text, reply_markup=broadcast_keyboard(b), parse_mode="HTML")
+
+@router.callback_query(F.data == "admin:broadcast:new")
+async def broadcast_new(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(AdminState.broadcast_text)
+    await callback.message.edit_text(
+        "✉️ <b>НОВАЯ РАССЫЛКА</b>\n\n"
+        "Отправьте текст сообщения (HTML поддерживается).\n"
+        "Его получат все, кто когда-либо записывался.",
+        reply_markup=cancel_keyboard(),
+        parse_mode="HTML"
+    )
+
+@router.message(AdminState.broadcast_text)
+async def broadcast_preview(message: Message, state: FSMContext):
+    text = message.text or message.caption or ""
+
+    if not text.strip():
+        await message.answer("⚠️ Текст не может быть пустым")
+        return
+
+    await state.update_data(broadcast_text=text)
+    await message.answer(
+        f"👁 <b>ПРЕДПРОСМОТР</b>\n\n{text}\n\n"
+        f"👥 Получателей: <b>{db.count_broadcast_recipients()}</b>",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Отправить", callback_data="admin:broadcast:send")],
+            [InlineKeyboardButton(text="❌ Отмена", callback_data="admin:cancel_action")],
+        ]),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data == "admin:broadcast:send")
+async def broadcast_send(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    import broadcast
+    data = await state.get_data()
+    await state.clear()
+
+    if not data.get('broadcast_text'):
+        await callback.answer("Текст не найден", show_alert=True)
+        return
+
+    broadcast_id = broadcast.start_broadcast(bot, data['broadcast_text'])
+    b = db.get_broadcast(broadcast_id)
+
+    await callback.message.edit_text(
+        broadcast.format_progress(b),
+        reply_markup=broadcast_running_keyboard(broadcast_id),
+        parse_mode="HTML"
+    )
+    broadcast.watch_progress(
+        bot, callback.message.chat.id, callback.message.message_id,
+        broadcast_id, broadcast_running_keyboard(broadcast_id)
+    )
+
+@router.callback_query(F.data.startswith("admin:broadcast:stop:"))
+async def broadcast_stop(callback: CallbackQuery, state: FSMContext):
+    import broadcast
+    broadcast_id = int(callback.data.split(":")[-1])
+    if broadcast.stop_broadcast(broadcast_id):
+        await callback.answer("⏹ Рассылка остановлена")
+    else:
+        await callback.answer("Рассылка уже завершена")
+    await broadcast_menu(callback, state)
+
+# ═══════════════════════════════════════════════════════════
+# BACKUP
+# ═══════════════════════════════════════════════════════════
+
+def _size(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} МБ" if size >= 1024 * 1024 else f"{size // 1024} КБ"
+
+@router.callback_query(F.data == "admin:backup")
+async def backup_menu(callback: CallbackQuery):
+    import backup
+    backups = await asyncio.to_thread(backup.list_backups)
+    lines = [f"📦 {b['created']:%d.%m.%Y %H:%M} · {_size(b['size'])}" for b in backups]
+
+    await callback.message.edit_text(
+        "💾 <b>РЕЗЕРВНЫЕ КОПИИ</b>\n"
+        "━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"Автоматически каждые {backup.BACKUP_INTERVAL // 3600} ч, "
+        f"хранится {backup.KEEP} последних.\n\n"
+        + ("\n".join(lines) if lines else "Копий пока нет"),
+        reply_markup=backup_keyboard(backups),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data == "admin:backup:create")
+async def backup_create(callback: CallbackQuery):
+    import backup
+    await callback.answer("⏳ Создаю копию...")
+    try:
+        result = await backup.create_backup()
+    except Exception as e:
+        await callback.message.answer(f"❌ Бэкап не удался: {e}")
+        return
+    await callback.message.answer(
+        f"✅ Копия создана и проверена\n"
+        f"📦 {_size(result['size'])} за {result['seconds']:.1f} с"
+    )
+    await backup_menu(callback)
+
+@router.callback_query(F.data.startswith("admin:backup:restore:"))
+async def backup_restore_confirm(callback: CallbackQuery):
+    name = callback.data.split(":")[-1]
+    created = datetime.strptime(name, "%Y%m%d-%H%M%S")
+    await callback.message.edit_text(
+        f"⚠️ <b>ВОССТАНОВЛЕНИЕ</b>\n\n"
+        f"Вернуть базу к состоянию на <b>{created:%d.%m.%Y %H:%M}</b>?\n"
+        f"Записи, сделанные позже, пропадут. Текущая база будет сохранена в новую копию.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Восстановить", callback_data=f"admin:backup:restore_ok:{name}"),
+                InlineKeyboardButton(text="❌ Отмена", callback_data="admin:backup"),
+            ]
+        ]),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data.startswith("admin:backup:restore_ok:"))
+async def backup_restore(callback: CallbackQuery, bot: Bot):
+    import backup
+    import holds
+    import waitlist
+    name = callback.data.split(":")[-1]
+    await callback.answer("⏳ Восстанавливаю...")
+    try:
+        await backup.restore_backup(name)
+    except Exception as e:
+        await callback.message.answer(f"❌ Восстановление не удалось: {e}")
+        return
+
+    render_cache.invalidate()
+    availability.invalidate()
+    availability.invalidate_schedule()
+    # Удержания слотов и таймеры предложений ссылаются на строки старой базы
+    holds.stop()
+    holds.start()
+    waitlist.stop()
+    waitlist.start(bot)
+    await callback.message.answer("✅ База восстановлена")
+    await backup_menu(callback)
+
 # ═══════════════════════════════════════════════════════════
 # STATISTICS
 # ═══════════════════════════════════════════════════════════
@@ -701,12 +1245,150 @@ async def show_stats(callback: CallbackQuery):
         f"📊 Всего: <b>{stats['total_bookings']}</b>\n"
         f"❌ Отменённых: <b>{stats['cancelled_bookings']}</b>",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📈 Аналитика", callback_data="admin:analytics:30")],
             [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin:stats")],
             [InlineKeyboardButton(text="◀️ Назад", callback_data="admin:main")],
         ]),
         parse_mode="HTML"
     )
 
+def analytics_keyboard(days: int) -> InlineKeyboardMarkup:
+    periods = [7, 30, 90]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=f"{'• ' if p == days else ''}{p} дн.",
+                callback_data=f"admin:analytics:{p}"
+            )
+            for p in periods
+        ],
+        [InlineKeyboardButton(text="🔻 Воронка записи", callback_data=f"admin:funnel:{days}")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="admin:stats")],
+    ])
+
+def _percent(part: int, total: int) -> str:
+    return f"{part * 100 / total:.0f}%" if total else "—"
+
+@router.callback_query(F.data.startswith("admin:analytics:"))
+async def show_analytics(callback: CallbackQuery):
+    days = int(callback.data.split(":")[-1])
+    date_to = datetime.now().strftime("%Y-%m-%d")
+    date_from = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+    daily = db.get_daily_totals(date_from, date_to)
+    by_spec = db.get_specialist_analytics(date_from, date_to)
+    by_type = db.get_type_analytics(date_from, date_to)
+
+    created = sum(d['created'] for d in daily)
+    cancelled = sum(d['cancelled'] for d in daily)
+    urgent = sum(s['urgent'] for s in by_spec)
+
+    text = (
+        f"📈 <b>АНАЛИТИКА · {days} дн.</b>\n"
+        "━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"📊 Записей: <b>{created}</b>\n"
+        f"❌ Отмен: <b>{cancelled}</b> ({_percent(cancelled, created)})\n"
+        f"🚨 Срочных: <b>{urgent}</b> ({_percent(urgent, created)})\n"
+    )
+
+    if daily:
+        # Тренд по неделям (из дневных строк rollup-таблицы)
+        weeks: dict[str, int] = {}
+        for d in daily:
+            day = datetime.strptime(d['day'], "%Y-%m-%d")
+            week_start = (day - timedelta(days=day.weekday())).strftime("%d.%m")
+            weeks[week_start] = weeks.get(week_start, 0) + d['created']
+        peak = max(weeks.values()) or 1
+        text += "\n📅 <b>По неделям:</b>\n"
+        for week_start, count in weeks.items():
+            bar = "▇" * max(1, round(count * 10 / peak)) if count else ""
+            text += f"<code>{week_start}</code> {bar} {count}\n"
+
+    if by_spec:
+        text += "\n👥 <b>По специалистам:</b>\n"
+        for s in by_spec:
+            text += (
+                f"• {s['specialist_name']} — <b>{s['created']}</b> "
+                f"(отм. {_percent(s['cancelled'], s['created'])}, "
+                f"сроч. {_percent(s['urgent'], s['created'])})\n"
+            )
+
+    if by_type:
+        text += (
+            "\n📌 <b>По типу:</b>\n"
+            f"🚨 15 мин: {by_type.get('urgent_15', 0)} · "
+            f"⏰ Час: {by_type.get('urgent_60', 0)} · "
+            f"📅 По записи: {by_type.get('scheduled', 0)}"
+        )
+
+    await callback.message.edit_text(text, reply_markup=analytics_keyboard(days), parse_mode="HTML")
+
+@router.callback_query(F.data.startswith("admin:funnel:"))
+async def show_funnel(callback: CallbackQuery):
+    days = int(callback.data.split(":")[-1])
+    await funnel.flush()
+    stages = funnel.report(days)
+
+    first = stages[0]['users']
+    text = (
+        f"🔻 <b>ВОРОНКА · {days} дн.</b>\n"
+        "━━━━━━━━━━━━━━━━━━━━\n"
+        "<i>уникальные пользователи · от старта · от пред. шага</i>\n\n"
+    )
+    previous = None
+    for stage in stages:
+        users = stage['users']
+        text += f"<b>{stage['title']}</b>: {users}"
+        if previous is not None:
+            text += f" · {_percent(users, first)} · {_percent(users, previous)}"
+        text += "\n"
+        previous = users
+
+    if funnel.dropped():
+        text += f"\n⚠️ Потеряно событий (переполнение буфера): {funnel.dropped()}"
+
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"{'• ' if p == days else ''}{p} дн.",
+                    callback_data=f"admin:funnel:{p}"
+                )
+                for p in [7, 30, 90]
+            ],
+            [InlineKeyboardButton(text="◀️ К аналитике", callback_data=f"admin:analytics:{days}")],
+        ]),
+        parse_mode="HTML"
+    )
+
+@router.message(Command("load"))
+async def cmd_load(message: Message):
+    import scheduler
+    await message.answer(f"{scheduler.format_stats()}\n\n{health.format_lag()}", parse_mode="HTML")
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, bot: Bot):
+    """/profile [секунд] - профиль работающего бота, приходит файлами"""
+    import profiler
+    args = message.text.split()[1:]
+    seconds = int(args[0]) if args and args[0].isdigit() else profiler.DEFAULT_SECONDS
+    seconds = max(1, min(seconds, profiler.MAX_SECONDS))
+    if not profiler.start(bot, message.chat.id, seconds):
+        await message.answer("⏱ Профилирование уже идёт")
+        return
+    await message.answer(f"⏱ Профилирую {seconds} с, файлы пришлю сюда")
+
+@router.message(Command("stalls"))
+async def cmd_stalls(message: Message):
+    """/stalls - места, державшие event loop; /stalls reset - обнулить"""
+    import stalls
+    if message.text.split()[1:] == ["reset"]:
+        stalls.reset()
+        await message.answer("🐢 Статистика зависаний сброшена")
+        return
+    await message.answer(stalls.format_report(), parse_mode="HTML")
+
 @router.callback_query(F.data == "ignore")
 async def ignore_callback(callback: CallbackQuery):
     await callback.answer()
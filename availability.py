@@ -0,0 +1,240 @@
+"""
+Availability - расписание и свободные слоты
+Working hours, exceptions and bookings are turned into free intervals
+with sorted-interval arithmetic. Busy times of all specialists for a
+range come from one grouped query and are cached per day; the schedule
+itself is cached until an admin changes it.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+import database as db
+import tenants
+
+DAYS_AHEAD = 14
+DEFAULT_HOURS = [(8 * 60, 26 * 60)]    # 08:00-02:00, если график не задан
+DEFAULT_SESSION = 60
+ALL = "*"                              # исключение для всех (праздник)
+
+Interval = tuple[int, int]             # минуты от 00:00 рабочего дня
+Slot = tuple[str, str]                 # (YYYY-MM-DD, HH:MM)
+
+# booked: date -> specialist_id -> sorted busy (start, end) minutes
+# schedule: sessions / weekly / exceptions, None until loaded
+_state = tenants.TenantLocal(booked=dict, schedule=lambda: None)
+
+
+def invalidate(specialist_id: str = None, date: str = None, time: str = None):
+    """Booking listener: forget busy times of one date (or everything)"""
+    if date is None:
+        _state.booked.clear()
+    else:
+        _state.booked.pop(date, None)
+
+
+def invalidate_schedule():
+    """Admin changed hours, exceptions or session length"""
+    _state.schedule = None
+
+
+db.add_booking_listener(invalidate)
+
+
+# ═══════════════════════════════════════════════════════════
+# Loading
+# ═══════════════════════════════════════════════════════════
+
+def _to_min(time: str) -> int:
+    return int(time[:2]) * 60 + int(time[3:5])
+
+
+def _load_schedule() -> dict:
+    if _state.schedule is None:
+        sessions = {
+            s.id: s.session_minutes or DEFAULT_SESSION
+            for s in db.get_specialists(active_only=False)
+        }
+        weekly: dict[str, dict[int, list[Interval]]] = {}
+        for row in db.get_working_hours():
+            days = weekly.setdefault(row['specialist_id'], {})
+            intervals = days.setdefault(row['weekday'], [])
+            if row['end_min'] > row['start_min']:
+                intervals.append((row['start_min'], row['end_min']))
+
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        exceptions: dict[tuple[str, str], list[Interval]] = {}
+        for row in db.get_schedule_exceptions(yesterday):
+            intervals = exceptions.setdefault((row['specialist_id'], row['date']), [])
+            if row['end_min'] > row['start_min']:
+                intervals.append((row['start_min'], row['end_min']))
+
+        _state.schedule = {'sessions': sessions, 'weekly': weekly, 'exceptions': exceptions}
+    return _state.schedule
+
+
+def _load_booked(dates: list[str]):
+    """Fill the busy cache for missing dates with a single query"""
+    booked = _state.booked
+    missing = [d for d in dates if d not in booked]
+    if not missing:
+        return
+    keep_from = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    for past in [d for d in booked if d < keep_from]:
+        del booked[past]
+
+    loaded: dict[str, dict[str, list[Interval]]] = {d: {} for d in missing}
+    for date, spec_id, time, start_ts, end_ts in db.get_booked_slots(min(missing), max(missing)):
+        if date in loaded:
+            # Длительность - сохранённая у записи, а не текущая настройка
+            start = _to_min(time)
+            loaded[date].setdefault(spec_id, []).append((start, start + (end_ts - start_ts) // 60))
+    for date, specs in loaded.items():
+        booked[date] = {spec_id: tuple(sorted(spans)) for spec_id, spans in specs.items()}
+
+
+def _dates(day: datetime, before: int, after: int) -> list[str]:
+    return [(day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(-before, after + 1)]
+
+
+# ═══════════════════════════════════════════════════════════
+# Interval arithmetic
+# ═══════════════════════════════════════════════════════════
+
+def subtract(intervals: list[Interval], busy: list[Interval]) -> list[Interval]:
+    """intervals minus busy; both sorted by start, result sorted"""
+    result = []
+    i = 0
+    for start, end in intervals:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > start:
+                result.append((start, busy[j][0]))
+            start = max(start, busy[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def working_intervals(specialist_id: str, day: datetime) -> list[Interval]:
+    """Personal exception > holiday for all > weekly hours > default"""
+    schedule = _load_schedule()
+    date = day.strftime("%Y-%m-%d")
+    exceptions = schedule['exceptions']
+    if (specialist_id, date) in exceptions:
+        return exceptions[(specialist_id, date)]
+    if (ALL, date) in exceptions:
+        return exceptions[(ALL, date)]
+    weekly = schedule['weekly'].get(specialist_id)
+    if weekly is None:
+        return DEFAULT_HOURS
+    return sorted(weekly.get(day.weekday(), []))
+
+
+def session_minutes(specialist_id: str) -> int:
+    return _load_schedule()['sessions'].get(specialist_id, DEFAULT_SESSION)
+
+
+def busy_intervals(specialist_id: str, day: datetime) -> list[Interval]:
+    """Bookings of day-1 .. day+1 relative to day's 00:00 (needs _load_booked)"""
+    busy = []
+    for offset, date in zip((-1, 0, 1), _dates(day, 1, 1)):
+        for start, end in _state.booked[date].get(specialist_id, ()):
+            busy.append((start + offset * 1440, end + offset * 1440))
+    busy.sort()
+    return busy
+
+
+def _slots(specialist_id: str, day: datetime, now: datetime) -> list[Slot]:
+    duration = session_minutes(specialist_id)
+    free = subtract(working_intervals(specialist_id, day), busy_intervals(specialist_id, day))
+    slots = []
+    for start, end in free:
+        while start + duration <= end:
+            at = day + timedelta(minutes=start)
+            if at > now:
+                slots.append((at.strftime("%Y-%m-%d"), at.strftime("%H:%M")))
+            start += duration
+    return slots
+
+
+# ═══════════════════════════════════════════════════════════
+# Public API
+# ═══════════════════════════════════════════════════════════
+
+def free_slots_range(
+    day_from: datetime, days: int, specialist_ids: list[str] = None
+) -> dict[str, list[tuple[datetime, list[Slot]]]]:
+    """Free slots of every specialist for `days` working days at once"""
+    now = datetime.now()
+    _load_booked(_dates(day_from, 1, days))
+    if specialist_ids is None:
+        specialist_ids = [s.id for s in db.get_specialists()]
+    working_days = [day_from + timedelta(days=i) for i in range(days)]
+    return {
+        spec_id: [(day, _slots(spec_id, day, now)) for day in working_days]
+        for spec_id in specialist_ids
+    }
+
+
+def calendar(specialist_id: str, days: int = DAYS_AHEAD) -> list[tuple[datetime, list[Slot]]]:
+    """Free slots per working day, today first"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return free_slots_range(today, days, [specialist_id])[specialist_id]
+
+
+def free_slots(specialist_id: str, day: datetime) -> list[Slot]:
+    return free_slots_range(day, 1, [specialist_id])[specialist_id][0][1]
+
+
+def available_at(specialist_id: str, at: datetime) -> bool:
+    """Can a session start at `at`: inside working hours and not overlapping"""
+    duration = session_minutes(specialist_id)
+    midnight = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Ночное время может относиться к рабочему дню накануне
+    for day in (midnight, midnight - timedelta(days=1)):
+        _load_booked(_dates(day, 1, 1))
+        start = int((at - day).total_seconds() // 60)
+        session = (start, start + duration)
+        inside = any(s <= session[0] and session[1] <= e for s, e in working_intervals(specialist_id, day))
+        if inside and subtract([session], busy_intervals(specialist_id, day)) == [session]:
+            return True
+    return False
+
+
+def is_free(specialist_id: str, date: str, time: str) -> bool:
+    return available_at(specialist_id, datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M"))
+
+
+def nearest_slot(specialist_id: str) -> Optional[Slot]:
+    for day, slots in calendar(specialist_id):
+        if slots:
+            return slots[0]
+    return None
+
+
+def taken_slots(specialist_id: str, day: datetime) -> list[Slot]:
+    """Upcoming booked (or held) session starts of a day - waitlist candidates"""
+    now = datetime.now()
+    date = day.strftime("%Y-%m-%d")
+    _load_booked([date])
+    slots = []
+    for start, _ in _state.booked[date].get(specialist_id, ()):
+        at = day + timedelta(minutes=start)
+        if at > now:
+            slots.append((date, at.strftime("%H:%M")))
+    return slots
+
+
+def free_dates(specialist_id: str, time: str, dates: list[str]) -> list[str]:
+    """Dates on which a session at `time` fits (recurring bookings); busy
+    times of the whole range are loaded with one query"""
+    if not dates:
+        return []
+    first, last = min(dates), max(dates)
+    days = (datetime.strptime(last, "%Y-%m-%d") - datetime.strptime(first, "%Y-%m-%d")).days
+    _load_booked(_dates(datetime.strptime(first, "%Y-%m-%d"), 1, days + 1))
+    return [date for date in dates if is_free(specialist_id, date, time)]
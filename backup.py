@@ -0,0 +1,187 @@
+"""
+Backup - онлайн-снапшоты базы
+Snapshots are taken with the SQLite backup API in small page steps in a
+worker thread; the source is unlocked between steps, so booking writes
+never wait for a whole copy. Every snapshot is checked with
+PRAGMA integrity_check before it replaces an older one.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import database as db
+import tenants
+
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL = 6 * 3600     # секунд между автоматическими бэкапами
+KEEP = 7                       # сколько снапшотов хранить
+PAGES_PER_STEP = 256           # страниц за один шаг backup()
+STEP_PAUSE = 0.005             # пауза между шагами, база в это время свободна
+MAX_RESTARTS = 3               # после стольких перезапусков копируем за один проход
+
+PREFIX = "bot_data-"
+SUFFIX = ".db"
+
+_state = tenants.TenantLocal(task=lambda: None, lock=asyncio.Lock)
+
+
+def backup_dir() -> str:
+    """BACKUP_DIR, or a subfolder per tenant in multi-tenant mode"""
+    tenant = tenants.current()
+    return os.path.join(BACKUP_DIR, tenant.name) if tenant else BACKUP_DIR
+
+
+def _path(name: str) -> str:
+    return os.path.join(backup_dir(), f"{PREFIX}{name}{SUFFIX}")
+
+
+def verify(path: str) -> bool:
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError:
+        return False
+
+
+def list_backups() -> list[dict]:
+    """Newest first: name (timestamp), size, created"""
+    directory = backup_dir()
+    if not os.path.isdir(directory):
+        return []
+    result = []
+    for file in os.listdir(directory):
+        if file.startswith(PREFIX) and file.endswith(SUFFIX):
+            name = file[len(PREFIX):-len(SUFFIX)]
+            try:
+                created = datetime.strptime(name, "%Y%m%d-%H%M%S")
+            except ValueError:
+                continue
+            size = os.path.getsize(os.path.join(directory, file))
+            result.append({'name': name, 'size': size, 'created': created})
+    result.sort(key=lambda b: b['name'], reverse=True)
+    return result
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(src: sqlite3.Connection, dst: sqlite3.Connection):
+    """Stepwise copy. A write from another connection restarts the backup
+    from page 0; under constant writes it would never finish, so after
+    MAX_RESTARTS the copy is done in one pass (writers wait for it)."""
+    last = None
+    restarts = 0
+
+    def progress(status: int, remaining: int, total: int):
+        nonlocal last, restarts
+        if last is not None and remaining > last:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted
+        last = remaining
+
+    try:
+        src.backup(dst, pages=PAGES_PER_STEP, progress=progress, sleep=STEP_PAUSE)
+    except _Restarted:
+        src.backup(dst, pages=-1)
+
+
+def _rotate():
+    for old in list_backups()[KEEP:]:
+        os.remove(_path(old['name']))
+
+
+def _snapshot(name: str, rotate: bool) -> dict:
+    os.makedirs(backup_dir(), exist_ok=True)
+    target = _path(name)
+    tmp = target + ".tmp"
+    started = time.monotonic()
+
+    src = sqlite3.connect(db.db_path())
+    dst = sqlite3.connect(tmp)
+    try:
+        _copy(src, dst)
+    finally:
+        dst.close()
+        src.close()
+
+    if not verify(tmp):
+        os.remove(tmp)
+        raise sqlite3.DatabaseError("integrity_check failed")
+    os.replace(tmp, target)
+    if rotate:
+        _rotate()
+    return {
+        'name': name,
+        'size': os.path.getsize(target),
+        'seconds': time.monotonic() - started,
+    }
+
+
+def _restore(name: str):
+    source = _path(name)
+    if not verify(source):
+        raise sqlite3.DatabaseError("integrity_check failed")
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(db.db_path())
+    try:
+        # pages=-1: одна транзакция, другие соединения не увидят половину
+        src.backup(dst, pages=-1)
+    finally:
+        dst.close()
+        src.close()
+
+
+# ═══════════════════════════════════════════════════════════
+# Public API
+# ═══════════════════════════════════════════════════════════
+
+async def create_backup(rotate: bool = True) -> dict:
+    async with _state.lock:
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        # Имя - секунда: вторая копия в ту же секунду затёрла бы первую
+        while os.path.exists(_path(name)):
+            await asyncio.sleep(0.2)
+            name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        return await asyncio.to_thread(_snapshot, name, rotate)
+
+
+async def restore_backup(name: str):
+    """Replace the live DB with a snapshot; a fresh backup is taken first.
+    Callers must drop their caches and reload slot holds and waitlist
+    timers afterwards."""
+    if not os.path.exists(_path(name)):
+        raise FileNotFoundError(name)
+    # Без ротации, иначе восстанавливаемый снапшот может быть удалён
+    await create_backup(rotate=False)
+    async with _state.lock:
+        await asyncio.to_thread(_restore, name)
+    # Снапшот мог быть сделан до последних миграций
+    await asyncio.to_thread(db.init_db)
+
+
+async def _backup_loop():
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        try:
+            await create_backup()
+        except Exception as e:
+            print(f"⚠️ Backup failed: {e}")
+
+
+def start():
+    if _state.task is None:
+        _state.task = asyncio.create_task(_backup_loop())
+
+
+def stop():
+    if _state.task:
+        _state.task.cancel()
+        _state.task = None
@@ -0,0 +1,121 @@
+"""
+Range query benchmark - TEXT date/time против индекса по start_ts
+
+    python bench_epoch.py [bookings]
+
+Fills a scratch database with bookings spread over the whole day (so
+"the next hour" often crosses midnight), then times the same range
+questions asked the old way - string comparisons on date and time - and
+through the start_ts index (migration 12). Every query is run REPEAT
+times; the result counts must match.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database as db
+
+BOOKINGS = 1_000_000
+SPECIALISTS = 20
+PER_DAY = 300
+REPEAT = 20
+
+
+def fill(count: int) -> datetime:
+    """Returns the 'now' used by the queries: 23:30 of a middle day"""
+    db.init_db()
+    start = datetime(2020, 1, 1)
+    with db.get_db() as conn:
+        conn.executemany(
+            "INSERT INTO specialists (id, name, description) VALUES (?, ?, ?)",
+            [(f"spec_{i}", f"Специалист {i}", "") for i in range(SPECIALISTS)]
+        )
+        # Без триггеров FTS и статистики заполнение в разы быстрее
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+
+        def rows():
+            for i in range(count):
+                at = start + timedelta(days=i // PER_DAY, minutes=(i % PER_DAY) * 1440 // PER_DAY)
+                ts = int(at.timestamp())
+                yield (f"spec_{i % SPECIALISTS}", at.strftime("%Y-%m-%d"), at.strftime("%H:%M"),
+                       f"Клиент {i}", f"+7900{i:07d}", f"user{i}", 100_000 + i, ts, ts + 3600)
+
+        conn.executemany(
+            """INSERT INTO bookings (specialist_id, date, time, client_name, client_phone,
+                                     client_username, client_user_id, start_ts, end_ts)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows()
+        )
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+    return start + timedelta(days=count // PER_DAY // 2, hours=23, minutes=30)
+
+
+def cases(now: datetime) -> list[tuple[str, str, tuple, str, tuple]]:
+    """(question, old query, params, new query, params)"""
+    soon = now + timedelta(minutes=60)
+    today = now.strftime("%Y-%m-%d")
+    week_end = (now + timedelta(days=7)).strftime("%Y-%m-%d")
+    now_ts, soon_ts = int(now.timestamp()), int(soon.timestamp())
+    page_old = """SELECT b.id FROM bookings b JOIN specialists s ON b.specialist_id = s.id
+                  WHERE b.date >= ? AND b.date <= ? AND b.status = 'confirmed'
+                  ORDER BY b.date DESC, b.time DESC LIMIT 50"""
+    page_new = """SELECT b.id FROM bookings b JOIN specialists s ON b.specialist_id = s.id
+                  WHERE b.start_ts >= ? AND b.start_ts < ? AND b.status = 'confirmed'
+                  ORDER BY b.start_ts DESC LIMIT 50"""
+    return [
+        ("next hour, concat",
+         """SELECT COUNT(*) FROM bookings WHERE status = 'confirmed'
+            AND date || ' ' || time >= ? AND date || ' ' || time < ?""",
+         (now.strftime("%Y-%m-%d %H:%M"), soon.strftime("%Y-%m-%d %H:%M")),
+         "SELECT COUNT(*) FROM bookings WHERE status = 'confirmed' AND start_ts >= ? AND start_ts < ?",
+         (now_ts, soon_ts)),
+        ("next hour, split",
+         """SELECT COUNT(*) FROM bookings WHERE status = 'confirmed'
+            AND ((date = ? AND time >= ?) OR (date = ? AND time < ?))""",
+         (today, now.strftime("%H:%M"), soon.strftime("%Y-%m-%d"), soon.strftime("%H:%M")),
+         "SELECT COUNT(*) FROM bookings WHERE status = 'confirmed' AND start_ts >= ? AND start_ts < ?",
+         (now_ts, soon_ts)),
+        ("week page",
+         page_old, (today, week_end),
+         page_new, (db.day_start_ts(today), db.day_start_ts(week_end, days=1))),
+        ("stats today",
+         "SELECT COUNT(*) FROM bookings WHERE date = ? AND status = 'confirmed'", (today,),
+         "SELECT COUNT(*) FROM bookings WHERE start_ts >= ? AND start_ts < ? AND status = 'confirmed'",
+         (db.day_start_ts(today), db.day_start_ts(today, days=1))),
+        ("stats upcoming",
+         "SELECT COUNT(*) FROM bookings WHERE date >= ? AND status = 'confirmed'", (today,),
+         "SELECT COUNT(*) FROM bookings WHERE start_ts >= ? AND status = 'confirmed'",
+         (db.day_start_ts(today),)),
+    ]
+
+
+def timed(conn, query: str, params: tuple) -> tuple[float, list]:
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        rows = conn.execute(query, params).fetchall()
+    return (time.perf_counter() - started) / REPEAT * 1000, rows
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else BOOKINGS
+    scratch = tempfile.mkdtemp(prefix="bench-epoch-")
+    db.DB_PATH = os.path.join(scratch, "bench.db")
+    print(f"Filling {count} bookings...")
+    now = fill(count)
+    print(f"now = {now:%Y-%m-%d %H:%M}, {REPEAT} runs each\n")
+    print(f"{'question':<18} {'text ms':>9} {'start_ts ms':>12} {'speedup':>8}")
+    with db.get_db() as conn:
+        for name, old, old_params, new, new_params in cases(now):
+            old_ms, old_rows = timed(conn, old, old_params)
+            new_ms, new_rows = timed(conn, new, new_params)
+            same = "" if sorted(map(tuple, old_rows)) == sorted(map(tuple, new_rows)) else "  RESULTS DIFFER"
+            print(f"{name:<18} {old_ms:>9.3f} {new_ms:>12.3f} {old_ms / max(new_ms, 1e-6):>7.1f}x{same}")
+    os.remove(db.DB_PATH)
+    os.rmdir(scratch)
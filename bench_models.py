@@ -0,0 +1,99 @@
+"""
+Row model benchmark - dict(row) против NamedTuple на больших выборках
+
+    python bench_models.py [bookings]
+
+Fills a scratch database with bookings, then reads all of them back
+the old way (sqlite3.Row -> dict), as models.Booking through
+database.get_bookings, and lazily through database.iter_bookings.
+Prints wall time and, in a second run, the peak memory held by the
+result (tracemalloc).
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import database as db
+
+BOOKINGS = 1_000_000
+SPECIALISTS = 20
+
+
+def fill(count: int):
+    db.init_db()
+    with db.get_db() as conn:
+        conn.executemany(
+            "INSERT INTO specialists (id, name, description) VALUES (?, ?, ?)",
+            [(f"spec_{i}", f"Специалист {i}", "") for i in range(SPECIALISTS)]
+        )
+        # Без триггеров FTS и статистики заполнение в разы быстрее
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        start = date(2020, 1, 1)
+        conn.executemany(
+            """INSERT INTO bookings (specialist_id, date, time, client_name, client_phone,
+                                     client_username, client_user_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (
+                (f"spec_{i % SPECIALISTS}", (start + timedelta(days=i // 300)).isoformat(),
+                 f"{8 + i % 15:02d}:00", f"Клиент {i}", f"+7900{i:07d}", f"user{i}", 100_000 + i)
+                for i in range(count)
+            )
+        )
+        for _, sql in triggers:
+            conn.execute(sql)
+
+
+def read_dicts(count: int) -> list:
+    with db.get_db() as conn:
+        rows = conn.execute(
+            """SELECT b.*, s.name as specialist_name
+               FROM bookings b
+               JOIN specialists s ON b.specialist_id = s.id
+               WHERE b.status = 'confirmed'
+               ORDER BY b.date DESC, b.time DESC LIMIT ?""",
+            (count,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def read_models(count: int) -> list:
+    return db.get_bookings(date_from=None, limit=count)
+
+
+def read_iter(count: int) -> int:
+    # Только счётчик - в памяти одна пачка строк за раз
+    return sum(1 for _ in db.iter_bookings())
+
+
+def measure(name: str, reader, count: int):
+    # Время и память отдельными прогонами: tracemalloc замедляет аллокации
+    started = time.perf_counter()
+    result = reader(count)
+    elapsed = time.perf_counter() - started
+    rows = result if isinstance(result, int) else len(result)
+    del result
+
+    tracemalloc.start()
+    result = reader(count)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"{name:>8}: {rows:>9} rows  {elapsed:6.2f} s  peak {peak / 1024 / 1024:8.1f} MB")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else BOOKINGS
+    scratch = tempfile.mkdtemp(prefix="bench-models-")
+    db.DB_PATH = os.path.join(scratch, "bench.db")
+    print(f"Filling {count} bookings...")
+    fill(count)
+    for name, reader in (("dict", read_dicts), ("model", read_models), ("iter", read_iter)):
+        measure(name, reader, count)
+    os.remove(db.DB_PATH)
+    os.rmdir(scratch)
@@ -0,0 +1,70 @@
+"""
+Session memory benchmark - брошенные сессии и RSS процесса
+
+    python bench_sessions.py [sessions]
+
+Simulates users who enter a name and walk away mid-booking, once with
+aiogram's MemoryStorage and once with BoundedMemoryStorage (short TTL so
+that sweeping happens during the run), printing RSS as it goes.
+Each storage runs in its own process so RSS numbers do not mix.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from session_storage import BoundedMemoryStorage
+
+SESSIONS = 1_000_000
+REPORT_EVERY = 100_000
+TTL = 2.0                  # секунд для бенчмарка вместо суток
+MAX_SESSIONS = 50_000
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+async def simulate(storage_name: str, sessions: int):
+    if storage_name == "bounded":
+        storage = BoundedMemoryStorage(ttl=TTL, max_sessions=MAX_SESSIONS, sweep_interval=0.5)
+        storage.start()
+    else:
+        storage = MemoryStorage()
+
+    started = time.perf_counter()
+    print(f"{storage_name:>8}: start RSS {rss_mb():7.1f} MB")
+    for user_id in range(1, sessions + 1):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+        await storage.set_state(key, "BookingState:entering_phone")
+        await storage.set_data(key, {
+            'specialist_id': 'anna', 'specialist_name': 'Анна Иванова',
+            'date': '2026-10-20', 'time': '10:00', 'time_label': '20.10 10:00',
+            'booking_type': 'scheduled', 'client_name': f'Client {user_id}',
+        })
+        if user_id % 1000 == 0:
+            await asyncio.sleep(0)  # даём поработать фоновой чистке
+        if user_id % REPORT_EVERY == 0:
+            alive = len(storage) if storage_name == "bounded" else len(storage.storage)
+            print(f"{storage_name:>8}: {user_id:>9} sessions  RSS {rss_mb():7.1f} MB  alive {alive}")
+    print(f"{storage_name:>8}: done in {time.perf_counter() - started:.1f} s")
+    await storage.close()
+
+
+def run(storage_name: str, sessions: int):
+    asyncio.run(simulate(storage_name, sessions))
+
+
+if __name__ == "__main__":
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else SESSIONS
+    for name in ("memory", "bounded"):
+        process = multiprocessing.Process(target=run, args=(name, sessions))
+        process.start()
+        process.join()
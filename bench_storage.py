@@ -0,0 +1,109 @@
+"""
+Storage benchmark - нагрузка на database.py
+
+    python bench_storage.py
+
+Checks the booking contract first (slot taken once, idempotent key,
+cancel frees the slot), then runs concurrent clients that open the
+calendar, race for the same slots and list their bookings. Calls run
+in worker threads, as from the bot. Writes to a scratch database in a
+temporary directory.
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database as db
+
+CLIENTS = 200
+ROUNDS = 20
+SPECIALISTS = 5
+DAYS = 14
+HOURS = [f"{h:02d}:00" for h in range(8, 24)]
+
+
+def _call(func, *args, **kwargs):
+    return asyncio.to_thread(func, *args, **kwargs)
+
+
+async def check_contract():
+    day = "2099-01-01"
+    first = await _call(db.create_booking, "bench_0", day, "10:00", "A", "1", "", 1, idempotency_key="k1")
+    taken = await _call(db.create_booking, "bench_0", day, "10:00", "B", "2", "", 2, idempotency_key="k2")
+    replay = await _call(db.create_booking, "bench_0", day, "11:00", "A", "1", "", 1, idempotency_key="k1")
+    assert first is not None, "first booking failed"
+    assert taken is None, "slot booked twice"
+    assert replay is None, "idempotency key accepted twice"
+
+    await _call(db.cancel_booking, first)
+    assert (await _call(db.get_booking, first)).status == 'cancelled'
+    again = await _call(db.create_booking, "bench_0", day, "10:00", "B", "2", "", 2, idempotency_key="k3")
+    assert again is not None, "cancelled slot not released"
+    await _call(db.cancel_booking, again)
+    print("✅ contract: one booking per slot, idempotent keys, cancel releases slot")
+
+
+async def client(user_id: int, dates: list[str], latencies: dict[str, list[float]]):
+    async def timed(op: str, coro):
+        started = time.perf_counter()
+        result = await coro
+        latencies[op].append(time.perf_counter() - started)
+        return result
+
+    booked = 0
+    for i in range(ROUNDS):
+        await timed("calendar", _call(db.get_booked_slots, dates[0], dates[-1]))
+        spec = f"bench_{random.randrange(SPECIALISTS)}"
+        date = random.choice(dates)
+        slot = random.choice(HOURS)
+        booking_id = await timed("book", _call(
+            db.create_booking, spec, date, slot, f"Client {user_id}", "+79000000000", "",
+            user_id, idempotency_key=f"{user_id}:{i}"
+        ))
+        if booking_id:
+            booked += 1
+        await timed("my_bookings", _call(db.get_client_bookings, user_id, db.day_start_ts(dates[0])))
+    return booked
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def run():
+    db.init_db()
+    for i in range(SPECIALISTS):
+        db.add_specialist(f"bench_{i}", f"Bench {i}")
+    await check_contract()
+
+    today = datetime.now()
+    dates = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(DAYS)]
+    latencies = {"calendar": [], "book": [], "my_bookings": []}
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        client(10_000 + n, dates, latencies) for n in range(CLIENTS)
+    ))
+    elapsed = time.perf_counter() - started
+
+    booked = sum(results)
+    rows = db.get_booked_slots(dates[0], dates[-1])
+    confirmed = sum(1 for _, spec, *_ in rows if spec.startswith("bench_"))
+    assert confirmed == booked, f"{confirmed} confirmed rows for {booked} successful bookings"
+
+    total_ops = sum(len(v) for v in latencies.values())
+    print(f"📊 SQLite: {CLIENTS} clients × {ROUNDS} rounds")
+    print(f"   {total_ops} ops in {elapsed:.2f} s = {total_ops / elapsed:.0f} ops/s")
+    print(f"   booked {booked}, lost races {CLIENTS * ROUNDS - booked}")
+    for op, values in latencies.items():
+        print(f"   {op:12} p50 {_percentile(values, 0.5):6.2f} ms   p95 {_percentile(values, 0.95):6.2f} ms")
+
+
+if __name__ == "__main__":
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    asyncio.run(run())
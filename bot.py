@@ -3,6 +3,9 @@
 aiogram 3.x | Python 3.11+
 """
 
+import time
+STARTED_AT = time.perf_counter()
+
 import asyncio
 from datetime import datetime, timedelta
 from aiogram import Bot, Dispatcher, F, Router
@@ -10,13 +13,28 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.types import FSInputFile
 import os
+from typing import NamedTuple, Optional
 
-from config import BOT_TOKEN, ADMIN_IDS
+from config import BOT_TOKEN, ADMIN_IDS, RECORD_UPDATES_DIR, HEALTH_HOST, HEALTH_PORT, STALL_THRESHOLD_MS
 import database as db
 import admin
+import availability
+import backup
+import broadcast
+import funnel
+import health
+import holds
+import notifications
+import render_cache
+import scheduler
+import tenants
+import waitlist
+from models import Booking
+from session_storage import BoundedMemoryStorage
+from user_locks import UserEventIsolation
 
 router = Router()
 
@@ -34,6 +52,10 @@ LOGO_PATH = "logo.jpg"
 
 def get_welcome_text() -> str:
     """Получить текст приветствия (кастомный или дефолтный)"""
+    return render_cache.get("welcome", "text", _build_welcome_text)
+
+
+def _build_welcome_text() -> str:
     custom = db.get_setting("welcome_text", "")
     return custom if custom else DEFAULT_WELCOME_TEXT
 
@@ -42,15 +64,20 @@ def get_welcome_text() -> str:
 # Helpers
 # ═══════════════════════════════════════════════════════════
 
+def logo_path() -> str:
+    tenant = tenants.current()
+    return tenant.logo_path if tenant else LOGO_PATH
+
+
 def has_logo() -> bool:
-    return os.path.exists(LOGO_PATH)
+    return os.path.exists(logo_path())
 
 
 async def send_with_logo(message: Message, text: str, keyboard: InlineKeyboardMarkup):
     """Отправить сообщение с логотипом или без"""
     if has_logo():
         await message.answer_photo(
-            photo=FSInputFile(LOGO_PATH),
+            photo=FSInputFile(logo_path()),
             caption=text,
             reply_markup=keyboard,
             parse_mode="HTML"
@@ -63,6 +90,49 @@ async def send_with_logo(message: Message, text: str, keyboard: InlineKeyboardMa
         )
 
 
+class SpecialistCard(NamedTuple):
+    name: str
+    text: str
+    photo_file_id: Optional[str]
+
+
+def get_specialist_card(spec_id: str) -> Optional[SpecialistCard]:
+    """Карточка слушателя (кэшируется до изменения в админке)"""
+    return render_cache.get(spec_id, "card", lambda: _build_specialist_card(spec_id))
+
+
+def _build_specialist_card(spec_id: str) -> Optional[SpecialistCard]:
+    specialist = db.get_specialist(spec_id)
+    if not specialist:
+        return None
+    text = f"<b>{specialist.name}</b>\n\n{specialist.description or 'Описание отсутствует'}"
+    return SpecialistCard(specialist.name, text, specialist.photo_file_id)
+
+
+async def send_specialist_card(message: Message, spec_id: str, card: SpecialistCard):
+    """Отправить карточку: фото специалиста, логотип или просто текст"""
+    if card.photo_file_id:
+        await message.answer_photo(
+            photo=card.photo_file_id,
+            caption=card.text,
+            reply_markup=specialist_info_keyboard(spec_id),
+            parse_mode="HTML"
+        )
+    elif has_logo():
+        await message.answer_photo(
+            photo=FSInputFile(logo_path()),
+            caption=card.text,
+            reply_markup=specialist_info_keyboard(spec_id),
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer(
+            card.text,
+            reply_markup=specialist_info_keyboard(spec_id),
+            parse_mode="HTML"
+        )
+
+
 # ═══════════════════════════════════════════════════════════
 # FSM States
 # ═══════════════════════════════════════════════════════════
@@ -75,34 +145,67 @@ class BookingState(StatesGroup):
     entering_phone = State()
 
 
+# Воронка: все callback'и пользователя и ввод имени/телефона
+_funnel = funnel.FunnelMiddleware({
+    BookingState.entering_name.state: "name",
+    BookingState.entering_phone.state: "phone",
+})
+router.message.outer_middleware(_funnel)
+router.callback_query.outer_middleware(_funnel)
+
+# Слот держится за клиентом, пока он вводит имя и телефон
+_holds = holds.HoldReleaseMiddleware({
+    BookingState.entering_name.state, BookingState.entering_phone.state,
+})
+router.message.outer_middleware(_holds)
+router.callback_query.outer_middleware(_holds)
+
+
 # ═══════════════════════════════════════════════════════════
-# Keyboards
+# Keyboards (готовые объекты берутся из render_cache)
 # ═══════════════════════════════════════════════════════════
 
 def welcome_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🎯 Записаться на сессию", callback_data="choose_specialist")]
-    ])
+    return render_cache.get("welcome", "keyboard", lambda: InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🎯 Записаться на сессию", callback_data="choose_specialist")],
+        [InlineKeyboardButton(text="📋 Мои записи", callback_data="mybookings")],
+    ]))
 
 
 def specialists_keyboard() -> InlineKeyboardMarkup:
+    return render_cache.get("specialists", "keyboard", _build_specialists_keyboard)
+
+
+def _build_specialists_keyboard() -> InlineKeyboardMarkup:
     specs = db.get_specialists()
     buttons = [
-        [InlineKeyboardButton(text=f"👤 {spec['name']}", callback_data=f"spec_{spec['id']}")]
+        [InlineKeyboardButton(text=f"👤 {spec.name}", callback_data=f"spec_{spec.id}")]
         for spec in specs
     ]
     buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="backstart")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def _specialist_cached(key: str, spec_id: str, build) -> InlineKeyboardMarkup:
+    """Cache per-specialist markup only for ids that exist - spec_id
+    comes straight from callback data"""
+    if get_specialist_card(spec_id) is None:
+        return build()
+    return render_cache.get(spec_id, key, build)
+
+
 def specialist_info_keyboard(spec_id: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
+    return _specialist_cached("info_kb", spec_id, lambda: InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Записаться", callback_data=f"book_{spec_id}")],
         [InlineKeyboardButton(text="◀️ Назад", callback_data="backlist")],
-    ])
+    ]))
 
 
 def time_type_keyboard(spec_id: str) -> InlineKeyboardMarkup:
+    return _specialist_cached("time_type_kb", spec_id, lambda: _build_time_type_keyboard(spec_id))
+
+
+def _build_time_type_keyboard(spec_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🚨 В течение 15 минут", callback_data=f"urgent_15_{spec_id}")],
         [InlineKeyboardButton(text="⏰ В течение часа", callback_data=f"urgent_60_{spec_id}")],
@@ -111,22 +214,51 @@ def time_type_keyboard(spec_id: str) -> InlineKeyboardMarkup:
     ])
 
 
-def generate_time_slots() -> list[str]:
-    """Генерация слотов 8:00 - 01:00 с шагом 1 час"""
-    slots = []
-    for hour in range(8, 24):
-        slots.append(f"{hour:02d}:00")
-    slots.extend(["00:00", "01:00"])
-    return slots
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 
 
-def time_slots_keyboard(specialist_id: str) -> InlineKeyboardMarkup:
+def calendar_keyboard(specialist_id: str) -> InlineKeyboardMarkup:
+    """Дни на DAYS_AHEAD вперёд с количеством свободных слотов"""
     buttons = []
     row = []
+    today = datetime.now().date()
+
+    for day, free in availability.calendar(specialist_id):
+        label = "Сегодня" if day.date() == today else f"{WEEKDAYS[day.weekday()]} {day:%d.%m}"
+        if free:
+            row.append(InlineKeyboardButton(
+                text=f"{label} · {len(free)}",
+                callback_data=f"day_{day:%Y%m%d}_{specialist_id}"
+            ))
+        else:
+            row.append(InlineKeyboardButton(text=f"{label} · —", callback_data="ignore"))
+
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+
+    if row:
+        buttons.append(row)
 
-    for time in generate_time_slots():
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=f"backtime_{specialist_id}")])
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def time_slots_keyboard(specialist_id: str, day: datetime) -> InlineKeyboardMarkup:
+    """Свободное время и занятое (🔔 - встать в лист ожидания)"""
+    buttons = []
+    row = []
+
+    free = [(slot, "slot") for slot in availability.free_slots(specialist_id, day)]
+    taken = [(slot, "wait") for slot in availability.taken_slots(specialist_id, day)]
+    for (date, time), action in sorted(free + taken):
         time_safe = time.replace(":", "-")
-        row.append(InlineKeyboardButton(text=time, callback_data=f"slot_{time_safe}_{specialist_id}"))
+        date_safe = date.replace("-", "")
+        row.append(InlineKeyboardButton(
+            text=time if action == "slot" else f"🔔 {time}",
+            callback_data=f"{action}_{date_safe}_{time_safe}_{specialist_id}"
+        ))
 
         if len(row) == 4:
             buttons.append(row)
@@ -135,7 +267,7 @@ def time_slots_keyboard(specialist_id: str) -> InlineKeyboardMarkup:
     if row:
         buttons.append(row)
 
-    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=f"backtime_{specialist_id}")])
+    buttons.append([InlineKeyboardButton(text="◀️ К датам", callback_data=f"schedule_{specialist_id}")])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -156,6 +288,208 @@ async def cmd_start(message: Message, state: FSMContext):
     await send_with_logo(message, get_welcome_text(), welcome_keyboard())
 
 
+# ═══════════════════════════════════════════════════════════
+# /mybookings - Мои записи (просмотр и отмена)
+# ═══════════════════════════════════════════════════════════
+
+def my_bookings_view(user_id: int) -> tuple[str, InlineKeyboardMarkup]:
+    # Начавшиеся сегодня раньше сессии - уже не предстоящие
+    bookings = db.get_client_bookings(user_id, int(time.time()))
+
+    buttons = []
+    if not bookings:
+        text = "📋 <b>Мои записи</b>\n\nУ вас нет предстоящих записей."
+    else:
+        text = "📋 <b>Мои записи</b>\n\n"
+        for b in bookings:
+            date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m")
+            text += f"📅 <b>{date} {b.time}</b> — {b.specialist_name}\n"
+            buttons.append([InlineKeyboardButton(
+                text=f"❌ Отменить {date} {b.time}",
+                callback_data=f"mycancel_{b.id}"
+            )])
+
+    buttons.append([InlineKeyboardButton(text="◀️ В начало", callback_data="backstart")])
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@router.message(Command("mybookings"))
+async def cmd_my_bookings(message: Message, state: FSMContext):
+    await state.clear()
+    text, keyboard = my_bookings_view(message.from_user.id)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@router.callback_query(F.data == "mybookings")
+async def my_bookings(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.delete()
+    text, keyboard = my_bookings_view(callback.from_user.id)
+    await callback.message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+def _own_booking(booking_id: int, user_id: int) -> Optional[Booking]:
+    b = db.get_booking(booking_id)
+    if not b or b.client_user_id != user_id or b.status != 'confirmed':
+        return None
+    return b
+
+
+@router.callback_query(F.data.startswith("mycancel_"))
+async def my_booking_cancel_confirm(callback: CallbackQuery):
+    booking_id = int(callback.data.replace("mycancel_", ""))
+    b = _own_booking(booking_id, callback.from_user.id)
+    if not b:
+        await callback.answer("Запись не найдена или уже отменена", show_alert=True)
+        return
+
+    date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m.%Y")
+    buttons = [[
+        InlineKeyboardButton(text="✅ Да, отменить", callback_data=f"mycancelok_{booking_id}"),
+        InlineKeyboardButton(text="◀️ Нет", callback_data="mybookings"),
+    ]]
+    if db.get_booking_series_id(booking_id):
+        buttons.insert(1, [InlineKeyboardButton(
+            text="🔁 Отменить эту и все следующие", callback_data=f"mycancelseries_{booking_id}"
+        )])
+    await callback.message.edit_text(
+        f"⚠️ Отменить запись?\n\n"
+        f"👤 {b.specialist_name}\n"
+        f"📅 {date} {b.time}",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("mycancelok_"))
+async def my_booking_cancel(callback: CallbackQuery, bot: Bot):
+    booking_id = int(callback.data.replace("mycancelok_", ""))
+    b = _own_booking(booking_id, callback.from_user.id)
+    if not b:
+        await callback.answer("Запись не найдена или уже отменена", show_alert=True)
+        return
+
+    db.cancel_booking(booking_id)
+    await callback.answer("✅ Запись отменена")
+
+    text, keyboard = my_bookings_view(callback.from_user.id)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+    date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m.%Y")
+    await notifications.notify(
+        bot,
+        f"❌ <b>Клиент отменил сессию #{booking_id}</b>\n\n"
+        f"👤 Слушатель: {b.specialist_name}\n"
+        f"🕐 Время: {date} {b.time}\n\n"
+        f"👤 Клиент: <b>{b.client_name}</b>\n"
+        f"📱 Телефон: <code>{b.client_phone}</code>",
+        f"❌ #{booking_id} · {date[:5]} {b.time} · {b.specialist_name} · "
+        f"{b.client_name} <code>{b.client_phone}</code>"
+    )
+
+
+@router.callback_query(F.data.startswith("mycancelseries_"))
+async def my_series_cancel(callback: CallbackQuery, bot: Bot):
+    booking_id = int(callback.data.replace("mycancelseries_", ""))
+    b = _own_booking(booking_id, callback.from_user.id)
+    series_id = db.get_booking_series_id(booking_id) if b else None
+    if not series_id:
+        await callback.answer("Запись не найдена или уже отменена", show_alert=True)
+        return
+
+    cancelled = db.cancel_booking_series(series_id, b.date)
+    await callback.answer(f"✅ Отменено сессий: {cancelled}")
+
+    text, keyboard = my_bookings_view(callback.from_user.id)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+    date = datetime.strptime(b.date, "%Y-%m-%d").strftime("%d.%m.%Y")
+    await notifications.notify(
+        bot,
+        f"❌ <b>Клиент отменил серию сессий</b>\n\n"
+        f"👤 Слушатель: {b.specialist_name}\n"
+        f"🕐 С {date}, {b.time} · отменено: {cancelled}\n\n"
+        f"👤 Клиент: <b>{b.client_name}</b>\n"
+        f"📱 Телефон: <code>{b.client_phone}</code>",
+        f"❌ серия ×{cancelled} · с {date[:5]} {b.time} · {b.specialist_name} · "
+        f"{b.client_name} <code>{b.client_phone}</code>"
+    )
+
+
+# ═══════════════════════════════════════════════════════════
+# Повторяющиеся записи (серия раз в неделю)
+# ═══════════════════════════════════════════════════════════
+
+SERIES_WEEKS = (4, 8, 12)
+
+
+@router.callback_query(F.data.startswith("repeat_"))
+async def repeat_booking_menu(callback: CallbackQuery):
+    booking_id = int(callback.data.replace("repeat_", ""))
+    b = _own_booking(booking_id, callback.from_user.id)
+    if not b:
+        await callback.answer("Запись не найдена или уже отменена", show_alert=True)
+        return
+
+    await callback.answer()
+    await callback.message.answer(
+        f"🔁 <b>{b.specialist_name}</b>, каждую неделю в {b.time}\n\n"
+        "На сколько недель записать? (включая эту)",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text=f"{weeks} нед.", callback_data=f"repeatok_{booking_id}_{weeks}")
+            for weeks in SERIES_WEEKS
+        ]]),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("repeatok_"))
+async def repeat_booking(callback: CallbackQuery, bot: Bot):
+    _, booking_id, weeks = callback.data.split("_")
+    booking_id, weeks = int(booking_id), int(weeks)
+    b = _own_booking(booking_id, callback.from_user.id)
+    if not b or weeks not in SERIES_WEEKS:
+        await callback.answer("Запись не найдена или уже отменена", show_alert=True)
+        return
+
+    first = datetime.strptime(b.date, "%Y-%m-%d")
+    dates = [(first + timedelta(weeks=i)).strftime("%Y-%m-%d") for i in range(1, weeks)]
+    # Расписание и занятость всех дат - одним запросом, вставка - одной транзакцией
+    series_id, booked = db.create_booking_series(
+        booking_id, availability.free_dates(b.specialist_id, b.time, dates), interval_days=7
+    )
+    skipped = [d for d in dates if d not in booked]
+
+    def labels(days: list[str]) -> str:
+        return ", ".join(f"{datetime.strptime(d, '%Y-%m-%d'):%d.%m}" for d in days)
+
+    text = f"🔁 <b>{b.specialist_name}</b>, по {WEEKDAYS[first.weekday()]} в {b.time}\n\n"
+    text += f"✅ Записано: {labels(booked)}" if booked else "Новых записей нет"
+    if skipped:
+        text += f"\n❌ Занято: {labels(skipped)}"
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📋 Мои записи", callback_data="mybookings")],
+        ]),
+        parse_mode="HTML"
+    )
+    if not booked:
+        return
+
+    # В воронку не пишем: клиент уже записан, иначе конверсия посчитается дважды
+    await notifications.notify(
+        bot,
+        f"🔁 <b>Новая серия #{series_id}</b> (к сессии #{booking_id})\n\n"
+        f"👤 Слушатель: {b.specialist_name}\n"
+        f"🕐 Время: {b.time}, {labels(booked)}\n\n"
+        f"👤 Клиент: <b>{b.client_name}</b>\n"
+        f"📱 Телефон: <code>{b.client_phone}</code>",
+        f"🔁 серия ×{len(booked)} · {b.time} · {b.specialist_name} · "
+        f"{b.client_name} <code>{b.client_phone}</code>"
+    )
+
+
 # ═══════════════════════════════════════════════════════════
 # Список слушателей (с логотипом)
 # ═══════════════════════════════════════════════════════════
@@ -175,39 +509,17 @@ async def choose_specialist(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("spec_"))
 async def show_specialist_info(callback: CallbackQuery, state: FSMContext):
     spec_id = callback.data.replace("spec_", "")
-    specialist = db.get_specialist(spec_id)
+    card = get_specialist_card(spec_id)
 
-    if not specialist:
+    if not card:
         await callback.answer("Слушатель не найден", show_alert=True)
         return
 
-    await state.update_data(specialist_id=spec_id, specialist_name=specialist["name"])
+    await state.update_data(specialist_id=spec_id, specialist_name=card.name)
     await state.set_state(BookingState.viewing_specialist)
 
-    text = f"<b>{specialist['name']}</b>\n\n{specialist.get('description') or 'Описание отсутствует'}"
-
     await callback.message.delete()
-
-    if specialist.get('photo_file_id'):
-        await callback.message.answer_photo(
-            photo=specialist['photo_file_id'],
-            caption=text,
-            reply_markup=specialist_info_keyboard(spec_id),
-            parse_mode="HTML"
-        )
-    elif has_logo():
-        await callback.message.answer_photo(
-            photo=FSInputFile(LOGO_PATH),
-            caption=text,
-            reply_markup=specialist_info_keyboard(spec_id),
-            parse_mode="HTML"
-        )
-    else:
-        await callback.message.answer(
-            text,
-            reply_markup=specialist_info_keyboard(spec_id),
-            parse_mode="HTML"
-        )
+    await send_specialist_card(callback.message, spec_id, card)
 
 
 # ═══════════════════════════════════════════════════════════
@@ -217,14 +529,14 @@ async def show_specialist_info(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("book_"))
 async def choose_time_type(callback: CallbackQuery, state: FSMContext):
     spec_id = callback.data.replace("book_", "")
-    specialist = db.get_specialist(spec_id)
+    specialist = get_specialist_card(spec_id)
 
-    await state.update_data(specialist_id=spec_id, specialist_name=specialist["name"])
+    await state.update_data(specialist_id=spec_id, specialist_name=specialist.name)
     await state.set_state(BookingState.choosing_time_type)
 
     await callback.message.delete()
 
-    text = f"👤 <b>{specialist['name']}</b>\n\n🕐 Когда вам удобно?"
+    text = f"👤 <b>{specialist.name}</b>\n\n🕐 Когда вам удобно?"
     await send_with_logo(callback.message, text, time_type_keyboard(spec_id))
 
 
@@ -238,10 +550,20 @@ async def urgent_booking(callback: CallbackQuery, state: FSMContext):
     minutes = int(parts[1])
     spec_id = "_".join(parts[2:])
 
-    specialist = db.get_specialist(spec_id)
+    specialist = get_specialist_card(spec_id)
 
     now = datetime.now()
     booking_time = now + timedelta(minutes=minutes)
+    if not availability.available_at(spec_id, booking_time):
+        nearest = availability.nearest_slot(spec_id)
+        if nearest:
+            day = datetime.strptime(nearest[0], "%Y-%m-%d")
+            hint = f"Ближайшее свободное время: {day:%d.%m} {nearest[1]}"
+        else:
+            hint = "Свободного времени в ближайшие дни нет"
+        await callback.answer(f"Слушатель сейчас недоступен.\n{hint}", show_alert=True)
+        return
+
     date_str = booking_time.strftime("%Y-%m-%d")
     time_str = booking_time.strftime("%H:%M")
 
@@ -250,7 +572,7 @@ async def urgent_booking(callback: CallbackQuery, state: FSMContext):
 
     await state.update_data(
         specialist_id=spec_id,
-        specialist_name=specialist['name'],
+        specialist_name=specialist.name,
         date=date_str,
         time=time_str,
         booking_type=booking_type,
@@ -261,7 +583,7 @@ async def urgent_booking(callback: CallbackQuery, state: FSMContext):
     await callback.message.delete()
 
     await callback.message.answer(
-        f"👤 <b>{specialist['name']}</b>\n"
+        f"👤 <b>{specialist.name}</b>\n"
         f"🚨 <b>{time_label.capitalize()}</b>\n\n"
         "✍️ Введите ваше имя:",
         parse_mode="HTML"
@@ -269,22 +591,39 @@ async def urgent_booking(callback: CallbackQuery, state: FSMContext):
 
 
 # ═══════════════════════════════════════════════════════════
-# Выбор времени (без календаря)
+# Календарь: выбор дня
 # ═══════════════════════════════════════════════════════════
 
 @router.callback_query(F.data.startswith("schedule_"))
-async def show_time_slots(callback: CallbackQuery, state: FSMContext):
+async def show_calendar(callback: CallbackQuery, state: FSMContext):
     spec_id = callback.data.replace("schedule_", "")
-    specialist = db.get_specialist(spec_id)
+    specialist = get_specialist_card(spec_id)
 
-    await state.update_data(specialist_id=spec_id, specialist_name=specialist['name'])
+    await state.update_data(specialist_id=spec_id, specialist_name=specialist.name)
     await state.set_state(BookingState.choosing_time)
 
     await callback.message.delete()
 
     await callback.message.answer(
-        f"👤 <b>{specialist['name']}</b>\n\n🕐 Выберите удобное время:",
-        reply_markup=time_slots_keyboard(spec_id),
+        f"👤 <b>{specialist.name}</b>\n\n📅 Выберите день:",
+        reply_markup=calendar_keyboard(spec_id),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("day_"))
+async def show_time_slots(callback: CallbackQuery, state: FSMContext):
+    parts = callback.data.split("_")
+    day = datetime.strptime(parts[1], "%Y%m%d")
+    spec_id = "_".join(parts[2:])
+    specialist = get_specialist_card(spec_id)
+
+    await callback.message.edit_text(
+        f"👤 <b>{specialist.name}</b>\n"
+        f"📅 <b>{WEEKDAYS[day.weekday()]} {day:%d.%m}</b>\n\n"
+        "🕐 Выберите удобное время:\n"
+        "<i>🔔 - занято, можно встать в лист ожидания</i>",
+        reply_markup=time_slots_keyboard(spec_id, day),
         parse_mode="HTML"
     )
 
@@ -296,27 +635,40 @@ async def show_time_slots(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("slot_"))
 async def select_time_slot(callback: CallbackQuery, state: FSMContext):
     parts = callback.data.split("_")
-    time_safe = parts[1]
-    spec_id = "_".join(parts[2:])
+    slot_date = datetime.strptime(parts[1], "%Y%m%d")
+    time = parts[2].replace("-", ":")
+    spec_id = "_".join(parts[3:])
+
+    date_str = slot_date.strftime("%Y-%m-%d")
+    # Свой прежний слот отпускаем, иначе он виден занятым и нам
+    holds.release(callback.from_user.id)
+    if not availability.is_free(spec_id, date_str, time):
+        await callback.answer("Это время уже занято - выберите другое или встаньте в лист ожидания 🔔",
+                              show_alert=True)
+        await callback.message.edit_reply_markup(reply_markup=time_slots_keyboard(spec_id, slot_date))
+        return
+    if not holds.acquire(callback.from_user.id, spec_id, date_str, time):
+        await callback.answer("Это время сейчас бронирует другой клиент - выберите другое 🙏",
+                              show_alert=True)
+        await callback.message.edit_reply_markup(reply_markup=time_slots_keyboard(spec_id, slot_date))
+        return
 
-    time = time_safe.replace("-", ":")
-
-    specialist = db.get_specialist(spec_id)
-    date_str = datetime.now().strftime("%Y-%m-%d")
+    specialist = get_specialist_card(spec_id)
+    time_label = f"{slot_date:%d.%m} {time}"
 
     await state.update_data(
         specialist_id=spec_id,
-        specialist_name=specialist['name'],
+        specialist_name=specialist.name,
         date=date_str,
         time=time,
         booking_type='scheduled',
-        time_label=time
+        time_label=time_label
     )
     await state.set_state(BookingState.entering_name)
 
     await callback.message.edit_text(
-        f"👤 <b>{specialist['name']}</b>\n"
-        f"🕐 <b>{time}</b>\n\n"
+        f"👤 <b>{specialist.name}</b>\n"
+        f"🕐 <b>{time_label}</b>\n\n"
         "✍️ Введите ваше имя:",
         parse_mode="HTML"
     )
@@ -335,10 +687,19 @@ async def enter_name(message: Message, state: FSMContext):
 
 @router.message(BookingState.entering_phone)
 async def enter_phone(message: Message, state: FSMContext, bot: Bot):
+    # Вызывается под блокировкой пользователя (UserEventIsolation), поэтому
+    # повторное сообщение с телефоном уже увидит очищенное состояние
     data = await state.get_data()
     phone = message.text
+    if 'client_name' not in data:
+        await state.clear()
+        return
+    if data.get('booking_type') == 'waitlist':
+        await join_waitlist(message, state, data, phone)
+        return
 
-    # Сохраняем
+    # Сохраняем; повторная доставка того же сообщения вернёт None
+    idempotency_key = f"{message.chat.id}:{message.message_id}"
     booking_id = db.create_booking(
         specialist_id=data['specialist_id'],
         date=data['date'],
@@ -347,8 +708,19 @@ async def enter_phone(message: Message, state: FSMContext, bot: Bot):
         client_phone=phone,
         client_username=message.from_user.username or "",
         client_user_id=message.from_user.id,
-        booking_type=data.get('booking_type', 'scheduled')
+        booking_type=data.get('booking_type', 'scheduled'),
+        idempotency_key=idempotency_key
     )
+    await state.clear()
+    if booking_id is None:
+        if db.get_booking_id_by_key(idempotency_key) is None:
+            # Слот заняли между выбором времени и вводом телефона
+            await message.answer(
+                "😔 Это время только что заняли.\nВыберите другое:",
+                reply_markup=calendar_keyboard(data['specialist_id'])
+            )
+        return
+    funnel.track(message.from_user.id, "booked")
 
     time_label = data.get('time_label', data['time'])
 
@@ -359,9 +731,15 @@ async def enter_phone(message: Message, state: FSMContext, bot: Bot):
         f"🕐 Время: <b>{time_label}</b>\n\n"
         "С вами свяжутся для подтверждения."
     )
-    confirm_kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔄 Новая сессия", callback_data="restart")]
-    ])
+    confirm_buttons = [
+        [InlineKeyboardButton(text="🔄 Новая сессия", callback_data="restart")],
+        [InlineKeyboardButton(text="📋 Мои записи", callback_data="mybookings")],
+    ]
+    if data.get('booking_type', 'scheduled') == 'scheduled':
+        confirm_buttons.insert(0, [InlineKeyboardButton(
+            text="🔁 Повторять каждую неделю", callback_data=f"repeat_{booking_id}"
+        )])
+    confirm_kb = InlineKeyboardMarkup(inline_keyboard=confirm_buttons)
 
     await send_with_logo(message, confirm_text, confirm_kb)
 
@@ -372,23 +750,145 @@ async def enter_phone(message: Message, state: FSMContext, bot: Bot):
         'scheduled': '📅 По записи'
     }.get(data.get('booking_type', 'scheduled'), '📅 По записи')
 
-    for admin_id in ADMIN_IDS:
-        try:
-            await bot.send_message(
-                admin_id,
-                f"🔔 <b>Новая сессия #{booking_id}</b>\n\n"
-                f"📌 Тип: <b>{booking_type_text}</b>\n"
-                f"👤 Слушатель: {data['specialist_name']}\n"
-                f"🕐 Время: {time_label}\n\n"
-                f"👤 Клиент: <b>{data['client_name']}</b>\n"
-                f"📱 Телефон: <code>{phone}</code>\n"
-                f"🆔 @{message.from_user.username or 'нет'}",
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass
+    # В режиме дайджеста копится в сводку; срочные 15 минут - всегда сразу
+    await notifications.notify(
+        bot,
+        f"🔔 <b>Новая сессия #{booking_id}</b>\n\n"
+        f"📌 Тип: <b>{booking_type_text}</b>\n"
+        f"👤 Слушатель: {data['specialist_name']}\n"
+        f"🕐 Время: {time_label}\n\n"
+        f"👤 Клиент: <b>{data['client_name']}</b>\n"
+        f"📱 Телефон: <code>{phone}</code>\n"
+        f"🆔 @{message.from_user.username or 'нет'}",
+        f"✅ #{booking_id} · {time_label} · {data['specialist_name']} · "
+        f"{data['client_name']} <code>{phone}</code>",
+        urgent=data.get('booking_type') == 'urgent_15'
+    )
+
+
+# ═══════════════════════════════════════════════════════════
+# Лист ожидания на занятое время
+# ═══════════════════════════════════════════════════════════
+
+@router.callback_query(F.data.startswith("wait_"))
+async def waitlist_slot(callback: CallbackQuery, state: FSMContext):
+    parts = callback.data.split("_")
+    slot_date = datetime.strptime(parts[1], "%Y%m%d")
+    time = parts[2].replace("-", ":")
+    spec_id = "_".join(parts[3:])
+
+    date_str = slot_date.strftime("%Y-%m-%d")
+    if availability.is_free(spec_id, date_str, time):
+        await callback.answer("Это время освободилось - можно записаться 🙂", show_alert=True)
+        await callback.message.edit_reply_markup(reply_markup=time_slots_keyboard(spec_id, slot_date))
+        return
+
+    specialist = get_specialist_card(spec_id)
+    time_label = f"{slot_date:%d.%m} {time}"
+
+    await state.update_data(
+        specialist_id=spec_id,
+        specialist_name=specialist.name,
+        date=date_str,
+        time=time,
+        booking_type='waitlist',
+        time_label=time_label
+    )
+    await state.set_state(BookingState.entering_name)
+
+    await callback.message.edit_text(
+        f"🔔 <b>Лист ожидания</b>\n\n"
+        f"👤 <b>{specialist.name}</b>\n"
+        f"🕐 <b>{time_label}</b>\n\n"
+        f"Если время освободится, мы напишем и придержим его для вас "
+        f"на {waitlist.HOLD_MINUTES} мин.\n\n"
+        "✍️ Введите ваше имя:",
+        parse_mode="HTML"
+    )
+
+
+def waitlist_entry_keyboard(entry_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🚪 Покинуть очередь", callback_data=f"wlleave_{entry_id}")],
+        [InlineKeyboardButton(text="🔄 Новая сессия", callback_data="restart")],
+    ])
 
+
+async def join_waitlist(message: Message, state: FSMContext, data: dict, phone: str):
+    entry_id = db.join_waitlist(
+        specialist_id=data['specialist_id'],
+        date=data['date'],
+        time=data['time'],
+        client_name=data['client_name'],
+        client_phone=phone,
+        client_username=message.from_user.username or "",
+        client_user_id=message.from_user.id
+    )
     await state.clear()
+    if entry_id is None:
+        await message.answer("Вы уже в листе ожидания на это время 👌")
+        return
+    position = db.get_waitlist_position(entry_id)
+    await message.answer(
+        "✅ <b>Вы в листе ожидания</b>\n\n"
+        f"👤 Слушатель: <b>{data['specialist_name']}</b>\n"
+        f"🕐 Время: <b>{data['time_label']}</b>\n"
+        f"🔢 Место в очереди: <b>{position}</b>\n\n"
+        "Напишем, как только время освободится.",
+        reply_markup=waitlist_entry_keyboard(entry_id),
+        parse_mode="HTML"
+    )
+    # Слот мог освободиться, пока вводились контакты
+    waitlist.check(data['specialist_id'], data['date'], data['time'])
+
+
+@router.callback_query(F.data.startswith("wlaccept_"))
+async def waitlist_accept(callback: CallbackQuery, bot: Bot):
+    entry_id = int(callback.data.replace("wlaccept_", ""))
+    booking_id = db.accept_waitlist_offer(entry_id, callback.from_user.id)
+    if booking_id is None:
+        await callback.answer("Предложение уже неактуально", show_alert=True)
+        await callback.message.edit_reply_markup(reply_markup=None)
+        return
+    waitlist.closed(entry_id)
+    funnel.track(callback.from_user.id, "booked")
+
+    b = db.get_booking(booking_id)
+    time_label = f"{datetime.strptime(b.date, '%Y-%m-%d'):%d.%m} {b.time}"
+    await callback.message.edit_text(
+        "✅ <b>Сессия забронирована!</b>\n\n"
+        f"👤 Слушатель: <b>{b.specialist_name}</b>\n"
+        f"🕐 Время: <b>{time_label}</b>\n\n"
+        "С вами свяжутся для подтверждения.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📋 Мои записи", callback_data="mybookings")],
+        ]),
+        parse_mode="HTML"
+    )
+
+    await notifications.notify(
+        bot,
+        f"🔔 <b>Новая сессия #{booking_id}</b>\n\n"
+        f"📌 Тип: <b>🔔 Из листа ожидания</b>\n"
+        f"👤 Слушатель: {b.specialist_name}\n"
+        f"🕐 Время: {time_label}\n\n"
+        f"👤 Клиент: <b>{b.client_name}</b>\n"
+        f"📱 Телефон: <code>{b.client_phone}</code>\n"
+        f"🆔 @{b.client_username or 'нет'}",
+        f"✅ #{booking_id} · {time_label} · {b.specialist_name} · "
+        f"{b.client_name} <code>{b.client_phone}</code>"
+    )
+
+
+@router.callback_query(F.data.startswith("wlleave_"))
+async def waitlist_leave(callback: CallbackQuery):
+    entry_id = int(callback.data.replace("wlleave_", ""))
+    # Отказ от предложения освобождает слот - его получит следующий
+    entry = db.leave_waitlist(entry_id, callback.from_user.id)
+    if entry:
+        waitlist.closed(entry_id)
+    await callback.answer("Вы покинули лист ожидания" if entry else "Вы уже не в очереди")
+    await callback.message.edit_reply_markup(reply_markup=None)
 
 
 # ═══════════════════════════════════════════════════════════
@@ -412,46 +912,24 @@ async def back_to_list(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("backspec_"))
 async def back_to_specialist(callback: CallbackQuery, state: FSMContext):
     spec_id = callback.data.replace("backspec_", "")
-    specialist = db.get_specialist(spec_id)
+    card = get_specialist_card(spec_id)
 
     await state.set_state(BookingState.viewing_specialist)
 
-    text = f"<b>{specialist['name']}</b>\n\n{specialist.get('description') or 'Описание отсутствует'}"
-
     await callback.message.delete()
-
-    if specialist.get('photo_file_id'):
-        await callback.message.answer_photo(
-            photo=specialist['photo_file_id'],
-            caption=text,
-            reply_markup=specialist_info_keyboard(spec_id),
-            parse_mode="HTML"
-        )
-    elif has_logo():
-        await callback.message.answer_photo(
-            photo=FSInputFile(LOGO_PATH),
-            caption=text,
-            reply_markup=specialist_info_keyboard(spec_id),
-            parse_mode="HTML"
-        )
-    else:
-        await callback.message.answer(
-            text,
-            reply_markup=specialist_info_keyboard(spec_id),
-            parse_mode="HTML"
-        )
+    await send_specialist_card(callback.message, spec_id, card)
 
 
 @router.callback_query(F.data.startswith("backtime_"))
 async def back_to_time_type(callback: CallbackQuery, state: FSMContext):
     spec_id = callback.data.replace("backtime_", "")
-    specialist = db.get_specialist(spec_id)
+    specialist = get_specialist_card(spec_id)
 
     await state.set_state(BookingState.choosing_time_type)
 
     await callback.message.delete()
 
-    text = f"👤 <b>{specialist['name']}</b>\n\n🕐 Когда вам удобно?"
+    text = f"👤 <b>{specialist.name}</b>\n\n🕐 Когда вам удобно?"
     await send_with_logo(callback.message, text, time_type_keyboard(spec_id))
 
 
@@ -471,23 +949,86 @@ async def ignore_callback(callback: CallbackQuery):
 # Main
 # ═══════════════════════════════════════════════════════════
 
-async def main():
-    db.init_db()
-    db.seed_default_data()
-
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+def build_dispatcher(storage: BaseStorage = None, record: bool = False,
+                     tenant_of_bot: dict[int, tenants.Tenant] = None) -> Dispatcher:
+    """Dispatcher with all middlewares and routers (also used by replay.py
+    and run_tenants.py, which passes bot id -> tenant)"""
+    dp = Dispatcher(storage=storage or BoundedMemoryStorage(), events_isolation=UserEventIsolation())
+    if tenant_of_bot:
+        # Первым - всё ниже работает с базой и админами своего клиента
+        dp.update.outer_middleware(tenants.TenantMiddleware(tenant_of_bot))
+    if record:
+        # До планировщика - записываются и сброшенные под нагрузкой апдейты
+        import recorder
+        dp.update.outer_middleware(recorder.RecorderMiddleware())
+    # После FSM-middleware диспетчера: приоритет зависит от состояния
+    dp.update.outer_middleware(scheduler.SchedulerMiddleware(
+        {BookingState.entering_name.state, BookingState.entering_phone.state},
+        tenants.is_admin,
+    ))
 
     # User router ПЕРВЫМ - это важно!
     dp.include_router(router)
     dp.include_router(admin.router)
+    return dp
+
+
+async def main():
+    imports_done = time.perf_counter()
+    applied = db.init_db()
+    db.seed_default_data()
+    db_done = time.perf_counter()
+
+    bot = Bot(token=BOT_TOKEN)
+    storage = BoundedMemoryStorage()
+    dp = build_dispatcher(storage, record=RECORD_UPDATES_DIR is not None)
 
     specs = db.get_specialists()
+    resumed = broadcast.resume_broadcasts(bot)
     print("🚀 Bot started")
     print(f"📋 Admins: {ADMIN_IDS}")
     print(f"📊 Specialists: {len(specs)}")
     print(f"🖼 Logo: {'✅' if has_logo() else '❌'} {LOGO_PATH}")
-    await dp.start_polling(bot)
+    if resumed:
+        print(f"📣 Resumed broadcasts: {resumed}")
+    funnel.start()
+    backup.start()
+    waitlist.start(bot)
+    holds.start()
+    storage.start()
+    # Отладочные модули грузятся, только если включены в config
+    if RECORD_UPDATES_DIR:
+        import recorder
+        recorder.start(RECORD_UPDATES_DIR)
+        print(f"📼 Recording updates to {RECORD_UPDATES_DIR}")
+    if HEALTH_PORT:
+        await health.start(bot, HEALTH_HOST, HEALTH_PORT)
+        print(f"🩺 Health: http://{HEALTH_HOST}:{HEALTH_PORT}/health")
+    else:
+        health.start_probe()
+    if STALL_THRESHOLD_MS:
+        import stalls
+        stalls.start(STALL_THRESHOLD_MS)
+        print(f"🐢 Stall detector: > {STALL_THRESHOLD_MS} ms")
+    print(
+        f"⏱ Startup: {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms "
+        f"(imports {(imports_done - STARTED_AT) * 1000:.0f} ms, "
+        f"db {(db_done - imports_done) * 1000:.0f} ms, "
+        f"schema v{db.schema_version()}, migrations applied: {applied})"
+    )
+    try:
+        await dp.start_polling(bot)
+    finally:
+        backup.stop()
+        waitlist.stop()
+        holds.stop()
+        await notifications.stop(bot)
+        if RECORD_UPDATES_DIR:
+            await recorder.stop()
+        await funnel.stop()
+        await health.stop()
+        if STALL_THRESHOLD_MS:
+            stalls.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+"""
+Broadcast - рассылка всем клиентам
+Resumable (checkpoint in DB) and rate-limited
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+)
+from aiogram.types import InlineKeyboardMarkup
+
+import database as db
+import tenants
+
+BATCH_SIZE = 100          # получателей на один checkpoint
+WORKERS = 8               # параллельных отправок
+RATE_PER_SECOND = 25      # лимит Telegram ~30 msg/s на бота
+PROGRESS_INTERVAL = 3     # секунд между обновлениями прогресса
+
+# broadcast_id -> running task / live stats of this process
+# broadcast id -> task / live stats; ids are per database, so per tenant
+_state = tenants.TenantLocal(tasks=dict, stats=dict)
+_watchers: set[asyncio.Task] = set()
+
+
+class RateLimiter:
+    """Evenly spaces calls: not more than `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# ═══════════════════════════════════════════════════════════
+# Sending
+# ═══════════════════════════════════════════════════════════
+
+async def _send_one(bot: Bot, user_id: int, text: str, limiter: RateLimiter) -> str:
+    """Returns 'sent', 'blocked' or 'failed'"""
+    while True:
+        await limiter.wait()
+        try:
+            await bot.send_message(user_id, text, parse_mode="HTML")
+            return 'sent'
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+        except TelegramForbiddenError:
+            db.mark_user_blocked(user_id)
+            return 'blocked'
+        except TelegramBadRequest:
+            return 'failed'
+        except Exception:
+            return 'failed'
+
+
+async def _send_batch(bot: Bot, user_ids: list[int], text: str, limiter: RateLimiter) -> dict:
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for user_id in user_ids:
+        queue.put_nowait(user_id)
+
+    counts = {'sent': 0, 'failed': 0, 'blocked': 0}
+
+    async def worker():
+        while not queue.empty():
+            user_id = queue.get_nowait()
+            result = await _send_one(bot, user_id, text, limiter)
+            counts[result] += 1
+
+    await asyncio.gather(*(worker() for _ in range(min(WORKERS, len(user_ids)))))
+    return counts
+
+
+async def _run(bot: Bot, broadcast_id: int):
+    b = db.get_broadcast(broadcast_id)
+    limiter = RateLimiter(RATE_PER_SECOND)
+    stats = _state.stats[broadcast_id] = {'started': time.monotonic(), 'processed': 0}
+    cursor = b['last_user_id']
+
+    try:
+        while True:
+            user_ids = db.get_broadcast_recipients(cursor, BATCH_SIZE)
+            if not user_ids:
+                break
+
+            counts = await _send_batch(bot, user_ids, b['text'], limiter)
+            cursor = user_ids[-1]
+            db.save_broadcast_progress(
+                broadcast_id, cursor, counts['sent'], counts['failed'], counts['blocked']
+            )
+            stats['processed'] += len(user_ids)
+
+        db.finish_broadcast(broadcast_id, 'done')
+    finally:
+        # При остановке процесса статус остаётся 'running' - продолжим с checkpoint
+        _state.tasks.pop(broadcast_id, None)
+
+
+# ═══════════════════════════════════════════════════════════
+# Public API
+# ═══════════════════════════════════════════════════════════
+
+def start_broadcast(bot: Bot, text: str) -> int:
+    broadcast_id = db.create_broadcast(text)
+    _state.tasks[broadcast_id] = asyncio.create_task(_run(bot, broadcast_id))
+    return broadcast_id
+
+
+def resume_broadcasts(bot: Bot) -> int:
+    """Continue broadcasts interrupted by a crash or restart"""
+    resumed = 0
+    for b in db.get_running_broadcasts():
+        if b['id'] not in _state.tasks:
+            _state.tasks[b['id']] = asyncio.create_task(_run(bot, b['id']))
+            resumed += 1
+    return resumed
+
+
+def stop_broadcast(broadcast_id: int) -> bool:
+    b = db.get_broadcast(broadcast_id)
+    if not b or b['status'] != 'running':
+        return False
+    db.finish_broadcast(broadcast_id, 'cancelled')
+    task = _state.tasks.get(broadcast_id)
+    if task:
+        task.cancel()
+    return True
+
+
+def format_progress(b: dict) -> str:
+    done = b['sent'] + b['failed'] + b['blocked']
+    total = max(b['total'], done)
+    percent = done * 100 // total if total else 100
+
+    status = {
+        'running': '⏳ Идёт',
+        'done': '✅ Завершена',
+        'cancelled': '⏹ Остановлена',
+    }.get(b['status'], b['status'])
+
+    text = (
+        f"📣 <b>РАССЫЛКА #{b['id']}</b>\n"
+        "━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"📊 Статус: {status}\n"
+        f"📈 Прогресс: <b>{done}/{total}</b> ({percent}%)\n"
+        f"✅ Доставлено: {b['sent']}\n"
+        f"🚫 Заблокировали: {b['blocked']}\n"
+        f"❌ Ошибок: {b['failed']}"
+    )
+
+    stats = _state.stats.get(b['id'])
+    if b['status'] == 'running' and stats:
+        elapsed = time.monotonic() - stats['started']
+        rate = stats['processed'] / elapsed if elapsed > 0 else 0
+        text += f"\n\n⚡ Скорость: {rate:.1f} сообщ/с"
+        if rate > 0:
+            eta = int((total - done) / rate)
+            text += f"\n⏱ Осталось: ~{eta // 60} мин {eta % 60} сек"
+
+    return text
+
+
+def watch_progress(
+    bot: Bot, chat_id: int, message_id: int, broadcast_id: int,
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+):
+    """Live-update the admin's progress message until the broadcast ends"""
+    task = asyncio.create_task(
+        _watch(bot, chat_id, message_id, broadcast_id, reply_markup)
+    )
+    _watchers.add(task)
+    task.add_done_callback(_watchers.discard)
+
+
+async def _watch(
+    bot: Bot, chat_id: int, message_id: int, broadcast_id: int,
+    reply_markup: Optional[InlineKeyboardMarkup]
+):
+    last_text = ""
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        b = db.get_broadcast(broadcast_id)
+        text = format_progress(b)
+        if text != last_text:
+            try:
+                await bot.edit_message_text(
+                    text, chat_id=chat_id, message_id=message_id,
+                    reply_markup=reply_markup if b['status'] == 'running' else None,
+                    parse_mode="HTML"
+                )
+            except TelegramBadRequest:
+                pass
+            last_text = text
+        if b['status'] != 'running':
+            return
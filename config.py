@@ -8,3 +8,13 @@ BOT_TOKEN = "8070233491:AAG-lw3_Rs3vxjATnaqCzzJEn6l23v6P8cE"
 # ID администраторов (узнать у @userinfobot)
 # Можно указать несколько: [123456789, 987654321]
 ADMIN_IDS = [482323068, 713476634]
+
+# Запись входящих апдейтов для replay.py (папка или None - выключено)
+RECORD_UPDATES_DIR = None
+
+# HTTP /livez, /readyz, /health (порт или None - выключено)
+HEALTH_HOST = "127.0.0.1"
+HEALTH_PORT = None
+
+# Детектор блокировок event loop: порог в мс или None - выключено (/stalls)
+STALL_THRESHOLD_MS = None
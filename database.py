@@ -3,15 +3,34 @@ Database layer - SQLite
 """
 
 import sqlite3
-from datetime import datetime
-from typing import Optional
+import time as time_module
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
 from contextlib import contextmanager
 
+import tenants
+from models import Booking, Specialist, TimeSlot
+
 DB_PATH = "bot_data.db"
 
+# Called with (specialist_id, date, time) after a booking is created or cancelled
+_booking_listeners: list[Callable[[str, str, str], None]] = []
+
+def add_booking_listener(listener: Callable[[str, str, str], None]):
+    _booking_listeners.append(listener)
+
+def _notify_booking_change(specialist_id: str, date: str, time: str):
+    for listener in _booking_listeners:
+        listener(specialist_id, date, time)
+
+def db_path() -> str:
+    """Database of the current tenant (tenants.py), else DB_PATH"""
+    tenant = tenants.current()
+    return tenant.db_path if tenant else DB_PATH
+
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path())
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -19,58 +38,424 @@ def get_db():
     finally:
         conn.close()
 
-def init_db():
-    with get_db() as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS specialists (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT,
-                photo_file_id TEXT,
-                is_active INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
-            CREATE TABLE IF NOT EXISTS time_slots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                time TEXT NOT NULL UNIQUE,
-                is_active INTEGER DEFAULT 1
-            );
-            
-            CREATE TABLE IF NOT EXISTS bookings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                specialist_id TEXT NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                booking_type TEXT DEFAULT 'scheduled',
-                client_name TEXT,
-                client_phone TEXT,
-                client_username TEXT,
-                client_user_id INTEGER,
-                status TEXT DEFAULT 'confirmed',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (specialist_id) REFERENCES specialists(id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            );
-            
-            CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(specialist_id, date);
-        """)
+def _row_factory(model: type) -> Callable:
+    new = tuple.__new__
+    return lambda cursor, row: new(model, row)
+
+_ROW_FACTORIES = {model: _row_factory(model) for model in (Specialist, TimeSlot, Booking)}
+
+def _select(conn: sqlite3.Connection, model: type, query: str, params=()) -> sqlite3.Cursor:
+    """Cursor yielding `model` tuples built straight from the row values"""
+    cursor = conn.cursor()
+    cursor.row_factory = _ROW_FACTORIES[model]
+    return cursor.execute(query, params)
+
+# ═══════════════════════════════════════════════════════════
+# SCHEMA MIGRATIONS
+# Version is stored in PRAGMA user_version; each migration runs
+# exactly once, in its own transaction. Only append new entries.
+# ═══════════════════════════════════════════════════════════
+
+def _migration_1(conn: sqlite3.Connection):
+    """Base schema (also adopts databases created before migrations)"""
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS specialists (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            photo_file_id TEXT,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS time_slots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            time TEXT NOT NULL UNIQUE,
+            is_active INTEGER DEFAULT 1
+        );
+        
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            specialist_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            booking_type TEXT DEFAULT 'scheduled',
+            client_name TEXT,
+            client_phone TEXT,
+            client_username TEXT,
+            client_user_id INTEGER,
+            status TEXT DEFAULT 'confirmed',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (specialist_id) REFERENCES specialists(id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(specialist_id, date);
+    """)
+    _add_column(conn, "specialists", "photo_file_id", "TEXT")
+    _add_column(conn, "bookings", "booking_type", "TEXT DEFAULT 'scheduled'")
+
+_migration_2 = """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        status TEXT DEFAULT 'running',
+        last_user_id INTEGER DEFAULT 0,
+        total INTEGER DEFAULT 0,
+        sent INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        blocked INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+    
+    CREATE TABLE IF NOT EXISTS blocked_users (
+        user_id INTEGER PRIMARY KEY,
+        blocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_bookings_client ON bookings(client_user_id);
+"""
+
+BACKFILL_BATCH = 10000
+
+def _migration_3(conn: sqlite3.Connection):
+    """Daily rollup of bookings, kept in sync by triggers"""
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS booking_daily_stats (
+            day TEXT NOT NULL,
+            specialist_id TEXT NOT NULL,
+            booking_type TEXT NOT NULL,
+            created INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, specialist_id, booking_type)
+        ) WITHOUT ROWID;
+        
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_stats_insert
+        AFTER INSERT ON bookings
+        BEGIN
+            INSERT INTO booking_daily_stats (day, specialist_id, booking_type, created, cancelled)
+            VALUES (NEW.date, NEW.specialist_id, COALESCE(NEW.booking_type, 'scheduled'),
+                    1, NEW.status = 'cancelled')
+            ON CONFLICT (day, specialist_id, booking_type) DO UPDATE SET
+                created = created + 1,
+                cancelled = cancelled + excluded.cancelled;
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_stats_status
+        AFTER UPDATE OF status ON bookings
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE booking_daily_stats
+            SET cancelled = cancelled + (NEW.status = 'cancelled') - (OLD.status = 'cancelled')
+            WHERE day = NEW.date
+              AND specialist_id = NEW.specialist_id
+              AND booking_type = COALESCE(NEW.booking_type, 'scheduled');
+        END;
+    """)
+
+    # Backfill existing bookings in id batches
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM bookings").fetchone()[0]
+    for start in range(0, max_id, BACKFILL_BATCH):
+        conn.execute("""
+            INSERT INTO booking_daily_stats (day, specialist_id, booking_type, created, cancelled)
+            SELECT date, specialist_id, COALESCE(booking_type, 'scheduled'),
+                   COUNT(*), SUM(status = 'cancelled')
+            FROM bookings
+            WHERE id > ? AND id <= ?
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, specialist_id, booking_type) DO UPDATE SET
+                created = created + excluded.created,
+                cancelled = cancelled + excluded.cancelled
+        """, (start, start + BACKFILL_BATCH))
+
+_migration_4 = """
+    CREATE TABLE IF NOT EXISTS funnel_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        step TEXT NOT NULL
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_funnel_ts ON funnel_events(ts, step, user_id);
+"""
+
+def _phone_tokens_sql(column: str) -> str:
+    """Phone as digits + national number + last 4 digits (FTS tokens)"""
+    digits = column
+    for ch in ("+", " ", "-", "(", ")", "."):
+        digits = f"REPLACE({digits}, '{ch}', '')"
+    return f"""(SELECT d || CASE WHEN length(d) = 11 THEN ' ' || substr(d, 2) ELSE '' END
+                       || CASE WHEN length(d) > 4 THEN ' ' || substr(d, -4) ELSE '' END
+                FROM (SELECT COALESCE({digits}, '') AS d))"""
+
+def _name_sql(column: str) -> str:
+    """unicode61 does not fold ё into е"""
+    return f"REPLACE(REPLACE({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+def _migration_5(conn: sqlite3.Connection):
+    """Full-text search over client name, phone and username"""
+    _run_script(conn, f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+            client_name, client_phone, client_username,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        );
+        
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_fts_insert
+        AFTER INSERT ON bookings
+        BEGIN
+            INSERT INTO bookings_fts (rowid, client_name, client_phone, client_username)
+            VALUES (NEW.id, {_name_sql('NEW.client_name')}, {_phone_tokens_sql('NEW.client_phone')},
+                    LTRIM(NEW.client_username, '@'));
+        END;
         
-        # Migration: add photo_file_id if not exists
-        try:
-            conn.execute("ALTER TABLE specialists ADD COLUMN photo_file_id TEXT")
-        except sqlite3.OperationalError:
-            pass
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_fts_update
+        AFTER UPDATE OF client_name, client_phone, client_username ON bookings
+        BEGIN
+            DELETE FROM bookings_fts WHERE rowid = OLD.id;
+            INSERT INTO bookings_fts (rowid, client_name, client_phone, client_username)
+            VALUES (NEW.id, {_name_sql('NEW.client_name')}, {_phone_tokens_sql('NEW.client_phone')},
+                    LTRIM(NEW.client_username, '@'));
+        END;
         
-        # Migration: add booking_type if not exists
-        try:
-            conn.execute("ALTER TABLE bookings ADD COLUMN booking_type TEXT DEFAULT 'scheduled'")
-        except sqlite3.OperationalError:
-            pass
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_fts_delete
+        AFTER DELETE ON bookings
+        BEGIN
+            DELETE FROM bookings_fts WHERE rowid = OLD.id;
+        END;
+    """)
+
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM bookings").fetchone()[0]
+    for start in range(0, max_id, BACKFILL_BATCH):
+        conn.execute(f"""
+            INSERT INTO bookings_fts (rowid, client_name, client_phone, client_username)
+            SELECT id, {_name_sql('client_name')}, {_phone_tokens_sql('client_phone')}, LTRIM(client_username, '@')
+            FROM bookings
+            WHERE id > ? AND id <= ?
+        """, (start, start + BACKFILL_BATCH))
+
+# (client_user_id, date, time) also serves the broadcast DISTINCT scan
+_migration_6 = """
+    CREATE INDEX IF NOT EXISTS idx_bookings_client_date ON bookings(client_user_id, date, time);
+    DROP INDEX IF EXISTS idx_bookings_client;
+"""
+
+# Availability matrix: all confirmed bookings of a date range
+_migration_7 = """
+    CREATE INDEX IF NOT EXISTS idx_bookings_day_confirmed
+    ON bookings(date, specialist_id, time) WHERE status = 'confirmed';
+"""
+
+def _migration_8(conn: sqlite3.Connection):
+    """Per-specialist weekly hours, exceptions and session length"""
+    _add_column(conn, "specialists", "session_minutes", "INTEGER DEFAULT 60")
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS specialist_hours (
+            specialist_id TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            start_min INTEGER NOT NULL,
+            end_min INTEGER NOT NULL,
+            PRIMARY KEY (specialist_id, weekday, start_min)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS schedule_exceptions (
+            specialist_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            start_min INTEGER NOT NULL,
+            end_min INTEGER NOT NULL,
+            PRIMARY KEY (specialist_id, date, start_min)
+        ) WITHOUT ROWID;
+        
+        CREATE INDEX IF NOT EXISTS idx_schedule_exceptions_date ON schedule_exceptions(date);
+    """)
+
+def _migration_9(conn: sqlite3.Connection):
+    """Idempotency key of the submitting Telegram message"""
+    _add_column(conn, "bookings", "idempotency_key", "TEXT")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency
+        ON bookings(idempotency_key) WHERE idempotency_key IS NOT NULL
+    """)
+
+# Waitlist for taken slots: queue order per slot, one live entry per
+# client and slot, and the offers on hold (few rows)
+_migration_10 = """
+    CREATE TABLE IF NOT EXISTS waitlist (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        specialist_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        client_name TEXT,
+        client_phone TEXT,
+        client_username TEXT,
+        client_user_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'waiting',
+        offered_until INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_waitlist_slot ON waitlist(specialist_id, date, time, created_at);
+    
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_waitlist_client
+    ON waitlist(client_user_id, specialist_id, date, time) WHERE status IN ('waiting', 'offered');
+    
+    CREATE INDEX IF NOT EXISTS idx_waitlist_offered ON waitlist(offered_until) WHERE status = 'offered';
+"""
+
+def _migration_11(conn: sqlite3.Connection):
+    """Recurring bookings: a series record, occurrences point to it"""
+    _add_column(conn, "bookings", "series_id", "INTEGER")
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS booking_series (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            specialist_id TEXT NOT NULL,
+            time TEXT NOT NULL,
+            interval_days INTEGER NOT NULL,
+            client_user_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_bookings_series
+        ON bookings(series_id, date) WHERE series_id IS NOT NULL;
+    """)
+
+def _epoch_sql(date: str, time: str) -> str:
+    """Epoch seconds of a local date + HH:MM (same as datetime.timestamp())"""
+    return f"CAST(strftime('%s', {date} || ' ' || {time}, 'utc') AS INTEGER)"
+
+def _migration_12(conn: sqlite3.Connection):
+    """Epoch start/end of every booking: range queries on one integer index"""
+    _add_column(conn, "bookings", "start_ts", "INTEGER")
+    _add_column(conn, "bookings", "end_ts", "INTEGER")
+
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM bookings").fetchone()[0]
+    for start in range(0, max_id, BACKFILL_BATCH):
+        conn.execute(f"""
+            UPDATE bookings
+            SET start_ts = {_epoch_sql('date', 'time')},
+                end_ts = {_epoch_sql('date', 'time')} + 60 * COALESCE(
+                    (SELECT session_minutes FROM specialists WHERE id = bookings.specialist_id), 60)
+            WHERE id > ? AND id <= ?
+        """, (start, start + BACKFILL_BATCH))
+
+    # Индексы после заполнения - так быстрее
+    _run_script(conn, """
+        -- status в индексе: счётчики по статусу не читают таблицу
+        CREATE INDEX IF NOT EXISTS idx_bookings_start ON bookings(start_ts, status);
+        
+        CREATE INDEX IF NOT EXISTS idx_bookings_specialist_start
+        ON bookings(specialist_id, start_ts) WHERE status = 'confirmed';
+    """)
+
+# Slots held while a client enters contacts (holds.py mirrors them here)
+_migration_13 = """
+    CREATE TABLE IF NOT EXISTS slot_holds (
+        date TEXT NOT NULL,
+        specialist_id TEXT NOT NULL,
+        time TEXT NOT NULL,
+        client_user_id INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL,
+        PRIMARY KEY (date, specialist_id, time)
+    ) WITHOUT ROWID;
+"""
+
+def _migration_14(conn: sqlite3.Connection):
+    """Epoch start/end of waitlist entries: offers block overlapping
+    sessions, not only the same start time"""
+    _add_column(conn, "waitlist", "start_ts", "INTEGER")
+    _add_column(conn, "waitlist", "end_ts", "INTEGER")
+    conn.execute(f"""
+        UPDATE waitlist
+        SET start_ts = {_epoch_sql('date', 'time')},
+            end_ts = {_epoch_sql('date', 'time')} + 60 * COALESCE(
+                (SELECT session_minutes FROM specialists WHERE id = waitlist.specialist_id), 60)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_waitlist_offered_start
+        ON waitlist(specialist_id, start_ts) WHERE status = 'offered'
+    """)
+
+def _migration_15(conn: sqlite3.Connection):
+    """Epoch start/end of slot holds: a hold blocks overlapping sessions"""
+    _add_column(conn, "slot_holds", "start_ts", "INTEGER")
+    _add_column(conn, "slot_holds", "end_ts", "INTEGER")
+    conn.execute(f"""
+        UPDATE slot_holds
+        SET start_ts = {_epoch_sql('date', 'time')},
+            end_ts = {_epoch_sql('date', 'time')} + 60 * COALESCE(
+                (SELECT session_minutes FROM specialists WHERE id = slot_holds.specialist_id), 60)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_start ON slot_holds(specialist_id, start_ts)")
+
+# Upcoming sessions of one client, ordered by start (/mybookings)
+_migration_16 = """
+    CREATE INDEX IF NOT EXISTS idx_bookings_client_start
+    ON bookings(client_user_id, start_ts) WHERE status = 'confirmed';
+"""
+
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+    _migration_8,
+    _migration_9,
+    _migration_10,
+    _migration_11,
+    _migration_12,
+    _migration_13,
+    _migration_14,
+    _migration_15,
+    _migration_16,
+]
+
+def _run_script(conn: sqlite3.Connection, script: str):
+    """Execute statements one by one (executescript would COMMIT)"""
+    statement = ""
+    for part in script.split(";"):
+        statement += part + ";"
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def schema_version() -> int:
+    with get_db() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def init_db() -> int:
+    """Apply pending migrations. Returns number of migrations applied"""
+    conn = sqlite3.connect(db_path(), isolation_level=None)
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version in range(current + 1, len(MIGRATIONS) + 1):
+            migration = MIGRATIONS[version - 1]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if callable(migration):
+                    migration(conn)
+                else:
+                    _run_script(conn, migration)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return max(len(MIGRATIONS) - current, 0)
+    finally:
+        conn.close()
 
 # ═══════════════════════════════════════════════════════════
 # SETTINGS
@@ -94,24 +479,23 @@ def set_setting(key: str, value: str):
 # SPECIALISTS
 # ═══════════════════════════════════════════════════════════
 
-def get_specialists(active_only: bool = True) -> list[dict]:
+SPECIALIST_COLUMNS = ", ".join(Specialist._fields)
+
+def get_specialists(active_only: bool = True) -> list[Specialist]:
     with get_db() as conn:
         if active_only:
-            rows = conn.execute(
-                "SELECT * FROM specialists WHERE is_active = 1 ORDER BY name"
+            return _select(conn, Specialist,
+                f"SELECT {SPECIALIST_COLUMNS} FROM specialists WHERE is_active = 1 ORDER BY name"
             ).fetchall()
-        else:
-            rows = conn.execute(
-                "SELECT * FROM specialists ORDER BY is_active DESC, name"
-            ).fetchall()
-        return [dict(row) for row in rows]
+        return _select(conn, Specialist,
+            f"SELECT {SPECIALIST_COLUMNS} FROM specialists ORDER BY is_active DESC, name"
+        ).fetchall()
 
-def get_specialist(spec_id: str) -> Optional[dict]:
+def get_specialist(spec_id: str) -> Optional[Specialist]:
     with get_db() as conn:
-        row = conn.execute(
-            "SELECT * FROM specialists WHERE id = ?", (spec_id,)
+        return _select(conn, Specialist,
+            f"SELECT {SPECIALIST_COLUMNS} FROM specialists WHERE id = ?", (spec_id,)
         ).fetchone()
-        return dict(row) if row else None
 
 def add_specialist(spec_id: str, name: str, description: str = "", photo_file_id: str = None) -> bool:
     try:
@@ -133,8 +517,8 @@ def update_specialist(spec_id: str, name: str = None, description: str = None) -
         conn.execute(
             "UPDATE specialists SET name = ?, description = ? WHERE id = ?",
             (
-                name if name is not None else spec['name'],
-                description if description is not None else spec['description'],
+                name if name is not None else spec.name,
+                description if description is not None else spec.description,
                 spec_id
             )
         )
@@ -159,23 +543,25 @@ def toggle_specialist(spec_id: str) -> bool:
 def delete_specialist(spec_id: str) -> bool:
     with get_db() as conn:
         conn.execute("DELETE FROM specialists WHERE id = ?", (spec_id,))
+        conn.execute("DELETE FROM specialist_hours WHERE specialist_id = ?", (spec_id,))
+        conn.execute("DELETE FROM schedule_exceptions WHERE specialist_id = ?", (spec_id,))
     return True
 
 # ═══════════════════════════════════════════════════════════
 # TIME SLOTS
 # ═══════════════════════════════════════════════════════════
 
-def get_time_slots(active_only: bool = True) -> list[dict]:
+TIME_SLOT_COLUMNS = ", ".join(TimeSlot._fields)
+
+def get_time_slots(active_only: bool = True) -> list[TimeSlot]:
     with get_db() as conn:
         if active_only:
-            rows = conn.execute(
-                "SELECT * FROM time_slots WHERE is_active = 1 ORDER BY time"
+            return _select(conn, TimeSlot,
+                f"SELECT {TIME_SLOT_COLUMNS} FROM time_slots WHERE is_active = 1 ORDER BY time"
             ).fetchall()
-        else:
-            rows = conn.execute(
-                "SELECT * FROM time_slots ORDER BY time"
-            ).fetchall()
-        return [dict(row) for row in rows]
+        return _select(conn, TimeSlot,
+            f"SELECT {TIME_SLOT_COLUMNS} FROM time_slots ORDER BY time"
+        ).fetchall()
 
 def add_time_slot(time: str) -> bool:
     try:
@@ -199,32 +585,220 @@ def delete_time_slot(slot_id: int) -> bool:
     return True
 
 # ═══════════════════════════════════════════════════════════
-# BOOKINGS
+# WORKING HOURS
+# Intervals are minutes from the day's 00:00; end may pass 1440
+# (работа после полуночи). A row with start = end = 0 is a day off.
 # ═══════════════════════════════════════════════════════════
 
-def is_slot_available(specialist_id: str, date: str, time: str) -> bool:
+def get_working_hours() -> list[dict]:
     with get_db() as conn:
-        row = conn.execute(
-            """SELECT 1 FROM bookings 
-               WHERE specialist_id = ? AND date = ? AND time = ? AND status = 'confirmed'""",
-            (specialist_id, date, time)
-        ).fetchone()
-        return row is None
+        rows = conn.execute(
+            "SELECT * FROM specialist_hours ORDER BY specialist_id, weekday, start_min"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def set_working_hours(spec_id: str, weekday: int, intervals: list[tuple[int, int]]):
+    """Replace hours for one weekday; empty list = day off"""
+    with get_db() as conn:
+        conn.execute(
+            "DELETE FROM specialist_hours WHERE specialist_id = ? AND weekday = ?",
+            (spec_id, weekday)
+        )
+        conn.executemany(
+            "INSERT INTO specialist_hours (specialist_id, weekday, start_min, end_min) VALUES (?, ?, ?, ?)",
+            [(spec_id, weekday, start, end) for start, end in intervals or [(0, 0)]]
+        )
+
+def clear_working_hours(spec_id: str):
+    with get_db() as conn:
+        conn.execute("DELETE FROM specialist_hours WHERE specialist_id = ?", (spec_id,))
+
+def get_schedule_exceptions(date_from: str) -> list[dict]:
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT * FROM schedule_exceptions WHERE date >= ? ORDER BY date, start_min",
+            (date_from,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def set_schedule_exception(spec_id: str, date: str, intervals: list[tuple[int, int]]):
+    """Replace hours for one date; empty list = day off"""
+    with get_db() as conn:
+        conn.execute(
+            "DELETE FROM schedule_exceptions WHERE specialist_id = ? AND date = ?",
+            (spec_id, date)
+        )
+        conn.executemany(
+            "INSERT INTO schedule_exceptions (specialist_id, date, start_min, end_min) VALUES (?, ?, ?, ?)",
+            [(spec_id, date, start, end) for start, end in intervals or [(0, 0)]]
+        )
+
+def delete_schedule_exception(spec_id: str, date: str):
+    with get_db() as conn:
+        conn.execute(
+            "DELETE FROM schedule_exceptions WHERE specialist_id = ? AND date = ?",
+            (spec_id, date)
+        )
+
+def set_session_minutes(spec_id: str, minutes: int) -> bool:
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE specialists SET session_minutes = ? WHERE id = ?",
+            (minutes, spec_id)
+        )
+    return True
+
+# ═══════════════════════════════════════════════════════════
+# BOOKINGS
+# ═══════════════════════════════════════════════════════════
+
+# Same order as models.Booking
+BOOKING_COLUMNS = """b.id, b.specialist_id, s.name, b.date, b.time, b.booking_type,
+    b.client_name, b.client_phone, b.client_username, b.client_user_id,
+    b.status, b.created_at"""
+
+MAX_SESSION_SECONDS = 480 * 60    # предел длительности сеанса в админке
+
+def _overlaps(table: str, condition: str = "", start: str = "?", end: str = "?") -> str:
+    """EXISTS: a row of `table` for the specialist overlapping [start, end)
+    (start_ts < end AND end_ts > start). The lower bound by the longest
+    session keeps it a range scan on the (specialist_id, start_ts) index.
+    Params: specialist_id, condition params, then start, end, start
+    unless they are given as column expressions."""
+    return f"""EXISTS (
+    SELECT 1 FROM {table}
+    WHERE specialist_id = ? {condition}
+      AND start_ts > {start} - {MAX_SESSION_SECONDS} AND start_ts < {end} AND end_ts > {start}
+)"""
+
+# Confirmed session (params: specialist_id, start, end, start)
+_BOOKED_SQL = _overlaps("bookings", "AND status = 'confirmed'")
+# Open waitlist offer of another client
+# (params: specialist_id, now, client_user_id, start, end, start)
+_OFFERED_CONDITION = "AND status = 'offered' AND offered_until > ? AND client_user_id IS NOT ?"
+_OFFERED_SQL = _overlaps("waitlist", _OFFERED_CONDITION)
+# Unexpired hold of another client entering contacts (same params)
+_HELD_CONDITION = "AND expires_at > ? AND client_user_id IS NOT ?"
+_HELD_SQL = _overlaps("slot_holds", _HELD_CONDITION)
+
+def start_ts(date: str, time: str) -> int:
+    return int(datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M").timestamp())
+
+def _session_span(conn: sqlite3.Connection, specialist_id: str, date: str, time: str) -> tuple[int, int]:
+    """(start_ts, end_ts) of a session starting at date + time"""
+    start = start_ts(date, time)
+    row = conn.execute("SELECT session_minutes FROM specialists WHERE id = ?", (specialist_id,)).fetchone()
+    return start, start + 60 * ((row[0] if row else None) or 60)
+
+def day_start_ts(date: str, days: int = 0) -> int:
+    """Epoch of local 00:00 of `date` (+ days), DST-safe"""
+    day = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=days)
+    return int(day.timestamp())
 
 def create_booking(
     specialist_id: str, date: str, time: str,
     client_name: str, client_phone: str, 
     client_username: str, client_user_id: int,
-    booking_type: str = 'scheduled'
-) -> int:
+    booking_type: str = 'scheduled',
+    idempotency_key: str = None
+) -> Optional[int]:
+    """Returns the new id, or None if the slot is already taken (or held
+    for someone on the waitlist) or this idempotency_key was already used
+    (see get_booking_id_by_key)"""
+    try:
+        with get_db() as conn:
+            booking_id = _insert_booking(
+                conn, specialist_id, date, time, client_name, client_phone,
+                client_username, client_user_id, booking_type, idempotency_key
+            )
+    except sqlite3.IntegrityError:
+        return None
+    if booking_id is None:
+        return None
+    _notify_booking_change(specialist_id, date, time)
+    return booking_id
+
+def _insert_booking(
+    conn: sqlite3.Connection, specialist_id: str, date: str, time: str,
+    client_name: str, client_phone: str, client_username: str, client_user_id: int,
+    booking_type: str = 'scheduled', idempotency_key: str = None
+) -> Optional[int]:
+    # Проверка и вставка одним оператором - атомарно при одном писателе
+    start, end = _session_span(conn, specialist_id, date, time)
+    now = int(time_module.time())
+    cursor = conn.execute(
+        f"""INSERT INTO bookings 
+           (specialist_id, date, time, client_name, client_phone, client_username,
+            client_user_id, booking_type, idempotency_key, start_ts, end_ts)
+           SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+           WHERE NOT {_BOOKED_SQL} AND NOT {_OFFERED_SQL} AND NOT {_HELD_SQL}""",
+        (specialist_id, date, time, client_name, client_phone, client_username,
+         client_user_id, booking_type, idempotency_key, start, end,
+         specialist_id, start, end, start,
+         specialist_id, now, client_user_id, start, end, start,
+         specialist_id, now, client_user_id, start, end, start)
+    )
+    return cursor.lastrowid if cursor.rowcount else None
+
+def get_booking_id_by_key(idempotency_key: str) -> Optional[int]:
     with get_db() as conn:
-        cursor = conn.execute(
-            """INSERT INTO bookings 
-               (specialist_id, date, time, client_name, client_phone, client_username, client_user_id, booking_type)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (specialist_id, date, time, client_name, client_phone, client_username, client_user_id, booking_type)
-        )
-        return cursor.lastrowid
+        row = conn.execute(
+            "SELECT id FROM bookings WHERE idempotency_key = ?", (idempotency_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+def get_booked_slots(date_from: str, date_to: str) -> list[tuple[str, str, str, int, int]]:
+    """(date, specialist_id, time, start_ts, end_ts) of every busy session
+    in range; slots offered to the waitlist or held for contact entry
+    count as busy. Spans are the stored ones, so a later change of the
+    session length does not move existing bookings."""
+    now = int(time_module.time())
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT date, specialist_id, time, start_ts, end_ts FROM bookings
+               WHERE date BETWEEN ? AND ? AND status = 'confirmed'
+               UNION ALL
+               SELECT date, specialist_id, time, start_ts, end_ts FROM waitlist
+               WHERE status = 'offered' AND offered_until > ? AND date BETWEEN ? AND ?
+               UNION ALL
+               SELECT date, specialist_id, time, start_ts, end_ts FROM slot_holds
+               WHERE date BETWEEN ? AND ? AND expires_at > ?""",
+            (date_from, date_to, now, date_from, date_to, date_from, date_to, now)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+def _bookings_query(
+    specialist_id: str, ts_from: Optional[int], ts_to: Optional[int], status: str, order: str = "DESC"
+) -> tuple[str, list]:
+    """Bookings starting in [ts_from, ts_to) - a range on idx_bookings_start"""
+    query = f"""
+        SELECT {BOOKING_COLUMNS}
+        FROM bookings b
+        JOIN specialists s ON b.specialist_id = s.id
+        WHERE 1=1
+    """
+    params = []
+    
+    if specialist_id:
+        query += " AND b.specialist_id = ?"
+        params.append(specialist_id)
+    if ts_from is not None:
+        query += " AND b.start_ts >= ?"
+        params.append(ts_from)
+    if ts_to is not None:
+        query += " AND b.start_ts < ?"
+        params.append(ts_to)
+    if status:
+        query += " AND b.status = ?"
+        params.append(status)
+    
+    query += f" ORDER BY b.start_ts {order}"
+    return query, params
+
+def _date_range(date_from: Optional[str], date_to: Optional[str]) -> tuple[Optional[int], Optional[int]]:
+    """Inclusive YYYY-MM-DD range -> [start, end) epoch range"""
+    return (day_start_ts(date_from) if date_from else None,
+            day_start_ts(date_to, days=1) if date_to else None)
 
 def get_bookings(
     specialist_id: str = None, 
@@ -232,53 +806,388 @@ def get_bookings(
     date_to: str = None,
     status: str = 'confirmed',
     limit: int = 50
-) -> list[dict]:
-    with get_db() as conn:
-        query = """
-            SELECT b.*, s.name as specialist_name 
-            FROM bookings b
-            JOIN specialists s ON b.specialist_id = s.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if specialist_id:
-            query += " AND b.specialist_id = ?"
-            params.append(specialist_id)
-        if date_from:
-            query += " AND b.date >= ?"
-            params.append(date_from)
-        if date_to:
-            query += " AND b.date <= ?"
-            params.append(date_to)
-        if status:
-            query += " AND b.status = ?"
-            params.append(status)
-        
-        query += " ORDER BY b.date DESC, b.time DESC LIMIT ?"
-        params.append(limit)
-        
-        rows = conn.execute(query, params).fetchall()
-        return [dict(row) for row in rows]
+) -> list[Booking]:
+    query, params = _bookings_query(specialist_id, *_date_range(date_from, date_to), status)
+    with get_db() as conn:
+        return _select(conn, Booking, query + " LIMIT ?", params + [limit]).fetchall()
+
+def get_bookings_starting(minutes: int, limit: int = 50) -> list[Booking]:
+    """Confirmed bookings starting within the next `minutes`, soonest
+    first - across midnight too (reminders, the admin's next hour)"""
+    now = int(time_module.time())
+    query, params = _bookings_query(None, now, now + minutes * 60, 'confirmed', order="ASC")
+    with get_db() as conn:
+        return _select(conn, Booking, query + " LIMIT ?", params + [limit]).fetchall()
+
+def iter_bookings(
+    specialist_id: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    status: str = 'confirmed',
+    batch: int = 1000
+) -> Iterator[Booking]:
+    """get_bookings without a limit, fetched lazily in batches (exports,
+    full scans). The connection stays open until the iterator is
+    exhausted or closed."""
+    query, params = _bookings_query(specialist_id, *_date_range(date_from, date_to), status)
+    with get_db() as conn:
+        cursor = _select(conn, Booking, query, params)
+        while rows := cursor.fetchmany(batch):
+            yield from rows
+
+def get_client_bookings(client_user_id: int, ts_from: int, limit: int = 10) -> list[Booking]:
+    """Confirmed bookings of one client starting at ts_from or later
+    (idx_bookings_client_start)"""
+    with get_db() as conn:
+        return _select(conn, Booking,
+            f"""SELECT {BOOKING_COLUMNS}
+               FROM bookings b
+               JOIN specialists s ON b.specialist_id = s.id
+               WHERE b.client_user_id = ? AND b.start_ts >= ? AND b.status = 'confirmed'
+               ORDER BY b.start_ts
+               LIMIT ?""",
+            (client_user_id, ts_from, limit)
+        ).fetchall()
 
 def cancel_booking(booking_id: int) -> bool:
     with get_db() as conn:
-        conn.execute(
-            "UPDATE bookings SET status = 'cancelled' WHERE id = ?",
+        row = conn.execute(
+            """UPDATE bookings SET status = 'cancelled'
+               WHERE id = ? AND status = 'confirmed'
+               RETURNING specialist_id, date, time""",
             (booking_id,)
-        )
+        ).fetchone()
+    if row:
+        _notify_booking_change(*row)
     return True
 
-def get_booking(booking_id: int) -> Optional[dict]:
+def get_booking(booking_id: int) -> Optional[Booking]:
     with get_db() as conn:
-        row = conn.execute(
-            """SELECT b.*, s.name as specialist_name 
+        return _select(conn, Booking,
+            f"""SELECT {BOOKING_COLUMNS}
                FROM bookings b
                JOIN specialists s ON b.specialist_id = s.id
                WHERE b.id = ?""",
             (booking_id,)
         ).fetchone()
-        return dict(row) if row else None
+
+_PHONE_CHARS = "+-()."
+
+def _phone_term(digits: str) -> str:
+    """A typed phone number as one prefix term; 8 and +7 are the same
+    country prefix, so a partial number starting with 8 tries both"""
+    if len(digits) == 11 and digits[0] == "8":
+        digits = "7" + digits[1:]
+    elif len(digits) > 1 and digits[0] == "8":
+        return f'("{digits}"* OR "7{digits[1:]}"*)'
+    return f'"{digits}"*'
+
+def _fts_query(text: str) -> str:
+    """User input -> FTS5 query: every word is a quoted prefix term;
+    consecutive number-like words ("+7 999 123-45-67") are one phone term"""
+    terms = []
+    digits = ""
+    for word in text.replace("ё", "е").replace("Ё", "Е").split():
+        word = word.lstrip("@")
+        if word and all(ch.isdigit() or ch in _PHONE_CHARS for ch in word):
+            digits += "".join(ch for ch in word if ch.isdigit())
+            continue
+        if digits:
+            terms.append(_phone_term(digits))
+            digits = ""
+        word = word.replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*')
+    if digits:
+        terms.append(_phone_term(digits))
+    return " ".join(terms)
+
+def search_bookings(text: str, limit: int = 20) -> list[Booking]:
+    """Ranked full-text search by client name, phone digits or username"""
+    query = _fts_query(text)
+    if not query:
+        return []
+    with get_db() as conn:
+        return _select(conn, Booking,
+            f"""SELECT {BOOKING_COLUMNS}
+               FROM bookings_fts f
+               JOIN bookings b ON b.id = f.rowid
+               JOIN specialists s ON b.specialist_id = s.id
+               WHERE bookings_fts MATCH ?
+               ORDER BY f.rank
+               LIMIT ?""",
+            (query, limit)
+        ).fetchall()
+
+# ═══════════════════════════════════════════════════════════
+# RECURRING BOOKINGS
+# A series repeats one booking every interval_days at the same time;
+# each occurrence is an ordinary booking with series_id set.
+# ═══════════════════════════════════════════════════════════
+
+def create_booking_series(booking_id: int, dates: list[str], interval_days: int) -> tuple[Optional[int], list[str]]:
+    """Repeat a confirmed booking on `dates` in one transaction: one
+    conflict query, one executemany. Returns (series id, booked dates);
+    dates already taken (or held for the waitlist) are skipped, and
+    (None, []) if none is free - no series is created then."""
+    with get_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        base = conn.execute(
+            """SELECT specialist_id, time, client_name, client_phone, client_username,
+                      client_user_id, booking_type, series_id
+               FROM bookings WHERE id = ? AND status = 'confirmed'""",
+            (booking_id,)
+        ).fetchone()
+        if base is None or not dates:
+            return None, []
+
+        spans = {date: _session_span(conn, base['specialist_id'], date, base['time']) for date in dates}
+        wanted = ", ".join(["(?, ?, ?)"] * len(dates))
+        now = int(time_module.time())
+        taken = {row[0] for row in conn.execute(
+            f"""WITH wanted(date, start, end_) AS (VALUES {wanted})
+                SELECT date FROM wanted w
+                WHERE {_overlaps("bookings", "AND status = 'confirmed'", "w.start", "w.end_")}
+                   OR {_overlaps("waitlist", _OFFERED_CONDITION, "w.start", "w.end_")}
+                   OR {_overlaps("slot_holds", _HELD_CONDITION, "w.start", "w.end_")}""",
+            (*(value for date in dates for value in (date, *spans[date])),
+             base['specialist_id'],
+             base['specialist_id'], now, base['client_user_id'],
+             base['specialist_id'], now, base['client_user_id'])
+        )}
+        free = [date for date in dates if date not in taken]
+        if not free:
+            # Пустую серию не заводим - её было бы видно в отмене серии
+            return None, []
+
+        series_id = base['series_id']
+        if series_id is None:
+            series_id = conn.execute(
+                """INSERT INTO booking_series (specialist_id, time, interval_days, client_user_id)
+                   VALUES (?, ?, ?, ?)""",
+                (base['specialist_id'], base['time'], interval_days, base['client_user_id'])
+            ).lastrowid
+            conn.execute("UPDATE bookings SET series_id = ? WHERE id = ?", (series_id, booking_id))
+
+        conn.executemany(
+            """INSERT INTO bookings
+               (specialist_id, date, time, client_name, client_phone, client_username,
+                client_user_id, booking_type, series_id, start_ts, end_ts)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(base['specialist_id'], date, base['time'], base['client_name'], base['client_phone'],
+              base['client_username'], base['client_user_id'], base['booking_type'], series_id,
+              *spans[date])
+             for date in free]
+        )
+    for date in free:
+        _notify_booking_change(base['specialist_id'], date, base['time'])
+    return series_id, free
+
+def get_booking_series_id(booking_id: int) -> Optional[int]:
+    with get_db() as conn:
+        row = conn.execute("SELECT series_id FROM bookings WHERE id = ?", (booking_id,)).fetchone()
+        return row[0] if row else None
+
+def cancel_booking_series(series_id: int, date_from: str) -> int:
+    """Cancel every confirmed occurrence from date_from on with one
+    UPDATE (idx_bookings_series); returns how many were cancelled"""
+    with get_db() as conn:
+        rows = conn.execute(
+            """UPDATE bookings SET status = 'cancelled'
+               WHERE series_id = ? AND date >= ? AND status = 'confirmed'
+               RETURNING specialist_id, date, time""",
+            (series_id, date_from)
+        ).fetchall()
+    for row in rows:
+        _notify_booking_change(*row)
+    return len(rows)
+
+# ═══════════════════════════════════════════════════════════
+# WAITLIST
+# status: waiting -> offered (slot held until offered_until) ->
+# booked / expired / left. Every change of a hold notifies the
+# booking listeners like a booking does.
+# ═══════════════════════════════════════════════════════════
+
+def join_waitlist(
+    specialist_id: str, date: str, time: str,
+    client_name: str, client_phone: str, client_username: str, client_user_id: int
+) -> Optional[int]:
+    """New entry id, or None if the client already waits for this slot"""
+    try:
+        with get_db() as conn:
+            cursor = conn.execute(
+                """INSERT INTO waitlist (specialist_id, date, time, client_name, client_phone,
+                                         client_username, client_user_id, start_ts, end_ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (specialist_id, date, time, client_name, client_phone, client_username, client_user_id,
+                 *_session_span(conn, specialist_id, date, time))
+            )
+            return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+
+def get_waitlist_position(entry_id: int) -> int:
+    """1-based place in the slot's queue (0 if no longer waiting)"""
+    with get_db() as conn:
+        row = conn.execute(
+            """SELECT COUNT(*) FROM waitlist w
+               JOIN waitlist me ON me.id = ? AND me.status = 'waiting'
+               WHERE w.specialist_id = me.specialist_id AND w.date = me.date AND w.time = me.time
+                 AND w.status IN ('waiting', 'offered')
+                 AND (w.created_at, w.id) <= (me.created_at, me.id)""",
+            (entry_id,)
+        ).fetchone()
+        return row[0]
+
+def offer_waitlist_slot(specialist_id: str, date: str, time: str, until: int) -> Optional[sqlite3.Row]:
+    """Hold a free slot for the first waiting client until `until` (epoch
+    seconds). One statement: nothing happens if an overlapping session is
+    booked, offered or held, or nobody waits - safe under concurrent
+    cancellations."""
+    now = int(time_module.time())
+    with get_db() as conn:
+        start, end = _session_span(conn, specialist_id, date, time)
+        row = conn.execute(
+            f"""UPDATE waitlist SET status = 'offered', offered_until = ?, start_ts = ?, end_ts = ?
+               WHERE id = (
+                   SELECT id FROM waitlist
+                   WHERE specialist_id = ? AND date = ? AND time = ? AND status = 'waiting'
+                   ORDER BY created_at, id
+                   LIMIT 1
+               ) AND NOT {_BOOKED_SQL} AND NOT {_OFFERED_SQL} AND NOT {_HELD_SQL}
+               RETURNING id, specialist_id, date, time, client_user_id, offered_until""",
+            (until, start, end, specialist_id, date, time,
+             specialist_id, start, end, start,
+             specialist_id, now, None, start, end, start,
+             specialist_id, now, None, start, end, start)
+        ).fetchone()
+    if row:
+        _notify_booking_change(specialist_id, date, time)
+    return row
+
+def accept_waitlist_offer(entry_id: int, client_user_id: int) -> Optional[int]:
+    """Book the held slot; None if the offer is gone (expired, left)"""
+    with get_db() as conn:
+        entry = conn.execute(
+            """UPDATE waitlist SET status = 'booked'
+               WHERE id = ? AND client_user_id = ? AND status = 'offered' AND offered_until > ?
+               RETURNING specialist_id, date, time, client_name, client_phone, client_username""",
+            (entry_id, client_user_id, int(time_module.time()))
+        ).fetchone()
+        if entry is None:
+            return None
+        booking_id = _insert_booking(
+            conn, entry['specialist_id'], entry['date'], entry['time'], entry['client_name'],
+            entry['client_phone'], entry['client_username'], client_user_id
+        )
+        if booking_id is None:
+            conn.rollback()
+            return None
+    _notify_booking_change(entry['specialist_id'], entry['date'], entry['time'])
+    return booking_id
+
+def _end_waitlist_entry(query: str, params: tuple) -> Optional[sqlite3.Row]:
+    with get_db() as conn:
+        row = conn.execute(query, params).fetchone()
+    if row and row['was_offered']:
+        _notify_booking_change(row['specialist_id'], row['date'], row['time'])
+    return row
+
+def expire_waitlist_offer(entry_id: int) -> Optional[sqlite3.Row]:
+    """Release the hold if the offer is still open; the entry or None"""
+    return _end_waitlist_entry(
+        """UPDATE waitlist SET status = 'expired'
+           WHERE id = ? AND status = 'offered'
+           RETURNING specialist_id, date, time, client_user_id, 1 AS was_offered""",
+        (entry_id,)
+    )
+
+def leave_waitlist(entry_id: int, client_user_id: int) -> Optional[sqlite3.Row]:
+    """Client leaves the queue or declines the offer (releasing the hold)"""
+    return _end_waitlist_entry(
+        """UPDATE waitlist SET status = 'left'
+           WHERE id = ? AND client_user_id = ? AND status IN ('waiting', 'offered')
+           RETURNING specialist_id, date, time, client_user_id,
+                     offered_until IS NOT NULL AS was_offered""",
+        (entry_id, client_user_id)
+    )
+
+def get_open_waitlist_offers() -> list[sqlite3.Row]:
+    """Offers still on hold (idx_waitlist_offered), for restoring timers"""
+    with get_db() as conn:
+        return conn.execute(
+            "SELECT id, offered_until FROM waitlist WHERE status = 'offered' AND offered_until IS NOT NULL"
+        ).fetchall()
+
+def get_free_waitlisted_slots(date_from: str) -> list[tuple[str, str, str]]:
+    """(specialist_id, date, time) with waiting clients and no booking"""
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT DISTINCT w.specialist_id, w.date, w.time
+               FROM waitlist w
+               WHERE w.status = 'waiting' AND w.date >= ?
+                 AND NOT EXISTS (
+                     SELECT 1 FROM bookings b
+                     WHERE b.date = w.date AND b.specialist_id = w.specialist_id
+                       AND b.time = w.time AND b.status = 'confirmed'
+                 )""",
+            (date_from,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+# ═══════════════════════════════════════════════════════════
+# SLOT HOLDS
+# Source of truth for expiry is holds.py (in memory); rows here make
+# holds visible to the booking checks and survive a restart.
+# ═══════════════════════════════════════════════════════════
+
+def hold_slot(specialist_id: str, date: str, time: str, client_user_id: int, expires_at: int) -> bool:
+    """Hold a free slot (or extend the client's own hold); False if an
+    overlapping session is booked, offered to the waitlist or held by
+    someone else"""
+    now = int(time_module.time())
+    with get_db() as conn:
+        start, end = _session_span(conn, specialist_id, date, time)
+        cursor = conn.execute(
+            f"""INSERT INTO slot_holds (date, specialist_id, time, client_user_id, expires_at, start_ts, end_ts)
+               SELECT ?, ?, ?, ?, ?, ?, ?
+               WHERE NOT {_BOOKED_SQL} AND NOT {_OFFERED_SQL} AND NOT {_HELD_SQL}
+               ON CONFLICT (date, specialist_id, time) DO UPDATE SET
+                   client_user_id = excluded.client_user_id,
+                   expires_at = excluded.expires_at,
+                   start_ts = excluded.start_ts,
+                   end_ts = excluded.end_ts""",
+            (date, specialist_id, time, client_user_id, expires_at, start, end,
+             specialist_id, start, end, start,
+             specialist_id, now, client_user_id, start, end, start,
+             specialist_id, now, client_user_id, start, end, start)
+        )
+    if cursor.rowcount == 0:
+        return False
+    _notify_booking_change(specialist_id, date, time)
+    return True
+
+def release_slot_holds(holds: list[tuple[str, str, str, int]]):
+    """Drop (specialist_id, date, time, client_user_id) holds in one executemany"""
+    if not holds:
+        return
+    with get_db() as conn:
+        conn.executemany(
+            """DELETE FROM slot_holds
+               WHERE specialist_id = ? AND date = ? AND time = ? AND client_user_id = ?""",
+            holds
+        )
+    for specialist_id, date, time, _ in holds:
+        _notify_booking_change(specialist_id, date, time)
+
+def get_slot_holds() -> list[tuple[str, str, str, int, int]]:
+    """(specialist_id, date, time, client_user_id, expires_at), for restoring holds.py"""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT specialist_id, date, time, client_user_id, expires_at FROM slot_holds"
+        ).fetchall()
+        return [tuple(row) for row in rows]
 
 # ═══════════════════════════════════════════════════════════
 # STATISTICS
@@ -293,13 +1202,13 @@ def get_stats() -> dict:
         ).fetchone()[0]
         
         today_count = conn.execute(
-            "SELECT COUNT(*) FROM bookings WHERE date = ? AND status = 'confirmed'",
-            (today,)
+            "SELECT COUNT(*) FROM bookings WHERE start_ts >= ? AND start_ts < ? AND status = 'confirmed'",
+            (day_start_ts(today), day_start_ts(today, days=1))
         ).fetchone()[0]
         
         upcoming = conn.execute(
-            "SELECT COUNT(*) FROM bookings WHERE date >= ? AND status = 'confirmed'",
-            (today,)
+            "SELECT COUNT(*) FROM bookings WHERE start_ts >= ? AND status = 'confirmed'",
+            (day_start_ts(today),)
         ).fetchone()[0]
         
         cancelled = conn.execute(
@@ -318,19 +1227,183 @@ def get_stats() -> dict:
             'active_specialists': specialists_count,
         }
 
+# ═══════════════════════════════════════════════════════════
+# ANALYTICS (booking_daily_stats rollup)
+# ═══════════════════════════════════════════════════════════
+
+def get_daily_totals(date_from: str, date_to: str) -> list[dict]:
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT day, SUM(created) AS created, SUM(cancelled) AS cancelled
+               FROM booking_daily_stats
+               WHERE day BETWEEN ? AND ?
+               GROUP BY day
+               ORDER BY day""",
+            (date_from, date_to)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def get_specialist_analytics(date_from: str, date_to: str) -> list[dict]:
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT r.specialist_id, COALESCE(s.name, r.specialist_id) AS specialist_name,
+                      SUM(r.created) AS created,
+                      SUM(r.cancelled) AS cancelled,
+                      SUM(CASE WHEN r.booking_type LIKE 'urgent%' THEN r.created ELSE 0 END) AS urgent
+               FROM booking_daily_stats r
+               LEFT JOIN specialists s ON s.id = r.specialist_id
+               WHERE r.day BETWEEN ? AND ?
+               GROUP BY r.specialist_id
+               ORDER BY created DESC""",
+            (date_from, date_to)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def get_type_analytics(date_from: str, date_to: str) -> dict[str, int]:
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT booking_type, SUM(created)
+               FROM booking_daily_stats
+               WHERE day BETWEEN ? AND ?
+               GROUP BY booking_type""",
+            (date_from, date_to)
+        ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+# ═══════════════════════════════════════════════════════════
+# FUNNEL EVENTS
+# ═══════════════════════════════════════════════════════════
+
+def insert_funnel_events(events: list[tuple[int, int, str]]):
+    """Batch insert of (ts, user_id, step)"""
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT INTO funnel_events (ts, user_id, step) VALUES (?, ?, ?)",
+            events
+        )
+
+def delete_funnel_events_before(ts: int):
+    with get_db() as conn:
+        conn.execute("DELETE FROM funnel_events WHERE ts < ?", (ts,))
+
+def get_funnel_counts(since_ts: int, stage_of: dict[str, str]) -> dict[str, int]:
+    """Unique users per stage; stage_of maps logged steps to stages"""
+    if not stage_of:
+        return {}
+    case = " ".join("WHEN ? THEN ?" for _ in stage_of)
+    params = [v for pair in stage_of.items() for v in pair]
+    placeholders = ", ".join("?" for _ in stage_of)
+    with get_db() as conn:
+        rows = conn.execute(
+            f"""SELECT CASE step {case} END AS stage, COUNT(DISTINCT user_id)
+                FROM funnel_events
+                WHERE ts >= ? AND step IN ({placeholders})
+                GROUP BY stage""",
+            (*params, since_ts, *stage_of)
+        ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+# ═══════════════════════════════════════════════════════════
+# BROADCASTS
+# ═══════════════════════════════════════════════════════════
+
+def count_broadcast_recipients() -> int:
+    with get_db() as conn:
+        return conn.execute(
+            """SELECT COUNT(DISTINCT client_user_id) FROM bookings
+               WHERE client_user_id IS NOT NULL
+                 AND client_user_id NOT IN (SELECT user_id FROM blocked_users)"""
+        ).fetchone()[0]
+
+def get_broadcast_recipients(after_user_id: int, limit: int) -> list[int]:
+    """Next page of distinct clients, streamed by idx_bookings_client_date"""
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT DISTINCT client_user_id FROM bookings
+               WHERE client_user_id > ?
+                 AND client_user_id NOT IN (SELECT user_id FROM blocked_users)
+               ORDER BY client_user_id
+               LIMIT ?""",
+            (after_user_id, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+def create_broadcast(text: str) -> int:
+    total = count_broadcast_recipients()
+    with get_db() as conn:
+        cursor = conn.execute(
+            "INSERT INTO broadcasts (text, total) VALUES (?, ?)",
+            (text, total)
+        )
+        return cursor.lastrowid
+
+def get_broadcast(broadcast_id: int) -> Optional[dict]:
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+def get_last_broadcast() -> Optional[dict]:
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT * FROM broadcasts ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        return dict(row) if row else None
+
+def get_running_broadcasts() -> list[dict]:
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def save_broadcast_progress(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int):
+    """Checkpoint: everything up to last_user_id is processed"""
+    with get_db() as conn:
+        conn.execute(
+            """UPDATE broadcasts
+               SET last_user_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ?
+               WHERE id = ?""",
+            (last_user_id, sent, failed, blocked, broadcast_id)
+        )
+
+def finish_broadcast(broadcast_id: int, status: str = 'done'):
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE broadcasts SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, broadcast_id)
+        )
+
+def mark_user_blocked(user_id: int):
+    with get_db() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO blocked_users (user_id) VALUES (?)",
+            (user_id,)
+        )
+
 # ═══════════════════════════════════════════════════════════
 # SEED DATA
 # ═══════════════════════════════════════════════════════════
 
+DEFAULT_SPECIALISTS = [
+    ("anna", "Анна Иванова", "👩‍⚕️ Психолог · 10 лет опыта\n\n✨ Специализация:\n• Тревожность и стресс\n• Депрессия\n• Отношения и семья"),
+    ("sergey", "Сергей Петров", "👨‍💼 Коуч · Бизнес-консультант\n\n✨ Помогаю:\n• Достигать целей\n• Масштабировать бизнес\n• Выходить из кризисов"),
+    ("maria", "Мария Сидорова", "👩‍🔬 Нутрициолог · Диетолог\n\n✨ Работаю с:\n• Снижением веса\n• Набором массы\n• Пищевыми привычками"),
+]
+
+DEFAULT_TIME_SLOTS = ["09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
+
 def seed_default_data():
-    """Initial data if DB is empty"""
-    specs = get_specialists(active_only=False)
-    if not specs:
-        add_specialist("anna", "Анна Иванова", "👩‍⚕️ Психолог · 10 лет опыта\n\n✨ Специализация:\n• Тревожность и стресс\n• Депрессия\n• Отношения и семья")
-        add_specialist("sergey", "Сергей Петров", "👨‍💼 Коуч · Бизнес-консультант\n\n✨ Помогаю:\n• Достигать целей\n• Масштабировать бизнес\n• Выходить из кризисов")
-        add_specialist("maria", "Мария Сидорова", "👩‍🔬 Нутрициолог · Диетолог\n\n✨ Работаю с:\n• Снижением веса\n• Набором массы\n• Пищевыми привычками")
-    
-    slots = get_time_slots(active_only=False)
-    if not slots:
-        for t in ["09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]:
-            add_time_slot(t)
+    """Initial data if DB is empty (single connection)"""
+    with get_db() as conn:
+        if not conn.execute("SELECT 1 FROM specialists LIMIT 1").fetchone():
+            conn.executemany(
+                "INSERT INTO specialists (id, name, description) VALUES (?, ?, ?)",
+                DEFAULT_SPECIALISTS
+            )
+        if not conn.execute("SELECT 1 FROM time_slots LIMIT 1").fetchone():
+            conn.executemany(
+                "INSERT INTO time_slots (time) VALUES (?)",
+                [(t,) for t in DEFAULT_TIME_SLOTS]
+            )
@@ -0,0 +1,140 @@
+"""
+Funnel - журнал шагов записи
+Events are kept in an in-memory ring buffer and written to the DB in
+batches by a background task, so handlers never wait for a commit.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+import database as db
+import tenants
+
+BUFFER_SIZE = 10000        # событий в памяти, старые вытесняются
+FLUSH_INTERVAL = 5         # секунд между записями в БД
+RETENTION_DAYS = 180
+
+# Этапы воронки: (ключ, подпись, шаги журнала)
+STAGES = [
+    ("start", "/start", ("start",)),
+    ("choose_specialist", "Список слушателей", ("choose_specialist",)),
+    ("spec", "Карточка слушателя", ("spec",)),
+    ("book", "Выбор времени", ("book",)),
+    ("slot", "Время выбрано", ("slot", "urgent")),
+    ("name", "Имя введено", ("name",)),
+    ("phone", "Телефон введён", ("phone",)),
+    ("booked", "Запись создана", ("booked",)),
+]
+
+_FIXED_CALLBACKS = {"choose_specialist", "backstart", "backlist", "restart"}
+
+_state = tenants.TenantLocal(
+    buffer=lambda: deque(maxlen=BUFFER_SIZE), dropped=int, task=lambda: None
+)
+
+
+def track(user_id: int, step: str):
+    """Record a step; O(1), no I/O"""
+    buffer = _state.buffer
+    if len(buffer) == BUFFER_SIZE:
+        _state.dropped += 1
+    buffer.append((int(time.time()), user_id, step))
+
+
+def callback_step(data: str) -> Optional[str]:
+    if not data or data.startswith("admin:") or data == "ignore":
+        return None
+    if data in _FIXED_CALLBACKS:
+        return data
+    return data.split("_", 1)[0]
+
+
+class FunnelMiddleware(BaseMiddleware):
+    """Outer middleware for the user router: logs callbacks and FSM steps"""
+
+    def __init__(self, state_steps: dict[str, str]):
+        # raw FSM state -> step name for text messages
+        self.state_steps = state_steps
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        step = None
+        if isinstance(event, CallbackQuery):
+            step = callback_step(event.data)
+        elif isinstance(event, Message) and event.text:
+            if event.text.startswith("/start"):
+                step = "start"
+            else:
+                step = self.state_steps.get(data.get("raw_state"))
+
+        if step and event.from_user:
+            track(event.from_user.id, step)
+        return await handler(event, data)
+
+
+# ═══════════════════════════════════════════════════════════
+# Background flush
+# ═══════════════════════════════════════════════════════════
+
+async def flush():
+    buffer = _state.buffer
+    if not buffer:
+        return
+    batch = []
+    while buffer:
+        batch.append(buffer.popleft())
+    await asyncio.to_thread(db.insert_funnel_events, batch)
+
+
+async def _flush_loop():
+    last_prune = 0.0
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await flush()
+            if time.time() - last_prune > 3600:
+                cutoff = int(time.time()) - RETENTION_DAYS * 86400
+                await asyncio.to_thread(db.delete_funnel_events_before, cutoff)
+                last_prune = time.time()
+        except Exception as e:
+            print(f"⚠️ Funnel flush failed: {e}")
+
+
+def start():
+    if _state.task is None:
+        _state.task = asyncio.create_task(_flush_loop())
+
+
+async def stop():
+    if _state.task:
+        _state.task.cancel()
+        _state.task = None
+    await flush()
+
+
+def dropped() -> int:
+    return _state.dropped
+
+
+# ═══════════════════════════════════════════════════════════
+# Report
+# ═══════════════════════════════════════════════════════════
+
+def report(days: int) -> list[dict]:
+    """Unique users per funnel stage for the last N days"""
+    since = int(time.time()) - days * 86400
+    stage_of = {step: key for key, _, steps in STAGES for step in steps}
+    counts = db.get_funnel_counts(since, stage_of)
+    return [
+        {'key': key, 'title': title, 'users': counts.get(key, 0)}
+        for key, title, _ in STAGES
+    ]
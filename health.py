@@ -0,0 +1,232 @@
+"""
+Health - HTTP-проверки живости и готовности
+    GET /livez   event loop is responsive (recent probe lag under LAG_THRESHOLD)
+    GET /readyz  database answers and getUpdates succeeded recently
+    GET /health  both, plus last update age and the loop lag histogram (JSON)
+A background probe sleeps PROBE_INTERVAL and records how late it woke
+up: a late wake-up means something held the loop (a synchronous
+database call, CPU work). While the loop is blocked the server cannot
+answer at all, so a probe with a timeout fails too.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+import database as db
+
+PROBE_INTERVAL = 0.1
+LAG_THRESHOLD = 1.0        # сек задержки цикла, выше - liveness падает
+LAG_WINDOW = 10            # сек, за которые берётся максимум задержки
+POLL_STALE = 60            # сек без успешного getUpdates - не готов
+DB_TIMEOUT = 2
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_started = time.monotonic()
+_recent: deque[float] = deque(maxlen=int(LAG_WINDOW / PROBE_INTERVAL))
+_last_probe: Optional[float] = None
+_last_poll: Optional[float] = None
+_last_update: Optional[float] = None
+_poll_errors = 0
+_probe_task: Optional[asyncio.Task] = None
+_runner: Optional["web.AppRunner"] = None
+
+
+class LagHistogram:
+    """Counts per bucket (upper bounds in BUCKETS, last one is +inf)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, lag: float):
+        index = 0
+        while index < len(BUCKETS) and lag > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += lag
+        self.max = max(self.max, lag)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th observation"""
+        rank = self.total * p
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        cumulative, seen = {}, 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            cumulative[f"{bound * 1000:g}ms"] = seen
+        cumulative["+inf"] = self.total
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum / self.total * 1000, 2) if self.total else 0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 2),
+            "p99_ms": round(self.percentile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "le": cumulative,
+        }
+
+
+histogram = LagHistogram()
+
+
+# ═══════════════════════════════════════════════════════════
+# Probes
+# ═══════════════════════════════════════════════════════════
+
+async def _probe_loop():
+    global _last_probe
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        histogram.observe(lag)
+        _recent.append(lag)
+        _last_probe = time.monotonic()
+
+
+def recent_lag() -> float:
+    """Worst lag over the last LAG_WINDOW seconds"""
+    return max(_recent, default=0.0)
+
+
+class PollingTracker(BaseRequestMiddleware):
+    """Session middleware: notes successful getUpdates and received updates"""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        global _last_poll, _last_update, _poll_errors
+        if not isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        try:
+            response = await make_request(bot, method)
+        except Exception:
+            _poll_errors += 1
+            raise
+        _last_poll = time.monotonic()
+        if response.result:
+            _last_update = _last_poll
+        return response
+
+
+def _age(moment: Optional[float]) -> Optional[float]:
+    return round(time.monotonic() - moment, 1) if moment is not None else None
+
+
+def _ping_db():
+    with db.get_db() as conn:
+        conn.execute("SELECT 1").fetchone()
+
+
+async def _db_ok() -> bool:
+    try:
+        await asyncio.wait_for(asyncio.to_thread(_ping_db), DB_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+
+def liveness() -> dict:
+    lag = recent_lag()
+    probe_age = _age(_last_probe)
+    alive = lag < LAG_THRESHOLD and probe_age is not None and probe_age < LAG_THRESHOLD + PROBE_INTERVAL
+    return {"ok": alive, "loop_lag_ms": round(lag * 1000, 1), "probe_age": probe_age}
+
+
+async def readiness() -> dict:
+    database = await _db_ok()
+    poll_age = _age(_last_poll)
+    polling = poll_age is not None and poll_age < POLL_STALE
+    return {
+        "ok": database and polling,
+        "database": database,
+        "polling": polling,
+        "last_poll_age": poll_age,
+        "last_update_age": _age(_last_update),
+        "poll_errors": _poll_errors,
+    }
+
+
+def format_lag() -> str:
+    s = histogram.snapshot()
+    return (
+        f"Цикл событий: задержка сейчас {recent_lag() * 1000:.0f} мс · "
+        f"p50 ≤{s['p50_ms']:g} / p99 ≤{s['p99_ms']:g} / max {s['max_ms']:.0f} мс"
+    )
+
+
+# ═══════════════════════════════════════════════════════════
+# HTTP server (aiohttp.web is imported by start())
+# ═══════════════════════════════════════════════════════════
+
+def _respond(result: dict) -> "web.Response":
+    from aiohttp import web
+    return web.json_response(result, status=200 if result["ok"] else 503)
+
+
+async def _livez(request: "web.Request") -> "web.Response":
+    return _respond(liveness())
+
+
+async def _readyz(request: "web.Request") -> "web.Response":
+    return _respond(await readiness())
+
+
+async def _health(request: "web.Request") -> "web.Response":
+    live, ready = liveness(), await readiness()
+    return _respond({
+        "ok": live["ok"] and ready["ok"],
+        "uptime": _age(_started),
+        "live": live,
+        "ready": ready,
+        "loop_lag": histogram.snapshot(),
+    })
+
+
+def start_probe():
+    global _probe_task
+    if _probe_task is None:
+        _probe_task = asyncio.create_task(_probe_loop())
+
+
+async def start(bot: Bot, host: str, port: int):
+    """Lag probe, getUpdates tracking on the bot session and the HTTP server"""
+    global _runner
+    # aiohttp.web (~20 ms of imports) only when the endpoint is enabled
+    from aiohttp import web
+    start_probe()
+    bot.session.middleware(PollingTracker())
+    app = web.Application()
+    app.router.add_get("/livez", _livez)
+    app.router.add_get("/readyz", _readyz)
+    app.router.add_get("/health", _health)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host, port).start()
+
+
+async def stop():
+    global _probe_task, _runner
+    if _probe_task:
+        _probe_task.cancel()
+        _probe_task = None
+    if _runner:
+        await _runner.cleanup()
+        _runner = None
@@ -0,0 +1,178 @@
+"""
+Slot holds - временная бронь слота на время ввода контактов
+A client who picked a time gets it for HOLD_SECONDS while typing their
+name and phone: other clients see the slot as busy and cannot book it.
+Holds live in memory (slot -> holder, holder -> slot) and are mirrored
+to the slot_holds table, which the booking checks read and which
+restores them after a restart. Expiry is a min-heap drained by one
+sweeper task that sleeps until the earliest deadline, so the cost is
+O(log n) per hold and nothing scans the open holds. Stale heap entries
+(released or extended holds) are skipped when popped.
+
+HoldReleaseMiddleware releases a hold as soon as the client leaves the
+contact entry: booking completed, /start, or any button pressed other
+than the one that took the hold (back navigation, another day).
+"""
+
+import asyncio
+import heapq
+import time
+from typing import Any, Awaitable, Callable, Collection, NamedTuple, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+import database as db
+import tenants
+
+HOLD_SECONDS = 300
+
+
+class Hold(NamedTuple):
+    user_id: int
+    specialist_id: str
+    date: str
+    time: str
+    expires_at: int
+
+
+# holds: (specialist_id, date, time) -> Hold; by_user: user id -> Hold;
+# heap: (expires_at, user_id, slot); wake: a new earliest deadline
+_state = tenants.TenantLocal(
+    holds=dict, by_user=dict, heap=list, wake=asyncio.Event, task=lambda: None
+)
+
+
+def held_by(user_id: int) -> Optional[Hold]:
+    return _state.by_user.get(user_id)
+
+
+def acquire(user_id: int, specialist_id: str, date: str, time_: str) -> bool:
+    """Hold the slot for the user (dropping their previous hold); False if
+    it is booked or held by someone else"""
+    slot = (specialist_id, date, time_)
+    now = int(time.time())
+    current = _state.holds.get(slot)
+    if current and current.user_id != user_id and current.expires_at > now:
+        return False
+    previous = _state.by_user.get(user_id)
+    if previous and previous[1:4] != slot:
+        release(user_id)
+
+    hold = Hold(user_id, specialist_id, date, time_, now + HOLD_SECONDS)
+    if not db.hold_slot(specialist_id, date, time_, user_id, hold.expires_at):
+        return False
+    _remember(hold)
+    return True
+
+
+def _remember(hold: Hold):
+    slot = hold[1:4]
+    previous = _state.holds.get(slot)
+    if previous and previous.user_id != hold.user_id:
+        _state.by_user.pop(previous.user_id, None)
+    _state.holds[slot] = hold
+    _state.by_user[hold.user_id] = hold
+    heap = _state.heap
+    heapq.heappush(heap, (hold.expires_at, hold.user_id, slot))
+    if heap[0][0] == hold.expires_at:
+        _state.wake.set()
+
+
+def _forget(hold: Hold) -> bool:
+    if _state.holds.get(hold[1:4]) != hold:
+        return False
+    del _state.holds[hold[1:4]]
+    if _state.by_user.get(hold.user_id) == hold:
+        del _state.by_user[hold.user_id]
+    return True
+
+
+def release(user_id: int):
+    """Release the user's hold, if any (the heap entry goes stale)"""
+    hold = _state.by_user.get(user_id)
+    if hold and _forget(hold):
+        db.release_slot_holds([(hold.specialist_id, hold.date, hold.time, user_id)])
+
+
+def _expired(now: int) -> list[Hold]:
+    heap, holds = _state.heap, _state.holds
+    expired = []
+    while heap and heap[0][0] <= now:
+        expires_at, user_id, slot = heapq.heappop(heap)
+        hold = holds.get(slot)
+        if hold and hold.user_id == user_id and hold.expires_at == expires_at:
+            _forget(hold)
+            expired.append(hold)
+    return expired
+
+
+async def _sweep_loop():
+    wake = _state.wake
+    while True:
+        wake.clear()
+        now = int(time.time())
+        expired = _expired(now)
+        if expired:
+            try:
+                db.release_slot_holds([(h.specialist_id, h.date, h.time, h.user_id) for h in expired])
+            except Exception as e:
+                print(f"⚠️ Slot hold release failed: {e}")
+        heap = _state.heap
+        timeout = heap[0][0] - now if heap else None
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class HoldReleaseMiddleware(BaseMiddleware):
+    """Outer middleware for the user router: after the handler, drops the
+    hold of a client who is no longer entering contacts"""
+
+    def __init__(self, holding_states: Collection[str]):
+        self.holding_states = holding_states
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        before = held_by(user.id) if user else None
+        try:
+            return await handler(event, data)
+        finally:
+            if user:
+                hold = held_by(user.id)
+                if hold is not None:
+                    if isinstance(event, CallbackQuery):
+                        # Кнопка, которая не брала этот слот, - клиент ушёл
+                        leave = hold is before
+                    else:
+                        state = data.get("state")
+                        leave = state is None or await state.get_state() not in self.holding_states
+                    if leave:
+                        release(user.id)
+
+
+def start():
+    """Restore holds that survived a restart and start the sweeper"""
+    if _state.task is not None:
+        return
+    # Event привязывается к циклу, в котором его ждут (после stop() цикл может быть другим)
+    _state.wake = asyncio.Event()
+    for specialist_id, date, time_, user_id, expires_at in db.get_slot_holds():
+        _remember(Hold(user_id, specialist_id, date, time_, expires_at))
+    _state.task = asyncio.create_task(_sweep_loop())
+
+
+def stop():
+    # Строки в slot_holds остаются - start() их подхватит
+    if _state.task:
+        _state.task.cancel()
+        _state.task = None
+    _state.holds.clear()
+    _state.by_user.clear()
+    _state.heap.clear()
@@ -0,0 +1,38 @@
+"""
+Models - типизированные строки из БД
+Rows are NamedTuples: one tuple per row instead of a dict, read by
+attribute. Field order matches the explicit column lists in
+database.py, so a cursor row becomes a model without copying.
+"""
+
+from typing import NamedTuple, Optional
+
+
+class Specialist(NamedTuple):
+    id: str
+    name: str
+    description: Optional[str]
+    photo_file_id: Optional[str]
+    is_active: int
+    session_minutes: Optional[int]
+
+
+class TimeSlot(NamedTuple):
+    id: int
+    time: str
+    is_active: int
+
+
+class Booking(NamedTuple):
+    id: int
+    specialist_id: str
+    specialist_name: str
+    date: str
+    time: str
+    booking_type: Optional[str]
+    client_name: str
+    client_phone: str
+    client_username: Optional[str]
+    client_user_id: Optional[int]
+    status: str
+    created_at: str
@@ -0,0 +1,112 @@
+"""
+Notifications - уведомления админам
+Immediate mode sends every event as its own message. In digest mode
+events are buffered for the configured window and each admin gets one
+summary, split into messages that fit Telegram's 4096-char limit.
+Urgent events always go out at once. Buffers and settings are kept
+per tenant.
+"""
+
+import asyncio
+import re
+
+from aiogram import Bot
+
+import database as db
+import tenants
+
+MESSAGE_LIMIT = 4096
+WINDOWS = [0, 60, 300, 900]        # варианты окна в админке, 0 = сразу
+SETTING = "digest_window"
+
+_state = tenants.TenantLocal(buffer=list, window=lambda: None, task=lambda: None)
+
+
+def get_window() -> int:
+    if _state.window is None:
+        _state.window = int(db.get_setting(SETTING, "0") or 0)
+    return _state.window
+
+
+def set_window(seconds: int):
+    db.set_setting(SETTING, str(seconds))
+    _state.window = seconds
+
+
+def window_label(seconds: int) -> str:
+    if not seconds:
+        return "сразу"
+    return f"дайджест {seconds // 60} мин"
+
+
+async def _send_all(bot: Bot, text: str):
+    for admin_id in tenants.admin_ids():
+        try:
+            await bot.send_message(admin_id, text, parse_mode="HTML")
+        except Exception:
+            pass
+
+
+def _units(text: str) -> int:
+    """Telegram counts the limit in UTF-16 code units (emoji = 2)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_message(header: str, lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Pack lines into messages of at most `limit` units; never splits a line
+    (each line is self-contained HTML), over-long lines are cut"""
+    messages = []
+    current = header
+    size = _units(header)
+    room = limit - size - 1
+    for line in lines:
+        line_size = _units(line)
+        if line_size > room:
+            # Обрезаем по тексту без разметки, чтобы не порвать тег
+            line = re.sub(r"<[^>]+>", "", line)[:room // 2 - 1] + "…"
+            line_size = _units(line)
+        if size + 1 + line_size > limit:
+            messages.append(current)
+            current, size = header, _units(header)
+        current += "\n" + line
+        size += 1 + line_size
+    if current != header:
+        messages.append(current)
+    return messages
+
+
+async def notify(bot: Bot, text: str, digest_line: str, urgent: bool = False):
+    """Send `text` now, or queue `digest_line` for the next digest"""
+    window = get_window()
+    if urgent or not window:
+        await _send_all(bot, text)
+        return
+
+    _state.buffer.append(digest_line)
+    if _state.task is None:
+        _state.task = asyncio.create_task(_flush_later(bot, window))
+
+
+async def _flush_later(bot: Bot, window: int):
+    try:
+        await asyncio.sleep(window)
+    finally:
+        _state.task = None
+    await flush(bot)
+
+
+async def flush(bot: Bot):
+    if not _state.buffer:
+        return
+    lines = _state.buffer[:]
+    _state.buffer.clear()
+    header = f"🔔 <b>Сводка</b> · событий: {len(lines)}\n"
+    for text in split_message(header, lines):
+        await _send_all(bot, text)
+
+
+async def stop(bot: Bot):
+    if _state.task:
+        _state.task.cancel()
+        _state.task = None
+    await flush(bot)
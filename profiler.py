@@ -0,0 +1,215 @@
+"""
+Profiler - сэмплирующий профайлер по команде /profile
+Runs inside the bot for a fixed time without restarting it:
+- a thread samples every Python thread's stack via sys._current_frames()
+  (wall-clock, INTERVAL) - shows what the loop thread and the
+  to_thread workers were executing
+- a task on the loop samples the coroutine chain of every asyncio task
+  (TASK_INTERVAL) - shows where tasks were waiting
+Results are collapsed stacks ("a;b;c count", flamegraph.pl/speedscope
+ready) plus a top-functions summary. Idle threads are not counted.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, InputMediaDocument
+
+from stalls import frame_name
+
+INTERVAL = 0.01
+TASK_INTERVAL = 0.05
+DEFAULT_SECONDS = 30
+MAX_SECONDS = 300
+TOP = 40
+
+# Листья стека спящего потока (имена как у stalls.frame_name) - не считаются
+IDLE_LEAVES = {
+    "threading.Condition.wait", "threading.Event.wait", "threading.Thread.join",
+    "thread._worker", "queue.Queue.get",
+}
+LOOP_IDLE_LEAVES = {"selectors.EpollSelector.select", "selectors.KqueueSelector.select",
+                    "selectors.SelectSelector.select", "selectors.PollSelector.select"}
+
+
+class Profile:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started = time.time()
+        self.threads: Counter[str] = Counter()
+        self.tasks: Counter[str] = Counter()
+        self.samples = 0           # проходов по потокам
+        self.loop_busy = 0         # из них поток цикла не ждал в select
+        self.task_samples = 0
+
+
+_current: Optional[Profile] = None
+_task: Optional[asyncio.Task] = None
+
+
+# ═══════════════════════════════════════════════════════════
+# Sampling
+# ═══════════════════════════════════════════════════════════
+
+def _stack(frame) -> list[str]:
+    """Outermost first"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def _sample_threads(profile: Profile, deadline: float, loop_thread: int):
+    own = threading.get_ident()
+    names: dict[int, str] = {}
+    next_names = 0.0
+    while time.monotonic() < deadline:
+        if time.monotonic() >= next_names:  # имена потоков раз в секунду
+            names = {t.ident: t.name for t in threading.enumerate()}
+            next_names = time.monotonic() + 1
+        profile.samples += 1
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = _stack(frame)
+            del frame
+            leaf = stack[-1] if stack else ""
+            if leaf in IDLE_LEAVES:
+                continue
+            if ident == loop_thread:
+                if leaf in LOOP_IDLE_LEAVES:
+                    continue
+                profile.loop_busy += 1
+            profile.threads[";".join([names.get(ident, str(ident))] + stack)] += 1
+        time.sleep(INTERVAL)
+
+
+def _coroutine_stack(coro) -> list[str]:
+    names = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        names.append(frame_name(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return names
+
+
+async def _sample_tasks(profile: Profile, deadline: float):
+    me = asyncio.current_task()
+    while time.monotonic() < deadline:
+        profile.task_samples += 1
+        for task in asyncio.all_tasks():
+            if task is me:
+                continue
+            stack = _coroutine_stack(task.get_coro())
+            if stack:
+                profile.tasks[";".join(stack)] += 1
+        await asyncio.sleep(TASK_INTERVAL)
+
+
+async def run(seconds: float) -> Profile:
+    """Profile the process for `seconds`; one run at a time"""
+    global _current
+    if _current is not None:
+        raise RuntimeError("profiler already running")
+    profile = _current = Profile(seconds)
+    deadline = time.monotonic() + seconds
+    try:
+        await asyncio.gather(
+            asyncio.to_thread(_sample_threads, profile, deadline, threading.get_ident()),
+            _sample_tasks(profile, deadline),
+        )
+    finally:
+        _current = None
+    return profile
+
+
+# ═══════════════════════════════════════════════════════════
+# Output
+# ═══════════════════════════════════════════════════════════
+
+def collapsed(counter: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counter.most_common())
+
+
+def top_functions(counter: Counter, limit: int = TOP) -> list[tuple[str, int, int]]:
+    """(function, self samples, total samples) by self samples"""
+    own, total = Counter(), Counter()
+    for stack, count in counter.items():
+        frames = stack.split(";")[1:]  # без имени потока
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for name in set(frames):
+            total[name] += count
+    return [(name, own[name], total[name]) for name, _ in own.most_common(limit)]
+
+
+def summary(profile: Profile) -> str:
+    busy = profile.loop_busy / profile.samples * 100 if profile.samples else 0
+    lines = [
+        f"Profile {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(profile.started))}, "
+        f"{profile.seconds:g} s",
+        f"thread samples: {profile.samples} x {INTERVAL * 1000:g} ms, loop thread busy {busy:.1f}%",
+        f"task samples: {profile.task_samples} x {TASK_INTERVAL * 1000:g} ms",
+        "",
+        f"{'self':>7} {'self%':>6} {'total':>7} {'total%':>6}  function",
+    ]
+    samples = max(profile.samples, 1)
+    for name, own, total in top_functions(profile.threads):
+        lines.append(f"{own:>7} {own / samples * 100:>5.1f}% {total:>7} {total / samples * 100:>5.1f}%  {name}")
+    lines += ["", "Tasks - where coroutines were suspended:", ""]
+    task_samples = max(profile.task_samples, 1)
+    for stack, count in profile.tasks.most_common(20):
+        lines.append(f"{count / task_samples:>7.1f} avg  {stack.split(';')[-1]}  <- {stack.split(';')[0]}")
+    return "\n".join(lines) + "\n"
+
+
+def files(profile: Profile) -> list[tuple[str, bytes]]:
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started))
+    return [
+        (f"profile-{stamp}-top.txt", summary(profile).encode()),
+        (f"profile-{stamp}-threads.collapsed", collapsed(profile.threads).encode()),
+        (f"profile-{stamp}-tasks.collapsed", collapsed(profile.tasks).encode()),
+    ]
+
+
+async def _run_and_send(bot: Bot, chat_id: int, seconds: float):
+    global _task
+    try:
+        profile = await run(seconds)
+        busy = profile.loop_busy / profile.samples * 100 if profile.samples else 0
+        caption = f"🔥 Профиль за {seconds:g} с · цикл занят {busy:.0f}% · сэмплов {profile.samples}"
+        documents = [BufferedInputFile(data, filename=name) for name, data in files(profile) if data]
+        # Альбом в Telegram - от 2 до 10 файлов
+        if not documents:
+            await bot.send_message(chat_id, f"{caption}\n\nДанных нет - нечего отправить.")
+        elif len(documents) == 1:
+            await bot.send_document(chat_id, documents[0], caption=caption)
+        else:
+            await bot.send_media_group(chat_id, [
+                InputMediaDocument(media=document, caption=caption if i == 0 else None)
+                for i, document in enumerate(documents)
+            ])
+    except Exception as e:
+        await bot.send_message(chat_id, f"❌ Профилирование не удалось: {e}")
+    finally:
+        _task = None
+
+
+def start(bot: Bot, chat_id: int, seconds: float) -> bool:
+    """Profile in the background and send the files to chat_id;
+    False if a profile is already being taken"""
+    global _task
+    if _task is not None:
+        return False
+    _task = asyncio.create_task(_run_and_send(bot, chat_id, seconds))
+    return True
@@ -0,0 +1,186 @@
+"""
+Recorder - запись входящих апдейтов для replay.py
+Opt-in (config.RECORD_UPDATES_DIR). Updates are anonymised, stamped with
+their arrival offset and written by a background task to gzip JSONL
+files that rotate by line count. Clients get stable pseudonymous ids
+(keyed hash, new key per process); admin ids are kept so admin traffic
+still passes the admin filters on replay.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+import tenants
+
+ROTATE_LINES = 50_000      # апдейтов в одном файле
+KEEP_FILES = 100
+FLUSH_INTERVAL = 5
+
+_USER_KEYS = ("from", "from_user", "chat", "user", "sender_chat")
+_PHONE = re.compile(r"\+?\d[\d\s\-()]{5,}\d")
+
+_dir: Optional[str] = None
+_salt = secrets.token_bytes(16)
+_started = 0.0
+_buffer: list[str] = []
+_task: Optional[asyncio.Task] = None
+_file: Optional[gzip.GzipFile] = None
+_file_lines = 0
+
+
+# ═══════════════════════════════════════════════════════════
+# Anonymisation
+# ═══════════════════════════════════════════════════════════
+
+def _pseudo_id(real_id: int) -> int:
+    if real_id < 0 or tenants.is_admin(real_id):  # админы и группы/каналы как есть
+        return real_id
+    digest = hmac.new(_salt, str(real_id).encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], "big") & 0x7FFFFFFF or 1
+
+
+def _mask_phone(match: re.Match) -> str:
+    value = match.group()
+    if sum(ch.isdigit() for ch in value) < 7:
+        return value
+    return re.sub(r"\d", "0", value)
+
+
+def _mask_text(text: str) -> str:
+    """Commands stay; letters become x, phone-like digit runs zeros"""
+    if text.startswith("/"):
+        return text.split(maxsplit=1)[0]
+    text = _PHONE.sub(_mask_phone, text)
+    return "".join("x" if ch.isalpha() else ch for ch in text)
+
+
+def anonymize(obj: Any) -> Any:
+    if isinstance(obj, list):
+        return [anonymize(item) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    result = {}
+    for key, value in obj.items():
+        if key in _USER_KEYS and isinstance(value, dict):
+            value = dict(value)
+            if "id" in value:
+                value["id"] = _pseudo_id(value["id"])
+                if "username" in value:
+                    value["username"] = f"u{value['id']}"
+            for field in ("first_name", "last_name", "title"):
+                if field in value:
+                    value[field] = "User"
+            result[key] = value
+        elif key in ("text", "caption") and isinstance(value, str):
+            result[key] = _mask_text(value)
+        elif key in ("phone_number", "bio"):
+            result[key] = "0"
+        elif key in ("entities", "caption_entities"):
+            continue  # смещения не совпадут с замаскированным текстом
+        else:
+            result[key] = anonymize(value)
+    return result
+
+
+# ═══════════════════════════════════════════════════════════
+# Recording
+# ═══════════════════════════════════════════════════════════
+
+def record(update: Update):
+    payload = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+    _buffer.append(json.dumps(
+        {"t": round(time.monotonic() - _started, 4), "update": anonymize(payload)},
+        ensure_ascii=False, separators=(",", ":")
+    ))
+
+
+class RecorderMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if _dir is not None:
+            try:
+                record(event)
+            except Exception as e:
+                print(f"⚠️ Recorder failed: {e}")
+        return await handler(event, data)
+
+
+def _open_file():
+    global _file, _file_lines
+    os.makedirs(_dir, exist_ok=True)
+    name = f"updates-{datetime.now():%Y%m%d-%H%M%S-%f}.jsonl.gz"
+    _file = gzip.open(os.path.join(_dir, name), "at", encoding="utf-8")
+    _file_lines = 0
+    recordings = sorted(f for f in os.listdir(_dir) if f.startswith("updates-"))
+    for old in recordings[:-KEEP_FILES]:
+        os.remove(os.path.join(_dir, old))
+
+
+def _write(lines: list[str]):
+    global _file_lines
+    for line in lines:
+        if _file is None or _file_lines >= ROTATE_LINES:
+            _close_file()
+            _open_file()
+        _file.write(line + "\n")
+        _file_lines += 1
+    _file.flush()
+
+
+def _close_file():
+    global _file
+    if _file is not None:
+        _file.close()
+        _file = None
+
+
+async def flush():
+    if not _buffer:
+        return
+    lines = _buffer[:]
+    _buffer.clear()
+    await asyncio.to_thread(_write, lines)
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await flush()
+        except Exception as e:
+            print(f"⚠️ Recorder flush failed: {e}")
+
+
+def start(directory: str):
+    global _dir, _started, _task
+    _dir = directory
+    _started = time.monotonic()
+    if _task is None:
+        _task = asyncio.create_task(_flush_loop())
+
+
+async def stop():
+    global _dir, _task
+    if _task:
+        _task.cancel()
+        _task = None
+    if _dir is not None:
+        await flush()
+        await asyncio.to_thread(_close_file)
+    _dir = None
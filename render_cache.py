@@ -0,0 +1,49 @@
+"""
+Render cache - prebuilt keyboards and card texts
+aiogram types are frozen pydantic models, so one instance can be shared
+between requests. Entries belong to a scope: a specialist id for that
+specialist's card and keyboards, or a shared part ("welcome",
+"specialists" for the lists, "slots"). Keys carry the scope's version;
+admin edit handlers call invalidate() with the scopes they changed, so a
+slot toggle does not rebuild specialist cards. Each tenant has its own
+cache. None is never cached, so lookups of ids that do not exist (e.g.
+from crafted callback data) cannot grow it.
+"""
+
+from typing import Any, Callable, Hashable
+
+import tenants
+
+# cache: (scope, version, key) -> value; versions: scope -> int
+_state = tenants.TenantLocal(cache=dict, versions=dict)
+
+
+def version(scope: Hashable) -> int:
+    return _state.versions.get(scope, 0)
+
+
+def get(scope: Hashable, key: Hashable, build: Callable[[], Any]) -> Any:
+    """Return cached value for key, building it once per scope version"""
+    cache = _state.cache
+    full_key = (scope, version(scope), key)
+    try:
+        return cache[full_key]
+    except KeyError:
+        value = build()
+        if value is not None:
+            cache[full_key] = value
+        return value
+
+
+def invalidate(*scopes: Hashable):
+    """Bump the versions of the changed scopes and drop their old entries;
+    without arguments drop everything (e.g. after a backup restore)"""
+    cache = _state.cache
+    if not scopes:
+        cache.clear()
+        return
+    versions = _state.versions
+    for scope in scopes:
+        versions[scope] = versions.get(scope, 0) + 1
+    for full_key in [k for k in cache if k[0] in scopes]:
+        del cache[full_key]
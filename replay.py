@@ -0,0 +1,209 @@
+"""
+Replay - прогон записанного трафика (recorder.py) для сравнения версий
+
+    python replay.py recordings/updates-*.jsonl.gz --speed 10 --out new.json
+    python replay.py --compare base.json new.json
+
+Updates are fed into a fresh Dispatcher built by bot.build_dispatcher()
+against a scratch copy of the database and a fake Bot API (optional
+per-call latency). Latency of an update is measured from its scheduled
+arrival to the end of its handling, so queueing is included. Results
+are grouped by update kind; --compare prints p50/p95 deltas between
+two runs, e.g. before and after a change on the same recording.
+"""
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Iterator
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update, User
+
+import database as db
+
+_message_ids = itertools.count(1_000_000)
+
+
+class FakeSession(BaseSession):
+    """Answers every Bot API call locally after `latency` seconds"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        args = getattr(returning, "__args__", None)
+        if returning is Message or (args and Message in args):
+            chat_id = getattr(method, "chat_id", None)
+            return Message(
+                message_id=next(_message_ids), date=datetime.now(),
+                chat=Chat(id=int(chat_id) if isinstance(chat_id, int) else 1, type="private"),
+                text=getattr(method, "text", None),
+            )
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="bot", username="bot")
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+
+def read_recording(paths: list[str]) -> Iterator[tuple[float, dict]]:
+    """(offset seconds, update dict); offsets continue across files"""
+    base = last = 0.0
+    for path in sorted(paths):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                t = row["t"] + base
+                if t < last:  # новый процесс - отсчёт начался заново
+                    base, t = last, last + row["t"]
+                last = t
+                yield t, row["update"]
+
+
+def kind(update: Update) -> str:
+    if update.callback_query:
+        data = update.callback_query.data or ""
+        if data.startswith("admin:"):
+            return "cb " + ":".join(data.split(":")[:2])
+        return "cb " + data.split("_", 1)[0]
+    if update.message:
+        text = update.message.text or ""
+        if text.startswith("/"):
+            return "msg " + text.split()[0]
+        return "msg photo" if update.message.photo else "msg text"
+    return update.event_type
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def replay(paths: list[str], speed: float, api_latency: float, source_db: str = None) -> dict:
+    scratch = tempfile.mkdtemp(prefix="replay-")
+    db.DB_PATH = os.path.join(scratch, "replay.db")
+    if source_db:
+        shutil.copy(source_db, db.DB_PATH)
+    db.init_db()
+    db.seed_default_data()
+
+    import bot as bot_module
+    session = FakeSession(api_latency)
+    bot = Bot("42:REPLAY", session=session)
+    dp = bot_module.build_dispatcher()
+
+    latencies: dict[str, list[float]] = {}
+    errors = 0
+
+    async def handle(update: Update, due: float):
+        nonlocal errors
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            errors += 1
+        latencies.setdefault(kind(update), []).append(time.perf_counter() - due)
+
+    tasks = []
+    started = time.perf_counter()
+    for offset, payload in read_recording(paths):
+        due = started + (offset / speed if speed else 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.model_validate(payload, context={"bot": bot})
+        tasks.append(asyncio.create_task(handle(update, max(due, started))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        "updates": len(tasks),
+        "errors": errors,
+        "api_calls": session.calls,
+        "elapsed": elapsed,
+        "speed": speed,
+        "latencies": latencies,
+    }
+
+
+def summary(result: dict) -> dict[str, dict]:
+    return {
+        name: {"n": len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+        for name, values in sorted(result["latencies"].items())
+    }
+
+
+def print_summary(result: dict):
+    print(f"📼 {result['updates']} updates in {result['elapsed']:.1f} s "
+          f"(speed ×{result['speed'] or '∞'}), {result['api_calls']} API calls, {result['errors']} errors")
+    print(f"{'kind':28} {'n':>6} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, s in summary(result).items():
+        print(f"{name:28} {s['n']:>6} {s['p50'] * 1000:>9.2f} {s['p95'] * 1000:>9.2f}")
+
+
+def compare(base: dict, new: dict):
+    before, after = summary(base), summary(new)
+    print(f"{'kind':28} {'n':>6} {'p50 base':>9} {'p50 new':>9} {'Δ':>7} {'p95 base':>9} {'p95 new':>9} {'Δ':>7}")
+
+    def delta(a: float, b: float) -> str:
+        return f"{(b - a) / a * 100:+.0f}%" if a else "—"
+
+    for name in sorted(set(before) | set(after)):
+        a = before.get(name, {"n": 0, "p50": 0.0, "p95": 0.0})
+        b = after.get(name, {"n": 0, "p50": 0.0, "p95": 0.0})
+        print(
+            f"{name:28} {b['n']:>6} "
+            f"{a['p50'] * 1000:>9.2f} {b['p50'] * 1000:>9.2f} {delta(a['p50'], b['p50']):>7} "
+            f"{a['p95'] * 1000:>9.2f} {b['p95'] * 1000:>9.2f} {delta(a['p95'], b['p95']):>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded updates")
+    parser.add_argument("recordings", nargs="*", help="updates-*.jsonl.gz files")
+    parser.add_argument("--speed", type=float, default=1.0, help="time acceleration, 0 = no pauses")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="fake Bot API latency, ms")
+    parser.add_argument("--db", help="database to copy as the starting state")
+    parser.add_argument("--out", help="save results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two saved results")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        compare(base, new)
+        return
+    if not args.recordings:
+        parser.error("no recordings given")
+
+    result = asyncio.run(replay(args.recordings, args.speed, args.api_latency / 1000, args.db))
+    print_summary(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
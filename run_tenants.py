@@ -0,0 +1,115 @@
+"""
+Multi-tenant runner - много ботов в одном процессе
+
+    python run_tenants.py tenants.json
+
+tenants.json is a list of businesses:
+
+    [{"name": "studio", "token": "123:ABC", "admins": [482323068],
+      "db": "tenants/studio/bot_data.db", "logo": "tenants/studio/logo.jpg"}]
+
+("db" and "logo" are optional.) All bots share one event loop, one
+Dispatcher with its routers, one HTTP connection pool and the update
+scheduler's processing slots. Each tenant keeps its own database, FSM
+sessions, caches, funnel metrics, notifications, broadcasts, waitlist,
+slot holds and backups: the tenant is activated per update by bot id, and its
+background services are started inside its own context.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+
+import backup
+import broadcast
+import database as db
+import funnel
+import health
+import holds
+import notifications
+import tenants
+import waitlist
+from bot import build_dispatcher
+from config import HEALTH_HOST, HEALTH_PORT, RECORD_UPDATES_DIR, STALL_THRESHOLD_MS
+from session_storage import PerBotStorage
+
+SPARE_CONNECTIONS = 100        # сверх одного long poll на бота - для ответов
+
+
+def _start_tenant(tenant: tenants.Tenant, bot: Bot) -> int:
+    """Runs inside the tenant's context; tasks created here keep it"""
+    os.makedirs(os.path.dirname(os.path.abspath(tenant.db_path)), exist_ok=True)
+    db.init_db()
+    db.seed_default_data()
+    funnel.start()
+    backup.start()
+    waitlist.start(bot)
+    holds.start()
+    return broadcast.resume_broadcasts(bot)
+
+
+async def _stop_tenant(bot: Bot):
+    backup.stop()
+    waitlist.stop()
+    holds.stop()
+    await notifications.stop(bot)
+    await funnel.stop()
+
+
+async def main(path: str):
+    started = time.perf_counter()
+    tenant_list = tenants.load(path)
+    if not tenant_list:
+        sys.exit(f"No tenants in {path}")
+
+    # Один пул соединений на всех: long poll держит по соединению на бота
+    session = AiohttpSession(limit=len(tenant_list) + SPARE_CONNECTIONS)
+    bots = [Bot(token=tenant.token, session=session) for tenant in tenant_list]
+    tenant_of_bot = {bot.id: tenant for bot, tenant in zip(bots, tenant_list)}
+    contexts = [tenants.context_for(tenant) for tenant in tenant_list]
+
+    storage = PerBotStorage(list(tenant_of_bot))
+    dp = build_dispatcher(storage, record=RECORD_UPDATES_DIR is not None, tenant_of_bot=tenant_of_bot)
+
+    resumed = 0
+    for tenant, bot, context in zip(tenant_list, bots, contexts):
+        resumed += context.run(_start_tenant, tenant, bot)
+    storage.start()
+    if RECORD_UPDATES_DIR:
+        import recorder
+        recorder.start(RECORD_UPDATES_DIR)
+    if HEALTH_PORT:
+        # Трекер getUpdates вешается на общую сессию - видит всех ботов
+        await health.start(bots[0], HEALTH_HOST, HEALTH_PORT)
+    else:
+        health.start_probe()
+    if STALL_THRESHOLD_MS:
+        import stalls
+        stalls.start(STALL_THRESHOLD_MS)
+
+    print(f"🚀 {len(tenant_list)} tenants started in {time.perf_counter() - started:.1f} s")
+    if resumed:
+        print(f"📣 Resumed broadcasts: {resumed}")
+    try:
+        await dp.start_polling(*bots)
+    finally:
+        await asyncio.gather(*(
+            asyncio.create_task(_stop_tenant(bot), context=context)
+            for bot, context in zip(bots, contexts)
+        ), return_exceptions=True)
+        if RECORD_UPDATES_DIR:
+            await recorder.stop()
+        await health.stop()
+        if STALL_THRESHOLD_MS:
+            stalls.stop()
+        await session.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python run_tenants.py tenants.json")
+    asyncio.run(main(sys.argv[1]))
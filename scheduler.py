@@ -0,0 +1,188 @@
+"""
+Scheduler - приоритетная обработка апдейтов
+Every update waits for a processing slot before reaching the routers.
+Free slots go to the highest-priority class first, each class has its
+own concurrency cap and queue limit, and updates that do not fit are
+shed instead of piling up. Queue waits are kept for /load.
+"""
+
+import time
+from asyncio import Future, get_running_loop
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+MAX_RUNNING = 32           # апдейтов в обработке одновременно
+WAIT_SAMPLES = 1000        # последних ожиданий на класс для перцентилей
+
+SHED_TEXT = "⏳ Сейчас много обращений, попробуйте через пару секунд"
+
+
+class _Class:
+    def __init__(self, name: str, title: str, limit: int,
+                 max_queue: Optional[int], max_wait: Optional[float]):
+        self.name = name
+        self.title = title
+        self.limit = limit              # одновременно в обработке
+        self.max_queue = max_queue      # None - не сбрасывать
+        self.max_wait = max_wait        # старше - устарело, сбрасываем
+        self.running = 0
+        self.queue: deque[Future] = deque()
+        self.waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.processed = 0
+        self.shed = 0
+
+
+# В порядке приоритета. Лимиты остальных классов в сумме меньше
+# MAX_RUNNING: BOOKING_RESERVED слотов всегда остаются завершению записи
+BOOKING_RESERVED = 8
+CLASSES = [
+    _Class("booking", "Завершение записи", MAX_RUNNING, None, None),
+    _Class("urgent", "Срочная запись", 8, 200, None),
+    _Class("admin", "Админка", 4, 100, None),
+    _Class("browsing", "Просмотр", 12, 500, 10.0),
+]
+assert sum(c.limit for c in CLASSES[1:]) <= MAX_RUNNING - BOOKING_RESERVED
+_by_name = {c.name: c for c in CLASSES}
+_running = 0
+
+
+def _dispatch():
+    """Hand free slots to waiters, highest priority first"""
+    global _running
+    for cls in CLASSES:
+        while cls.queue and _running < MAX_RUNNING and cls.running < cls.limit:
+            waiter = cls.queue.popleft()
+            if waiter.done():  # ожидавший отменён
+                continue
+            cls.running += 1
+            _running += 1
+            waiter.set_result(None)
+
+
+async def _acquire(cls: _Class) -> bool:
+    """Wait for a slot; False if the update was shed"""
+    global _running
+    started = time.monotonic()
+    if not cls.queue and _running < MAX_RUNNING and cls.running < cls.limit:
+        cls.running += 1
+        _running += 1
+        cls.waits.append(0.0)
+        return True
+
+    if cls.max_queue is not None and len(cls.queue) >= cls.max_queue:
+        cls.shed += 1
+        return False
+
+    waiter = get_running_loop().create_future()
+    cls.queue.append(waiter)
+    try:
+        await waiter
+    except BaseException:
+        if waiter.done() and not waiter.cancelled():
+            _release(cls)  # слот уже выдан
+        raise
+
+    waited = time.monotonic() - started
+    cls.waits.append(waited)
+    if cls.max_wait is not None and waited > cls.max_wait:
+        _release(cls)
+        cls.shed += 1
+        return False
+    return True
+
+
+def _release(cls: _Class):
+    global _running
+    cls.running -= 1
+    _running -= 1
+    _dispatch()
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """Outer update middleware; register after the Dispatcher's FSM
+    middleware so that raw_state is known"""
+
+    def __init__(self, booking_states: set[str], is_admin: Callable[[int], bool]):
+        self.booking_states = booking_states
+        self.is_admin = is_admin
+
+    def classify(self, update: Update, data: dict[str, Any]) -> str:
+        user = data.get("event_from_user")
+        if user and self.is_admin(user.id):
+            return "admin"
+        if data.get("raw_state") in self.booking_states:
+            return "booking"
+        if update.callback_query and update.callback_query.data:
+            if update.callback_query.data.startswith("slot_"):
+                return "booking"
+            if update.callback_query.data.startswith("urgent_"):
+                return "urgent"
+        return "browsing"
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        cls = _by_name[self.classify(event, data)]
+        if not await _acquire(cls):
+            if event.callback_query:
+                try:
+                    await event.callback_query.answer(SHED_TEXT)
+                except Exception:
+                    pass
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            cls.processed += 1
+            _release(cls)
+
+
+# ═══════════════════════════════════════════════════════════
+# Metrics
+# ═══════════════════════════════════════════════════════════
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def stats() -> list[dict]:
+    return [
+        {
+            'name': c.name,
+            'title': c.title,
+            'running': c.running,
+            'queued': len(c.queue),
+            'processed': c.processed,
+            'shed': c.shed,
+            'wait_p50': _percentile(list(c.waits), 0.5),
+            'wait_p95': _percentile(list(c.waits), 0.95),
+            'wait_max': max(c.waits, default=0.0),
+        }
+        for c in CLASSES
+    ]
+
+
+def format_stats() -> str:
+    lines = [
+        "⚙️ <b>НАГРУЗКА</b>",
+        "━━━━━━━━━━━━━━━━━━━━",
+        f"В обработке: <b>{_running}/{MAX_RUNNING}</b>",
+        "",
+    ]
+    for s in stats():
+        lines.append(
+            f"<b>{s['title']}</b>: {s['running']} в работе, {s['queued']} в очереди\n"
+            f"   ✅ {s['processed']} · 🗑 {s['shed']} · "
+            f"ожидание p50 {s['wait_p50'] * 1000:.0f} / p95 {s['wait_p95'] * 1000:.0f} / "
+            f"max {s['wait_max'] * 1000:.0f} мс"
+        )
+    return "\n".join(lines)
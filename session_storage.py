@@ -0,0 +1,168 @@
+"""
+Session storage - FSM-сессии в памяти с ограничением
+Drop-in replacement for MemoryStorage: sessions idle longer than the TTL
+are swept in the background, the total count is capped (least recently
+used goes first), and reading a user who has no session stores nothing.
+PerBotStorage keeps one such storage per bot for multi-tenant mode.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseStorage, StateType, StorageKey
+
+SESSION_TTL = 24 * 3600        # секунд без активности до удаления
+MAX_SESSIONS = 100_000         # сверх этого вытесняются самые старые
+SWEEP_INTERVAL = 60            # секунд между чистками
+
+
+class _Session:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, touched: float):
+        self.state: Optional[str] = None
+        self.data: Optional[dict] = None   # None вместо пустого dict
+        self.touched = touched
+
+
+def _compact(key: StorageKey) -> Hashable:
+    if key.thread_id is None and key.business_connection_id is None and key.destiny == DEFAULT_DESTINY:
+        return key.bot_id, key.chat_id, key.user_id
+    return key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+
+
+class BoundedMemoryStorage(BaseStorage):
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        # Порядок = порядок последнего обращения, старые в начале
+        self._sessions: OrderedDict[Hashable, _Session] = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.evicted = 0
+
+    def _get(self, key: StorageKey) -> Optional[_Session]:
+        session = self._sessions.get(_compact(key))
+        if session is None:
+            return None
+        if time.monotonic() - session.touched > self.ttl:
+            del self._sessions[_compact(key)]
+            self.expired += 1
+            return None
+        return session
+
+    def _touch(self, key: StorageKey) -> _Session:
+        compact = _compact(key)
+        now = time.monotonic()
+        session = self._sessions.get(compact)
+        if session is None:
+            session = self._sessions[compact] = _Session(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        else:
+            session.touched = now
+            self._sessions.move_to_end(compact)
+        return session
+
+    def _drop_if_empty(self, key: StorageKey, session: _Session):
+        if session.state is None and not session.data:
+            self._sessions.pop(_compact(key), None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None and self._get(key) is None:
+            return
+        session = self._touch(key)
+        session.state = state
+        self._drop_if_empty(key, session)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        session = self._get(key)
+        return session.state if session else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        if not data and self._get(key) is None:
+            return
+        session = self._touch(key)
+        session.data = data.copy() if data else None
+        self._drop_if_empty(key, session)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        session = self._get(key)
+        return session.data.copy() if session and session.data else {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # ═══════════════════════════════════════════════════════════
+    # Background sweep
+    # ═══════════════════════════════════════════════════════════
+
+    def sweep(self) -> int:
+        """Remove expired sessions; they are all at the front of the LRU order"""
+        deadline = time.monotonic() - self.ttl
+        removed = 0
+        while self._sessions:
+            compact, session = next(iter(self._sessions.items()))
+            if session.touched > deadline:
+                break
+            del self._sessions[compact]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._sessions.clear()
+
+
+class PerBotStorage(BaseStorage):
+    """One BoundedMemoryStorage per bot (multi-tenant mode): TTL and the
+    session cap apply to each tenant separately"""
+
+    def __init__(self, bot_ids: list[int], **options):
+        self.storages = {bot_id: BoundedMemoryStorage(**options) for bot_id in bot_ids}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storages[key.bot_id].set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.storages[key.bot_id].get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.storages[key.bot_id].set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return await self.storages[key.bot_id].get_data(key)
+
+    def __len__(self) -> int:
+        return sum(len(storage) for storage in self.storages.values())
+
+    def start(self):
+        for storage in self.storages.values():
+            storage.start()
+
+    async def close(self) -> None:
+        for storage in self.storages.values():
+            await storage.close()
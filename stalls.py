@@ -0,0 +1,196 @@
+"""
+Stalls - поиск блокирующих вызовов в event loop
+Opt-in (config.STALL_THRESHOLD_MS). A task on the loop refreshes a
+heartbeat; a watchdog thread checks it every SAMPLE_INTERVAL and, while
+the heartbeat is older than the threshold, samples the loop thread's
+stack. Samples are attributed to the chain of project functions on the
+stack (e.g. database.get_stats ← admin.admin_main_keyboard) plus the
+innermost library call, and aggregated for the /stalls report.
+Outside a stall the thread only compares two floats.
+"""
+
+import asyncio
+import html
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+BEAT_INTERVAL = 0.01
+SAMPLE_INTERVAL = 0.005
+MAX_CHAIN = 3              # функций проекта в подписи места
+RECENT_STALLS = 20
+
+_SELF = os.path.abspath(__file__)
+_PROJECT_DIR = os.path.dirname(_SELF)
+
+_threshold = 0.0
+_beat = 0.0
+_loop_thread: Optional[int] = None
+_beat_task: Optional[asyncio.Task] = None
+_watchdog: Optional[threading.Thread] = None
+_stopping = threading.Event()
+_lock = threading.Lock()
+
+
+class Site:
+    __slots__ = ("samples", "stalls", "max_stall")
+
+    def __init__(self):
+        self.samples = 0       # сколько раз встречено в стеке во время зависаний
+        self.stalls = 0        # в скольких зависаниях
+        self.max_stall = 0.0
+
+
+_sites: dict[tuple[str, str], Site] = {}
+_recent: deque[tuple[float, float, tuple[str, str]]] = deque(maxlen=RECENT_STALLS)
+_total_stalls = 0
+_total_stalled = 0.0
+
+
+# ═══════════════════════════════════════════════════════════
+# Sampling
+# ═══════════════════════════════════════════════════════════
+
+def frame_name(frame) -> str:
+    filename = frame.f_code.co_filename
+    if filename.startswith("<frozen "):  # <frozen genericpath> -> genericpath
+        module = filename[8:-1]
+    else:
+        module = os.path.splitext(os.path.basename(filename))[0]
+    return f"{module}.{frame.f_code.co_qualname}"
+
+
+def _is_project(filename: str) -> bool:
+    return filename.startswith(_PROJECT_DIR) and filename != _SELF and "site-packages" not in filename
+
+
+def _attribute(frame) -> tuple[str, str]:
+    """(project chain innermost first, innermost non-project call)"""
+    chain, leaf = [], ""
+    while frame is not None:
+        if _is_project(frame.f_code.co_filename):
+            if len(chain) < MAX_CHAIN:
+                chain.append(frame_name(frame))
+        elif not chain and not leaf:
+            leaf = frame_name(frame)
+        frame = frame.f_back
+    return " ← ".join(chain) or "?", leaf
+
+
+def _finish_stall(started: float, ended: float, seen: dict[tuple[str, str], int]):
+    global _total_stalls, _total_stalled
+    duration = ended - started
+    with _lock:
+        _total_stalls += 1
+        _total_stalled += duration
+        for key in seen:
+            site = _sites.setdefault(key, Site())
+            site.samples += seen[key]
+            site.stalls += 1
+            site.max_stall = max(site.max_stall, duration)
+        top = max(seen, key=seen.get) if seen else ("?", "")
+        _recent.append((time.time(), duration, top))
+
+
+def _watch():
+    stall_start: Optional[float] = None
+    seen: dict[tuple[str, str], int] = {}
+    while not _stopping.wait(SAMPLE_INTERVAL):
+        beat = _beat
+        if time.monotonic() - beat > _threshold:
+            if stall_start is None:
+                stall_start, seen = beat, {}
+            frame = sys._current_frames().get(_loop_thread)
+            if frame is not None:
+                key = _attribute(frame)
+                seen[key] = seen.get(key, 0) + 1
+            del frame
+        elif stall_start is not None and beat > stall_start:
+            _finish_stall(stall_start, beat, seen)
+            stall_start = None
+
+
+async def _beat_loop():
+    global _beat
+    while True:
+        _beat = time.monotonic()
+        await asyncio.sleep(BEAT_INTERVAL)
+
+
+def start(threshold_ms: float):
+    global _threshold, _beat, _loop_thread, _beat_task, _watchdog
+    _threshold = threshold_ms / 1000
+    _beat = time.monotonic()
+    _loop_thread = threading.get_ident()
+    _stopping.clear()
+    if _beat_task is None:
+        _beat_task = asyncio.create_task(_beat_loop())
+    if _watchdog is None:
+        _watchdog = threading.Thread(target=_watch, name="stall-watchdog", daemon=True)
+        _watchdog.start()
+
+
+def stop():
+    global _beat_task, _watchdog
+    _stopping.set()
+    if _beat_task:
+        _beat_task.cancel()
+        _beat_task = None
+    if _watchdog:
+        _watchdog.join(timeout=1)
+        _watchdog = None
+
+
+def enabled() -> bool:
+    return _watchdog is not None
+
+
+def reset():
+    global _total_stalls, _total_stalled
+    with _lock:
+        _sites.clear()
+        _recent.clear()
+        _total_stalls = 0
+        _total_stalled = 0.0
+
+
+# ═══════════════════════════════════════════════════════════
+# Report
+# ═══════════════════════════════════════════════════════════
+
+def top_sites(limit: int = 10) -> list[tuple[tuple[str, str], Site]]:
+    with _lock:
+        return sorted(_sites.items(), key=lambda item: item[1].samples, reverse=True)[:limit]
+
+
+def format_report(limit: int = 10) -> str:
+    if not enabled():
+        return "🐢 Детектор зависаний выключен (config.STALL_THRESHOLD_MS)"
+    lines = [
+        "🐢 <b>ЗАВИСАНИЯ ЦИКЛА</b>",
+        "━━━━━━━━━━━━━━━━━━━━",
+        f"Порог: {_threshold * 1000:.0f} мс · зависаний: <b>{_total_stalls}</b> · "
+        f"всего {_total_stalled:.1f} с",
+    ]
+    sites = top_sites(limit)
+    if not sites:
+        lines.append("\nНичего не найдено 👍")
+        return "\n".join(lines)
+    lines.append("")
+    for (chain, leaf), site in sites:
+        lines.append(
+            f"<code>{html.escape(chain)}</code>" + (f"\n   ↳ <code>{html.escape(leaf)}</code>" if leaf else "") +
+            f"\n   ⏱ ~{site.samples * SAMPLE_INTERVAL * 1000:.0f} мс в {site.stalls} завис., "
+            f"макс {site.max_stall * 1000:.0f} мс"
+        )
+    with _lock:
+        recent = list(_recent)[-5:]
+    if recent:
+        lines.append("\n<b>Последние:</b>")
+        for moment, duration, (chain, _) in reversed(recent):
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(moment))} · "
+                         f"{duration * 1000:.0f} мс · <code>{html.escape(chain.split(' ← ')[0])}</code>")
+    return "\n".join(lines)
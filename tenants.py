@@ -0,0 +1,129 @@
+"""
+Tenants - несколько ботов (клиентов) в одном процессе
+A tenant is one business: its own token, admins, database and logo.
+The current tenant lives in a ContextVar: run_tenants.py sets it per
+update from the receiving bot's id, and each tenant's background
+services are started in a context where it is set, so every task they
+create inherits it. Without multi-tenant mode nothing is set and the
+single-bot values from config.py apply.
+
+Module state that must not leak between tenants (caches, buffers,
+background tasks) is kept in a TenantLocal instead of plain globals.
+"""
+
+import contextvars
+import json
+import os
+from typing import Any, Awaitable, Callable, Collection, NamedTuple, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import ADMIN_IDS
+
+
+class Tenant(NamedTuple):
+    name: str
+    token: str
+    admin_ids: frozenset[int]
+    db_path: str
+    logo_path: str
+
+
+_current: contextvars.ContextVar[Optional[Tenant]] = contextvars.ContextVar("tenant", default=None)
+
+
+def current() -> Optional[Tenant]:
+    return _current.get()
+
+
+def activate(tenant: Tenant):
+    """Make `tenant` current for this context and tasks created from it"""
+    _current.set(tenant)
+
+
+def context_for(tenant: Tenant) -> contextvars.Context:
+    """Context to run a tenant's code in: ctx.run(fn) or create_task(..., context=ctx)"""
+    context = contextvars.copy_context()
+    context.run(activate, tenant)
+    return context
+
+
+def admin_ids() -> Collection[int]:
+    tenant = _current.get()
+    return tenant.admin_ids if tenant else ADMIN_IDS
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in admin_ids()
+
+
+def load(path: str) -> list[Tenant]:
+    """JSON list of {"name", "token", "admins", "db"?, "logo"?};
+    db and logo default to tenants/<name>/bot_data.db and logo.jpg"""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    result, names = [], set()
+    for entry in entries:
+        name = entry["name"]
+        if name in names:
+            raise ValueError(f"duplicate tenant name: {name}")
+        names.add(name)
+        home = os.path.join(os.path.dirname(os.path.abspath(path)), "tenants", name)
+        result.append(Tenant(
+            name=name,
+            token=entry["token"],
+            admin_ids=frozenset(entry.get("admins", [])),
+            db_path=entry.get("db") or os.path.join(home, "bot_data.db"),
+            logo_path=entry.get("logo") or os.path.join(home, "logo.jpg"),
+        ))
+    return result
+
+
+class TenantMiddleware(BaseMiddleware):
+    """First outer middleware: activates the tenant of the receiving bot"""
+
+    def __init__(self, by_bot_id: dict[int, Tenant]):
+        self.by_bot_id = by_bot_id
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        activate(self.by_bot_id[data["bot"].id])
+        return await handler(event, data)
+
+
+# ═══════════════════════════════════════════════════════════
+# Per-tenant module state
+# ═══════════════════════════════════════════════════════════
+
+class TenantLocal:
+    """Like threading.local, but one namespace per tenant: attributes
+    resolve in the namespace of the current tenant, created on first use
+    from the factories (TenantLocal(cache=dict, version=int))"""
+
+    def __init__(self, **factories: Callable[[], Any]):
+        object.__setattr__(self, "_factories", factories)
+        object.__setattr__(self, "_spaces", {})
+
+    def _space(self) -> dict[str, Any]:
+        tenant = _current.get()
+        key = tenant.name if tenant else None
+        space = self._spaces.get(key)
+        if space is None:
+            space = self._spaces[key] = {name: make() for name, make in self._factories.items()}
+        return space
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._space()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: Any):
+        if name not in self._factories:
+            raise AttributeError(name)
+        self._space()[name] = value
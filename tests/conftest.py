@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import availability
+import database as db
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Empty database with the default specialists"""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bot_data.db"))
+    db.init_db()
+    db.seed_default_data()
+    availability.invalidate()
+    yield db
+    availability.invalidate()
+
+
+@pytest.fixture(scope="session")
+def dispatcher():
+    """The bot's dispatcher; its routers can be attached only once"""
+    import bot
+    return bot.build_dispatcher()
@@ -0,0 +1,61 @@
+"""
+Fake Telegram API session and update builders for feeding the real
+dispatcher in tests
+"""
+
+import asyncio
+import itertools
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+_ids = itertools.count(1000)
+_update_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    """Records API calls; sendMessage returns a Message, the rest True"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.sent.append(method)
+        await asyncio.sleep(0)  # даём другим апдейтам вклиниться
+        if isinstance(method, SendMessage):
+            return Message(message_id=next(_ids), date=datetime.now(),
+                           chat=Chat(id=int(method.chat_id), type="private"), text=method.text)
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name="U", username=f"u{user_id}")
+
+
+def _message(user_id: int, text: str, message_id: int = None) -> Message:
+    return Message(message_id=message_id or next(_ids), date=datetime.now(),
+                   chat=Chat(id=user_id, type="private"), from_user=_user(user_id), text=text)
+
+
+def message_update(user_id: int, text: str, message_id: int = None) -> Update:
+    return Update(update_id=next(_update_ids), message=_message(user_id, text, message_id))
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    return Update(update_id=next(_update_ids), callback_query=CallbackQuery(
+        id=str(next(_ids)), chat_instance="c", data=data, from_user=_user(user_id),
+        message=Message(message_id=next(_ids), date=datetime.now(),
+                        chat=Chat(id=user_id, type="private"), text="x")))
+
+
+def next_id() -> int:
+    return next(_ids)
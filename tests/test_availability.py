@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import availability
+
+
+def _tomorrow() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+def _times(day: datetime) -> list[str]:
+    return [time for _, time in availability.free_slots("anna", day)]
+
+
+def _set_session(db, minutes: int):
+    db.set_session_minutes("anna", minutes)
+    availability.invalidate_schedule()
+
+
+def test_busy_span_is_the_stored_one(fresh_db):
+    day = _tomorrow()
+    date = day.strftime("%Y-%m-%d")
+    _set_session(fresh_db, 90)
+    assert fresh_db.create_booking("anna", date, "12:00", "A", "+71", "a", 1)
+
+    # Сеанс стал короче, но запись по-прежнему длится до 13:30
+    _set_session(fresh_db, 60)
+    times = _times(day)
+    assert "11:00" in times and "13:30" in times
+    assert "13:00" not in times and not availability.is_free("anna", date, "13:00")
+    assert fresh_db.create_booking("anna", date, "13:00", "B", "+72", "b", 2) is None
+    assert fresh_db.create_booking("anna", date, "13:30", "B", "+72", "b", 2)
+
+
+def test_longer_session_does_not_hide_free_time(fresh_db):
+    day = _tomorrow()
+    date = day.strftime("%Y-%m-%d")
+    assert fresh_db.create_booking("anna", date, "12:00", "A", "+71", "a", 1)
+
+    # Сеанс стал длиннее: существующая запись всё равно кончается в 13:00
+    _set_session(fresh_db, 90)
+    assert "13:00" in _times(day)
+    assert availability.is_free("anna", date, "13:00")
+    assert fresh_db.create_booking("anna", date, "13:00", "B", "+72", "b", 2)
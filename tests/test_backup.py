@@ -0,0 +1,56 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+import availability
+import backup
+import holds
+import tenants
+import waitlist
+from fake_telegram import FakeSession, callback_update
+
+
+def test_restore_reloads_holds_and_offer_timers(fresh_db, dispatcher, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    # Слоты не сегодня - предложению хватит времени до начала
+    held, offered, other = [slot for _, slots in availability.calendar("anna")[1:] for slot in slots][:3]
+    session = FakeSession()
+
+    async def run():
+        bot = Bot("42:TEST", session=session)
+        holds.start()
+        waitlist.start(bot)
+        try:
+            assert holds.acquire(1, "anna", *held)
+            booking_id = fresh_db.create_booking("anna", *offered, "A", "+71", "a", 9)
+            entry_id = fresh_db.join_waitlist("anna", *offered, "W", "+73", "w", 3)
+            fresh_db.cancel_booking(booking_id)
+            await asyncio.sleep(0.1)
+            assert entry_id in waitlist._state.timers
+
+            snapshot = await backup.create_backup()
+
+            # После снимка: удержание перешло, предложение отклонено
+            holds.release(1)
+            assert holds.acquire(2, "anna", *other)
+            fresh_db.leave_waitlist(entry_id, 3)
+            waitlist.closed(entry_id)
+            await asyncio.sleep(0.1)
+
+            admin_id = tenants.admin_ids()[0]
+            await dispatcher.feed_update(bot, callback_update(admin_id, f"admin:backup:restore_ok:{snapshot['name']}"))
+
+            hold = holds.held_by(1)
+            assert hold and hold[1:4] == ("anna", *held)
+            assert holds.held_by(2) is None
+            assert holds.acquire(2, "anna", *other)
+            assert not holds.acquire(2, "anna", *held)
+            assert list(waitlist._state.timers) == [entry_id]
+            assert not availability.is_free("anna", *offered)
+        finally:
+            holds.stop()
+            waitlist.stop()
+
+    asyncio.run(run())
+    assert any(isinstance(m, SendMessage) and m.text == "✅ База восстановлена" for m in session.sent)
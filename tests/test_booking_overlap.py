@@ -0,0 +1,64 @@
+DAY = "2030-01-15"
+
+
+def test_overlapping_session_is_rejected(fresh_db):
+    fresh_db.set_session_minutes("anna", 90)
+    assert fresh_db.create_booking("anna", DAY, "12:00", "A", "+71", "a", 1)
+    assert fresh_db.create_booking("anna", DAY, "13:00", "B", "+72", "b", 2) is None
+    assert fresh_db.create_booking("anna", DAY, "11:00", "B", "+72", "b", 2) is None
+    assert fresh_db.create_booking("anna", DAY, "13:30", "B", "+72", "b", 2)
+    assert fresh_db.create_booking("maria", DAY, "12:30", "C", "+73", "c", 3)
+
+
+def test_cancelled_session_does_not_block(fresh_db):
+    booking_id = fresh_db.create_booking("anna", DAY, "12:00", "A", "+71", "a", 1)
+    fresh_db.cancel_booking(booking_id)
+    assert fresh_db.create_booking("anna", DAY, "12:30", "B", "+72", "b", 2)
+
+
+def test_series_skips_overlapping_dates(fresh_db):
+    booking_id = fresh_db.create_booking("anna", "2030-01-08", "12:00", "A", "+71", "a", 1)
+    fresh_db.create_booking("anna", "2030-01-15", "12:30", "B", "+72", "b", 2)
+    series_id, booked = fresh_db.create_booking_series(booking_id, ["2030-01-15", "2030-01-22"], 7)
+    assert series_id and booked == ["2030-01-22"]
+    assert fresh_db.create_booking_series(booking_id, ["2030-01-15"], 7) == (None, [])
+
+
+def test_waitlist_offer_blocks_overlapping_session(fresh_db):
+    fresh_db.set_session_minutes("anna", 90)
+    booking_id = fresh_db.create_booking("anna", DAY, "12:00", "A", "+71", "a", 1)
+    fresh_db.join_waitlist("anna", DAY, "12:00", "W", "+72", "w", 2)
+    fresh_db.cancel_booking(booking_id)
+    assert fresh_db.offer_waitlist_slot("anna", DAY, "12:00", 2**31)["client_user_id"] == 2
+
+    assert fresh_db.create_booking("anna", DAY, "12:30", "B", "+73", "b", 3) is None
+    assert fresh_db.create_booking("anna", DAY, "11:00", "B", "+73", "b", 3) is None
+    assert fresh_db.create_booking("anna", DAY, "13:30", "B", "+73", "b", 3)
+    # Клиент с предложением записывается сам
+    assert fresh_db.create_booking("anna", DAY, "12:00", "W", "+72", "w", 2)
+
+
+def test_offer_needs_free_interval(fresh_db):
+    fresh_db.set_session_minutes("anna", 90)
+    fresh_db.join_waitlist("anna", DAY, "12:00", "W", "+72", "w", 2)
+    fresh_db.create_booking("anna", DAY, "12:30", "B", "+73", "b", 3)
+    assert fresh_db.offer_waitlist_slot("anna", DAY, "12:00", 2**31) is None
+
+
+def test_slot_hold_blocks_overlapping_session(fresh_db):
+    import time
+    until = int(time.time()) + 300
+    assert fresh_db.hold_slot("anna", DAY, "10:00", 1, until)
+    assert fresh_db.create_booking("anna", DAY, "10:30", "B", "+72", "b", 2) is None
+    assert not fresh_db.hold_slot("anna", DAY, "10:30", 2, until)
+    assert not fresh_db.hold_slot("anna", DAY, "10:00", 2, until)
+    # Держатель записывается сам; соседний час свободен
+    assert fresh_db.create_booking("anna", DAY, "11:00", "B", "+72", "b", 2)
+    assert fresh_db.create_booking("anna", DAY, "10:00", "A", "+71", "a", 1)
+
+
+def test_expired_hold_does_not_block(fresh_db):
+    import time
+    assert fresh_db.hold_slot("anna", DAY, "10:00", 1, int(time.time()) - 1)
+    assert fresh_db.hold_slot("anna", DAY, "10:00", 2, int(time.time()) + 300)
+    assert fresh_db.get_slot_holds()[0][3] == 2
@@ -0,0 +1,17 @@
+import time
+from datetime import datetime, timedelta
+
+
+def test_sessions_started_today_are_not_upcoming(fresh_db):
+    today = datetime.now()
+    tomorrow = (today + timedelta(days=1)).strftime("%Y-%m-%d")
+    fresh_db.create_booking("anna", today.strftime("%Y-%m-%d"), "00:00", "A", "+71", "a", 1)
+    upcoming = fresh_db.create_booking("anna", tomorrow, "10:00", "A", "+71", "a", 1)
+    assert [b.id for b in fresh_db.get_client_bookings(1, int(time.time()))] == [upcoming]
+
+
+def test_ordered_by_start(fresh_db):
+    day = (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d")
+    late = fresh_db.create_booking("anna", day, "15:00", "A", "+71", "a", 1)
+    early = fresh_db.create_booking("maria", day, "09:00", "A", "+71", "a", 1)
+    assert [b.id for b in fresh_db.get_client_bookings(1, int(time.time()))] == [early, late]
@@ -0,0 +1,60 @@
+import asyncio
+
+import holds
+
+DAY = "2030-01-15"
+
+
+def test_sweeper_expires_hold(fresh_db, monkeypatch):
+    monkeypatch.setattr(holds, "HOLD_SECONDS", 1)
+
+    async def run():
+        holds.start()
+        try:
+            assert holds.acquire(1, "anna", DAY, "10:00")
+            assert not holds.acquire(2, "anna", DAY, "10:00")
+            assert fresh_db.create_booking("anna", DAY, "10:30", "B", "+72", "b", 2) is None
+
+            await asyncio.sleep(2.1)
+            assert holds.held_by(1) is None
+            assert fresh_db.get_slot_holds() == []
+            assert holds.acquire(2, "anna", DAY, "10:00")
+        finally:
+            holds.stop()
+
+    asyncio.run(run())
+
+
+def test_holds_survive_restart(fresh_db):
+    async def run():
+        holds.start()
+        assert holds.acquire(1, "anna", DAY, "10:00")
+        holds.stop()
+        assert holds.held_by(1) is None
+
+        holds.start()
+        try:
+            hold = holds.held_by(1)
+            assert hold and hold[1:4] == ("anna", DAY, "10:00")
+            assert not holds.acquire(2, "anna", DAY, "10:00")
+            holds.release(1)
+            assert fresh_db.get_slot_holds() == []
+            assert holds.acquire(2, "anna", DAY, "10:00")
+        finally:
+            holds.stop()
+
+    asyncio.run(run())
+
+
+def test_new_pick_replaces_previous_hold(fresh_db):
+    async def run():
+        holds.start()
+        try:
+            assert holds.acquire(1, "anna", DAY, "10:00")
+            assert holds.acquire(1, "anna", DAY, "12:00")
+            assert [row[2] for row in fresh_db.get_slot_holds()] == ["12:00"]
+            assert holds.acquire(2, "anna", DAY, "10:00")
+        finally:
+            holds.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+"""
+Replayed and concurrent phone submissions through the real dispatcher:
+Telegram re-delivers updates and users double-tap, yet every client
+must end up with exactly one booking and admins with one notification.
+"""
+
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+import availability
+import notifications
+import tenants
+from fake_telegram import FakeSession, callback_update, message_update, next_id
+
+
+def test_duplicate_and_concurrent_phone_updates(fresh_db, dispatcher):
+    notifications.set_window(0)
+    users = range(1, 21)
+    slots = [slot for _, day_slots in availability.calendar("anna") for slot in day_slots][:len(users)]
+    session = FakeSession()
+
+    async def run():
+        bot = Bot("42:TEST", session=session)
+        for user_id, (date, time) in zip(users, slots):
+            slot = f"slot_{date.replace('-', '')}_{time.replace(':', '-')}_anna"
+            await dispatcher.feed_update(bot, callback_update(user_id, slot))
+            await dispatcher.feed_update(bot, message_update(user_id, f"Клиент {user_id}"))
+
+        updates = []
+        for user_id in users:
+            phone = f"+7 900 000-00-{user_id:02d}"
+            replayed = next_id()
+            # Повторная доставка одного сообщения и несколько разных нажатий
+            updates += [message_update(user_id, phone, replayed) for _ in range(5)]
+            updates += [message_update(user_id, phone) for _ in range(3)]
+        await asyncio.gather(*(dispatcher.feed_update(bot, update) for update in updates))
+
+    asyncio.run(run())
+
+    with fresh_db.get_db() as conn:
+        per_user = dict(conn.execute(
+            "SELECT client_user_id, COUNT(*) FROM bookings GROUP BY client_user_id"
+        ).fetchall())
+    assert per_user == {user_id: 1 for user_id in users}
+
+    notices = [m for m in session.sent
+               if isinstance(m, SendMessage) and "Новая сессия #" in m.text]
+    for admin_id in tenants.admin_ids():
+        assert sum(m.chat_id == admin_id for m in notices) == len(users)
+    # Подтверждение уходит фото с логотипом или текстом
+    confirmations = [m for m in session.sent
+                     if "Сессия забронирована" in (getattr(m, "text", None) or getattr(m, "caption", None) or "")]
+    assert sorted(m.chat_id for m in confirmations) == list(users)
+    # Дубликат под блокировкой видит очищенное состояние и молчит
+    assert not [m for m in session.sent
+                if isinstance(m, SendMessage) and "только что заняли" in m.text]
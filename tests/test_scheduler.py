@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import scheduler
+
+
+@pytest.fixture
+def classes():
+    """Scheduler classes by name; checks every slot was given back"""
+    yield {c.name: c for c in scheduler.CLASSES}
+    assert scheduler._running == 0
+    assert all(c.running == 0 and not c.queue for c in scheduler.CLASSES)
+
+
+async def _fill(cls) -> int:
+    """Take every slot the class may hold"""
+    for _ in range(cls.limit):
+        assert await scheduler._acquire(cls)
+    return cls.limit
+
+
+def _release(cls, count: int):
+    for _ in range(count):
+        scheduler._release(cls)
+
+
+def test_booking_has_reserved_slots(classes):
+    others = [classes[name] for name in ("urgent", "admin", "browsing")]
+    booking = classes["booking"]
+
+    async def run():
+        taken = [await _fill(cls) for cls in others]
+        # Остальные классы упёрлись в свои лимиты и ждут в очереди
+        waiting = asyncio.ensure_future(scheduler._acquire(classes["browsing"]))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        for _ in range(scheduler.BOOKING_RESERVED):
+            assert await asyncio.wait_for(scheduler._acquire(booking), 0.1)
+        _release(booking, scheduler.BOOKING_RESERVED)
+
+        _release(classes["browsing"], 1)
+        assert await waiting
+        for cls, count in zip(others, taken):
+            _release(cls, count)
+
+    asyncio.run(run())
+
+
+def test_freed_slot_goes_to_higher_priority(classes, monkeypatch):
+    monkeypatch.setattr(scheduler, "MAX_RUNNING", 1)
+    browsing, booking = classes["browsing"], classes["booking"]
+
+    async def run():
+        assert await scheduler._acquire(browsing)
+        late_browsing = asyncio.ensure_future(scheduler._acquire(browsing))
+        await asyncio.sleep(0)
+        late_booking = asyncio.ensure_future(scheduler._acquire(booking))
+        await asyncio.sleep(0)
+
+        _release(browsing, 1)
+        assert await late_booking and not late_browsing.done()
+        _release(booking, 1)
+        assert await late_browsing
+        _release(browsing, 1)
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_shed(classes, monkeypatch):
+    browsing = classes["browsing"]
+    monkeypatch.setattr(browsing, "max_queue", 2)
+    shed = browsing.shed
+
+    async def run():
+        taken = await _fill(browsing)
+        queued = [asyncio.ensure_future(scheduler._acquire(browsing)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert not await scheduler._acquire(browsing)
+        assert browsing.shed == shed + 1
+
+        _release(browsing, 2)
+        assert await asyncio.gather(*queued) == [True, True]
+        _release(browsing, taken)
+
+    asyncio.run(run())
+
+
+def test_stale_update_is_shed_after_waiting(classes, monkeypatch):
+    browsing = classes["browsing"]
+    monkeypatch.setattr(browsing, "max_wait", 0.05)
+    shed = browsing.shed
+
+    async def run():
+        taken = await _fill(browsing)
+        waiting = asyncio.ensure_future(scheduler._acquire(browsing))
+        await asyncio.sleep(0.1)
+        _release(browsing, 1)
+        # Дождался слота слишком поздно - сброшен, слот возвращён
+        assert not await waiting
+        assert browsing.shed == shed + 1
+        assert browsing.running == taken - 1
+        _release(browsing, taken - 1)
+
+    asyncio.run(run())
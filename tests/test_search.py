@@ -0,0 +1,35 @@
+import pytest
+
+
+@pytest.fixture
+def booking(fresh_db):
+    day = "2030-01-15"
+    booking_id = fresh_db.create_booking("anna", day, "12:00", "Пётр Иванов", "+79991234567", "@petr", 101)
+    fresh_db.create_booking("anna", day, "13:00", "Анна Смирнова", "+79035550011", "@anna_s", 102)
+    return booking_id
+
+
+@pytest.mark.parametrize("query", [
+    "+79991234567",
+    "+7 999 123-45-67",
+    "+7 (999) 123-45-67",
+    "8 999 123 45 67",
+    "89991234567",
+    "8 999 123",
+    "999 123",
+    "9991234567",
+    "4567",
+    "Петр 999 123",
+])
+def test_phone_forms(fresh_db, booking, query):
+    assert [b.id for b in fresh_db.search_bookings(query)] == [booking]
+
+
+@pytest.mark.parametrize("query", ["пётр", "Петр Ив", "@petr"])
+def test_name_and_username(fresh_db, booking, query):
+    assert [b.id for b in fresh_db.search_bookings(query)] == [booking]
+
+
+def test_other_number_does_not_match(fresh_db, booking):
+    assert fresh_db.search_bookings("8 999 000") == []
+    assert fresh_db.search_bookings("Петр 903") == []
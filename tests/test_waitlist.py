@@ -0,0 +1,53 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+import availability
+import waitlist
+from fake_telegram import FakeSession
+
+
+def _statuses(db, *entry_ids) -> list[str]:
+    with db.get_db() as conn:
+        return [conn.execute("SELECT status FROM waitlist WHERE id = ?", (entry_id,)).fetchone()[0]
+                for entry_id in entry_ids]
+
+
+def test_offer_expires_and_passes_to_next_client(fresh_db, monkeypatch):
+    monkeypatch.setattr(waitlist, "HOLD_MINUTES", 2 / 60)
+    monkeypatch.setattr(waitlist, "MIN_HOLD", 0)
+    date, time = next(slot for _, slots in availability.calendar("anna") for slot in slots)
+    session = FakeSession()
+
+    async def run():
+        bot = Bot("42:TEST", session=session)
+        waitlist.start(bot)
+        try:
+            booking_id = fresh_db.create_booking("anna", date, time, "A", "+71", "a", 1)
+            first = fresh_db.join_waitlist("anna", date, time, "W", "+72", "w", 2)
+            second = fresh_db.join_waitlist("anna", date, time, "V", "+73", "v", 3)
+
+            fresh_db.cancel_booking(booking_id)
+            await asyncio.sleep(0.1)
+            assert _statuses(fresh_db, first, second) == ["offered", "waiting"]
+            assert first in waitlist._state.timers
+            # Слот придержан: посторонний не записывается
+            assert fresh_db.create_booking("anna", date, time, "X", "+74", "x", 4) is None
+
+            await asyncio.sleep(2.5)
+            assert _statuses(fresh_db, first, second) == ["expired", "offered"]
+            assert list(waitlist._state.timers) == [second]
+            assert fresh_db.accept_waitlist_offer(first, 2) is None
+            assert fresh_db.accept_waitlist_offer(second, 3)
+            waitlist.closed(second)
+            assert not waitlist._state.timers
+        finally:
+            waitlist.stop()
+
+    asyncio.run(run())
+
+    sent = [(m.chat_id, m.text) for m in session.sent if isinstance(m, SendMessage)]
+    assert [chat_id for chat_id, _ in sent] == [2, 2, 3]
+    assert "Освободилось время" in sent[0][1] and "Время на подтверждение вышло" in sent[1][1]
+    assert "Освободилось время" in sent[2][1]
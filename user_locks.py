@@ -0,0 +1,39 @@
+"""
+User locks - one FSM critical section per user at a time
+Plugged into the Dispatcher as events_isolation: FSMContextMiddleware
+takes the lock before loading the state, so a duplicate message sees
+the state left by the previous one. A lock lives only while someone
+holds or waits for it, so the table does not grow with the user base.
+"""
+
+from asyncio import Lock
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Hashable
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+
+class UserEventIsolation(BaseEventIsolation):
+    def __init__(self):
+        # key -> [lock, holders + waiters]
+        self._locks: dict[Hashable, list] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    async def close(self) -> None:
+        self._locks.clear()
@@ -0,0 +1,146 @@
+"""
+Waitlist - лист ожидания на занятые слоты
+Event-driven: a booking listener reacts to every change of a slot. When
+a slot with waiting clients is free, the first one gets an offer and the
+slot is held for them for HOLD_MINUTES (other clients see it as busy).
+Accepting books it; declining, leaving or a timeout releases the hold,
+which is itself a slot change, so the next client in line is offered
+the slot - the cascade needs no scans. All state transitions are single
+conditional UPDATEs, so concurrent cancellations cannot double-offer.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import availability
+import database as db
+import tenants
+
+HOLD_MINUTES = 15
+MIN_HOLD = 60                  # сек; меньше до начала сессии - не предлагаем
+
+# bot: sends the offers; timers: entry id -> hold expiry handle
+_state = tenants.TenantLocal(bot=lambda: None, timers=dict)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_tasks: set[asyncio.Task] = set()
+
+
+def _on_booking_change(specialist_id: str, date: str, time: str):
+    """Booking listener; may run in a worker thread, so promotion is
+    handed to the loop (call_soon keeps the tenant context)"""
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(promote, specialist_id, date, time)
+
+
+db.add_booking_listener(_on_booking_change)
+
+
+def _slot_start(date: str, time: str) -> float:
+    return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M").timestamp()
+
+
+def promote(specialist_id: str, date: str, time_: str):
+    """Offer the slot to the next waiting client if it is free"""
+    bot = _state.bot
+    if bot is None:
+        return
+    now = time.time()
+    until = int(min(now + HOLD_MINUTES * 60, _slot_start(date, time_)))
+    if until - now < MIN_HOLD or not availability.is_free(specialist_id, date, time_):
+        return
+    entry = db.offer_waitlist_slot(specialist_id, date, time_, until)
+    if entry is None:
+        return
+    _schedule_expiry(entry['id'], until)
+    _spawn(_send_offer(bot, entry))
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _schedule_expiry(entry_id: int, until: float):
+    timers = _state.timers
+    if entry_id in timers:
+        timers[entry_id].cancel()
+    timers[entry_id] = _loop.call_later(max(until - time.time(), 0), _expire, entry_id)
+
+
+def _expire(entry_id: int):
+    _state.timers.pop(entry_id, None)
+    entry = db.expire_waitlist_offer(entry_id)
+    if entry and _state.bot is not None:
+        _spawn(_send_quietly(_state.bot, entry['client_user_id'],
+                             "⌛ Время на подтверждение вышло, слот передан следующему в очереди."))
+
+
+def closed(entry_id: int):
+    """The offer was accepted or declined - drop its timer"""
+    timer = _state.timers.pop(entry_id, None)
+    if timer:
+        timer.cancel()
+
+
+def offer_keyboard(entry_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Записаться", callback_data=f"wlaccept_{entry_id}")],
+        [InlineKeyboardButton(text="❌ Не нужно", callback_data=f"wlleave_{entry_id}")],
+    ])
+
+
+async def _send_offer(bot: Bot, entry):
+    specialist = db.get_specialist(entry['specialist_id'])
+    day = datetime.strptime(entry['date'], "%Y-%m-%d")
+    minutes = max(round((entry['offered_until'] - time.time()) / 60), 1)
+    try:
+        await bot.send_message(
+            entry['client_user_id'],
+            "🔔 <b>Освободилось время!</b>\n\n"
+            f"👤 Слушатель: <b>{specialist.name if specialist else entry['specialist_id']}</b>\n"
+            f"🕐 Время: <b>{day:%d.%m} {entry['time']}</b>\n\n"
+            f"Мы придержали его для вас на {minutes} мин.",
+            reply_markup=offer_keyboard(entry['id']),
+            parse_mode="HTML"
+        )
+    except Exception:
+        # Недоставляемое предложение - сразу следующему
+        closed(entry['id'])
+        db.leave_waitlist(entry['id'], entry['client_user_id'])
+
+
+async def _send_quietly(bot: Bot, chat_id: int, text: str):
+    try:
+        await bot.send_message(chat_id, text)
+    except Exception:
+        pass
+
+
+def check(specialist_id: str, date: str, time_: str):
+    """A client just joined: the slot may have been freed meanwhile"""
+    if _loop is not None:
+        _loop.call_soon(promote, specialist_id, date, time_)
+
+
+def start(bot: Bot):
+    """Restore hold timers and offer slots freed while the bot was down"""
+    global _loop
+    _loop = asyncio.get_running_loop()
+    _state.bot = bot
+    for entry in db.get_open_waitlist_offers():
+        _schedule_expiry(entry['id'], entry['offered_until'])
+    for specialist_id, date, time_ in db.get_free_waitlisted_slots(datetime.now().strftime("%Y-%m-%d")):
+        check(specialist_id, date, time_)
+
+
+def stop():
+    for timer in _state.timers.values():
+        timer.cancel()
+    _state.timers.clear()
+    _state.bot = None